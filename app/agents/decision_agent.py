@@ -3,31 +3,106 @@ V6 Decision Intelligence Agent.
 
 Simulates 3 candidate tweets, predicts engagement for each, chooses the best one.
 Enables learning from misses when actual engagement is backfilled.
+
+Deadline-aware: the LLM path runs against a latency budget. If the budget is
+already too small, or OpenAI doesn't answer in time, the local template path
+(phrase bank + local scorer) produces the tweet instead so we still post on time.
+Each OpenAI request is capped at what is left of the budget (and OPENAI_TIMEOUT),
+so an abandoned LLM decision stops soon after the deadline instead of holding
+a pool worker.
 """
 
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from config import DECISION_BUDGET_SECONDS, MIN_LLM_BUDGET_SECONDS, OPENAI_TIMEOUT
 from agents.writer_agent import generate_candidates
-from services.engagement_predictor import predict_engagement
+from agents.template_agent import generate_template_candidates
+from services.engagement_predictor import predict_engagement, predict_engagement_local
+from event_log import log_event
 
+logger = logging.getLogger("main_logger.decision")
 
-def run_decision(event: str, emotion: str, num_candidates: int = 3) -> tuple[str, int]:
-    """
-    Generate multiple candidates, score each, return the best tweet and its predicted score.
+# Decision paths recorded with each post
+SOURCE_LLM = "llm"
+SOURCE_TEMPLATE = "template"
 
-    Returns:
-        (best_tweet_text, predicted_engagement_score)
-    """
-    candidates = generate_candidates(event, emotion, n=num_candidates)
+# LLM decisions run here so the caller can stop waiting when the budget runs out;
+# candidate scoring gets its own pool so nested submits can't starve each other
+_llm_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="llm")
+_score_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-score")
+
+
+def _request_timeout(deadline):
+    """Seconds the next OpenAI request may take: OPENAI_TIMEOUT, cut to the budget left."""
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise TimeoutError("decision budget spent")
+    return min(OPENAI_TIMEOUT, left)
+
+
+def _run_llm_decision(event, emotion, num_candidates, deadline):
+    candidates = generate_candidates(event, emotion, n=num_candidates, timeout=_request_timeout(deadline))
 
     if not candidates:
         from agents.writer_agent import generate_post
-        fallback = generate_post(event, emotion)
-        score = predict_engagement(fallback, event, emotion)
+        fallback = generate_post(event, emotion, timeout=_request_timeout(deadline))
+        score = predict_engagement(fallback, event, emotion, timeout=_request_timeout(deadline))
         return fallback, score
 
-    scored = []
-    for text in candidates:
-        score = predict_engagement(text, event, emotion)
-        scored.append((text, score))
+    # Score candidates concurrently; each is an independent OpenAI call
+    scores = list(_score_executor.map(
+        lambda text: predict_engagement(text, event, emotion, timeout=_request_timeout(deadline)), candidates))
+    log_event(logger, "decision.candidates", "Scored %d LLM candidates", len(candidates),
+              source=SOURCE_LLM, candidates=list(zip(candidates, scores)))
+    best = max(zip(candidates, scores), key=lambda x: x[1])
+    return best[0], best[1]
+
 
+def run_template_decision(event: str, emotion: str, state=None, num_candidates: int = 3) -> tuple[str, int]:
+    """Local fast path: phrase-bank candidates ranked by the local scorer."""
+    candidates = generate_template_candidates(event, emotion, state, n=num_candidates)
+    scored = [(text, predict_engagement_local(text, event, emotion)) for text in candidates]
+    log_event(logger, "decision.candidates", "Scored %d template candidates", len(scored),
+              source=SOURCE_TEMPLATE, candidates=scored)
     best = max(scored, key=lambda x: x[1])
     return best[0], best[1]
+
+
+def run_decision(event: str, emotion: str, num_candidates: int = 3, state=None, deadline=None) -> tuple[str, int, str]:
+    """
+    Generate multiple candidates, score each, return the best tweet and its predicted score.
+
+    Args:
+        deadline: time.monotonic() value by which the tweet must be ready.
+            Defaults to DECISION_BUDGET_SECONDS from now.
+
+    Returns:
+        (best_tweet_text, predicted_engagement_score, source) where source is
+        "llm" or "template" (which path produced the tweet).
+    """
+    if deadline is None:
+        deadline = time.monotonic() + DECISION_BUDGET_SECONDS
+    remaining = deadline - time.monotonic()
+
+    if remaining >= MIN_LLM_BUDGET_SECONDS:
+        # Run in a copy of this context so the LLM path's log records keep the trace ids
+        ctx = contextvars.copy_context()
+        future = _llm_executor.submit(ctx.run, _run_llm_decision, event, emotion, num_candidates, deadline)
+        try:
+            post, score = future.result(timeout=remaining)
+            return post, score, SOURCE_LLM
+        except FutureTimeout:
+            log_event(logger, "decision.fallback", "LLM decision missed its %.1fs budget, using template path",
+                      remaining, level=logging.WARNING, reason="timeout", budget_left=remaining)
+        except Exception as e:
+            log_event(logger, "decision.fallback", "LLM decision failed (%s), using template path", e,
+                      level=logging.WARNING, reason="error", error=str(e))
+    else:
+        log_event(logger, "decision.fallback", "Only %.1fs of decision budget left, skipping LLM path",
+                  remaining, reason="budget", budget_left=remaining)
+
+    post, score = run_template_decision(event, emotion, state, num_candidates)
+    return post, score, SOURCE_TEMPLATE
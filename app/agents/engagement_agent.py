@@ -1,27 +1,72 @@
+import json
+import time
 from database import conn
 from datetime import datetime
+from config import ENGAGEMENT_POLL_AGES
+from services.engagement_stats import record_engagement, get_group_stats
 
 
-def save_post(post_id, text, emotion, narrative, predicted_score=None):
-    """Save posted tweet with optional V6 predicted score for learning from misses."""
+def _iso(ts):
+    return datetime.utcfromtimestamp(ts).isoformat() if ts else None
+
+
+def save_post(post_id, text, emotion, narrative, predicted_score=None, source=None,
+              match_id=None, event_fetched_at=None, posted_at=None, trace_id=None,
+              num_candidates=None, features=None):
+    """
+    Save posted tweet with optional V6 predicted score for learning from misses.
+    `source` records which decision path produced it ("llm" or "template").
+    `event_fetched_at` / `posted_at` are epoch seconds; their difference is stored
+    as latency_ms (end-to-end event-to-post latency). The post is also queued for
+    its first engagement snapshot (see services/engagement_poller.py).
+    `trace_id` links the post to its decision path in the structured event log.
+    `num_candidates` and `features` (rule features at decision time, a dict) are
+    what services/learning.py fits its parameters on.
+    """
+    latency_ms = None
+    if event_fetched_at and posted_at:
+        latency_ms = int((posted_at - event_fetched_at) * 1000)
     c = conn.cursor()
     c.execute("""
-        INSERT INTO posts (id, text, emotion, narrative, predicted_score)
-        VALUES (?, ?, ?, ?, ?)
-    """, (post_id, text, emotion, narrative, predicted_score))
+        INSERT INTO posts (id, text, emotion, narrative, predicted_score, source,
+                           match_id, event_fetched_at, posted_at, latency_ms, trace_id,
+                           num_candidates, features)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (post_id, text, emotion, narrative, predicted_score, source,
+          match_id, _iso(event_fetched_at), _iso(posted_at), latency_ms, trace_id,
+          num_candidates, json.dumps(features) if features is not None else None))
+    if post_id:
+        posted = posted_at or time.time()
+        c.execute("""
+            INSERT OR IGNORE INTO engagement_schedule (post_id, posted_at, stage, next_due)
+            VALUES (?, ?, 0, ?)
+        """, (post_id, posted, posted + ENGAGEMENT_POLL_AGES[0]))
     conn.commit()
 
 
 def update_actual_engagement(post_id, likes, retweets):
-    """Backfill actual engagement so we can learn from prediction misses."""
+    """
+    Backfill actual engagement so we can learn from prediction misses.
+    Aggregates in engagement_stats are moved from the old value to the new one
+    in the same transaction.
+    """
     c = conn.cursor()
     # score = composite for ordering (e.g. likes + 2*retweets), normalized to 0–100 scale for comparison
-    composite = likes + 2 * retweets
+    composite = min(likes + 2 * retweets, 10000)
+    c.execute("""
+        SELECT emotion, narrative, posted_at, predicted_score, score, engagement_fetched_at
+        FROM posts WHERE id = ?
+    """, (post_id,))
+    row = c.fetchone()
     c.execute("""
         UPDATE posts
         SET actual_likes = ?, actual_retweets = ?, score = ?, engagement_fetched_at = ?
         WHERE id = ?
-    """, (likes, retweets, min(composite, 10000), datetime.utcnow().isoformat(), post_id))
+    """, (likes, retweets, composite, datetime.utcnow().isoformat(), post_id))
+    if row is not None:
+        post = dict(zip(("emotion", "narrative", "posted_at", "predicted_score", "score"), row[:5]))
+        old = post if row[5] is not None else None
+        record_engagement(c, old, dict(post, score=composite))
     conn.commit()
 
 
@@ -30,7 +75,7 @@ def get_posts_without_engagement(limit=50):
     c = conn.cursor()
     c.execute("""
         SELECT id FROM posts
-        WHERE engagement_fetched_at IS NULL AND id IS NOT NULL
+        WHERE engagement_fetched_at IS NULL AND engagement_gone_at IS NULL AND id IS NOT NULL
         ORDER BY id DESC
         LIMIT ?
     """, (limit,))
@@ -38,11 +83,6 @@ def get_posts_without_engagement(limit=50):
 
 
 def get_best_emotions():
-    c = conn.cursor()
-    c.execute("""
-        SELECT emotion, AVG(score)
-        FROM posts
-        GROUP BY emotion
-        ORDER BY AVG(score) DESC
-    """)
-    return c.fetchall()
+    """(emotion, mean engagement) of measured posts, best first; read from engagement_stats."""
+    stats = get_group_stats("emotion")
+    return sorted(((s["key"], s["mean"]) for s in stats), key=lambda x: x[1], reverse=True)
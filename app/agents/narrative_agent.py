@@ -1,11 +1,7 @@
-def detect_narrative(event, state):
-    if "WICKET" in event and state["required_rr"] > 10:
-        return "panic"
-
-    if "six" in event.lower():
-        return "hype"
+from services.rules import evaluate
 
-    if state["overs_left"] < 3:
-        return "tension"
 
-    return "neutral"
+def detect_narrative(event, state):
+    """Emotion for a match event: first matching `narrative` rule in rules.json (else the default)."""
+    emotion, _, _ = evaluate(event, state)
+    return emotion
@@ -1,18 +1,26 @@
-from services.virality import score_event
+import random
 
-POSTABLE_EMOTIONS = ["panic", "hype", "tension"]
+from config import NUM_CANDIDATES, CANDIDATE_CHOICES, CANDIDATE_EXPLORE_RATE
+from services.rules import evaluate, current_params
 
 
-def should_post(event, emotion):
+def should_post(event, emotion, state=None):
     """
     Determine if we should post a tweet for the given event and emotion.
-    Posts when virality score >= 50 or when emotion is one of panic/hype/tension.
+    Posts when the emotion is one of the `post.emotions` in rules.json (panic/hype/tension)
+    or when the virality score reaches `post.min_score` (50); learned params override both.
     """
-    if emotion in POSTABLE_EMOTIONS:
-        return True
+    _, _, post = evaluate(event, state, emotion)
+    return post
 
-    score = score_event(event, emotion)
-    if score >= 50:
-        return True
 
-    return False
+def choose_num_candidates():
+    """
+    Candidates to generate for a decision: the learned count (NUM_CANDIDATES until the
+    first training run), or another of CANDIDATE_CHOICES with CANDIDATE_EXPLORE_RATE.
+    """
+    best = current_params().get("num_candidates", NUM_CANDIDATES)
+    others = [n for n in CANDIDATE_CHOICES if n != best]
+    if others and random.random() < CANDIDATE_EXPLORE_RATE:
+        return random.choice(others)
+    return best
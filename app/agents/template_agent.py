@@ -0,0 +1,70 @@
+"""
+Local fast-path writer: builds tweets from a phrase bank without calling OpenAI.
+
+Used by the decision agent when the LLM path would miss the latency budget.
+Phrases are keyed on the detect_narrative emotion and filled from match state.
+"""
+import random
+
+PHRASE_BANK = {
+    "panic": [
+        "{need} off {balls} balls and {team} just lost another one. Hearts in mouths 😰",
+        "WICKET. Required rate {rrr} now. {team} fans, breathe. Please.",
+        "This chase is slipping away from {team}. {need} needed and nobody is settling in.",
+        "Not the wicket {team} needed. {score}. Panic stations.",
+    ],
+    "hype": [
+        "SIX! {team} are not here to play safe 🔥 {score}",
+        "Into the stands! {team} have flipped the mood. {score}",
+        "That's gone miles. {team} turning this into a party 🚀",
+        "Absolute carnage from {team}. {score} and they're just warming up.",
+    ],
+    "tension": [
+        "{overs} overs left. {need} to win. Nobody blink 😬",
+        "It's going down to the wire. {team} need {need}. Who holds their nerve?",
+        "Last overs, every ball a final. {score}",
+        "Can {team} close this out? {overs} overs, {need} runs. Nails gone.",
+    ],
+    "neutral": [
+        "{name}: {score}. Settle in, this one's building.",
+        "{team} at {score}. Big phase coming up.",
+    ],
+}
+
+
+def _fields(event, state):
+    """Template fields from a MatchState (or None when no state is available)."""
+    if state is None:
+        return {"team": "India", "name": event.split(".")[0], "score": "", "rrr": "",
+                "overs": 0, "balls": 0, "need": ""}
+    last = state.score[-1] if state.score else None
+    overs_left = state.overs_left or 0
+    need = state.runs_needed
+    return {
+        "team": state.batting_team or "India",
+        "name": state.name or event.split(".")[0],
+        "score": f"{last.runs}/{last.wickets} ({last.overs:g} ov)" if last else "",
+        "rrr": state.required_rr or "",
+        "overs": overs_left,
+        "balls": overs_left * 6,
+        "need": "" if need is None else need,
+    }
+
+
+def _usable(template, fields):
+    """Skip templates that reference a field we have no value for."""
+    for key, value in fields.items():
+        if "{" + key + "}" in template and value in ("", None, 0):
+            return False
+    return True
+
+
+def generate_template_candidates(event, emotion, state=None, n=3):
+    """Return up to n tweets from the phrase bank for this emotion and match state."""
+    fields = _fields(event, state)
+    bank = PHRASE_BANK.get(emotion) or PHRASE_BANK["neutral"]
+    usable = [t for t in bank if _usable(t, fields)]
+    if not usable:
+        usable = [t for t in PHRASE_BANK["neutral"] if _usable(t, fields)] or ["{name}. Buckle up."]
+    random.shuffle(usable)
+    return [t.format(**fields)[:280] for t in usable[:n]]
@@ -5,6 +5,7 @@ from cricket_events import (
     has_india_team,
     has_women_team,
 )
+from match_types import MatchSnapshot
 
 
 def watch_match():
@@ -28,10 +29,10 @@ def watch_match():
             or has_women_team(m)
         ):
             continue
-        event, state = get_event_and_state(m)
-        if event is None:
-            continue
-        if m.get("matchStarted") and not m.get("matchEnded"):
+        # Parsed once here; event and state are shared by reference downstream
+        snapshot = MatchSnapshot.from_api(m)
+        event, state = get_event_and_state(snapshot)
+        if snapshot.is_live:
             live.append((event, state))
         else:
             other.append((event, state))
@@ -5,7 +5,13 @@ from openai_errors import handle_openai_rate_limit
 
 client = OpenAI(api_key=OPENAI_API_KEY)
 
-def generate_post(event, emotion):
+
+def _client(timeout=None):
+    """The shared client, or (decision path) a copy capped at `timeout` seconds with no retries."""
+    return client if timeout is None else client.with_options(timeout=timeout, max_retries=0)
+
+
+def generate_post(event, emotion, timeout=None):
 
     style = load_style_examples()
 
@@ -28,7 +34,7 @@ Write ONE tweet.
 """
 
     try:
-        r = client.chat.completions.create(
+        r = _client(timeout).chat.completions.create(
             model="gpt-4o-mini",
             messages=[{"role":"user","content":prompt}]
         )
@@ -38,8 +44,11 @@ Write ONE tweet.
     return r.choices[0].message.content.strip()
 
 
-def generate_candidates(event, emotion, n=3):
-    """Generate n distinct candidate tweets for decision layer to score and choose from."""
+def generate_candidates(event, emotion, n=3, timeout=None):
+    """
+    Generate n distinct candidate tweets for decision layer to score and choose from.
+    timeout caps the request (and its fallback) in seconds, without retries.
+    """
     style = load_style_examples()
 
     prompt = f"""
@@ -62,7 +71,7 @@ Output ONLY the tweets, one per line, no numbering or labels.
 """
 
     try:
-        r = client.chat.completions.create(
+        r = _client(timeout).chat.completions.create(
             model="gpt-4o-mini",
             messages=[{"role": "user", "content": prompt}]
         )
@@ -77,5 +86,33 @@ Output ONLY the tweets, one per line, no numbering or labels.
         c = c.lstrip("0123456789.)- ")
         if len(c) <= 280 and len(c) > 10:
             out.append(c)
-    return out if len(out) >= 1 else [generate_post(event, emotion)]
+    return out if len(out) >= 1 else [generate_post(event, emotion, timeout=timeout)]
+
+
+
+def generate_reply(tweet_text, author_username="", context_text=""):
+    """One banter reply to a fan's tweet (context_text: the tweet they replied to, e.g. our post)."""
+    prompt = f"""
+You are a viral cricket fan account on X, replying to another fan.
+
+Rules:
+- Witty, playful banter; never abusive, never personal
+- Stay on the cricket
+- Max 200 characters
+- No hashtags
+
+{"Our tweet they replied to: " + context_text if context_text else ""}
+Their tweet (@{author_username or "fan"}): {tweet_text}
+
+Write ONE reply.
+"""
+
+    try:
+        r = client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": prompt}]
+        )
+    except RateLimitError as e:
+        handle_openai_rate_limit(e)
 
+    return r.choices[0].message.content.strip().strip('"')[:280]
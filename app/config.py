@@ -1,4 +1,5 @@
 import os
+import socket
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -17,3 +18,134 @@ X_ACCESS_SECRET = os.getenv("X_ACCESS_SECRET")
 MATCH_LOOP_SECONDS = 30
 MIN_POST_DELAY = 5
 MAX_POST_DELAY = 25
+
+# Posting pipeline: worker pool and bounded queue size per stage
+PIPELINE_WORKERS = {
+    "ingest": 1,
+    "narrative": 2,
+    "decision": int(os.getenv("DECISION_WORKERS", "2")),
+    "publish": 1,
+    "persist": 1,
+}
+PIPELINE_QUEUE_SIZE = {
+    "ingest": 1,  # one pending fetch at most; extra ticks coalesce
+    "narrative": 32,
+    "decision": 8,
+    "publish": 4,
+    "persist": 32,
+}
+# Events older than this (since fetch) are shed instead of processed
+STALE_EVENT_SECONDS = int(os.getenv("STALE_EVENT_SECONDS", "120"))
+# How long an upstream stage blocks on a full queue before shedding
+BACKPRESSURE_TIMEOUT = float(os.getenv("BACKPRESSURE_TIMEOUT", "2"))
+
+# Deadline-aware decisions: a tweet must be ready this many seconds after the event
+# was fetched; when the LLM path can't make it, a local template path is used instead
+DECISION_BUDGET_SECONDS = float(os.getenv("DECISION_BUDGET_SECONDS", "8"))
+# Don't start the LLM path with less than this much budget left
+MIN_LLM_BUDGET_SECONDS = float(os.getenv("MIN_LLM_BUDGET_SECONDS", "3"))
+# Per-request cap on the decision path's OpenAI calls (seconds, further cut to the
+# budget left); no retries there, the fallback is local. Other calls keep the client defaults
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "6"))
+
+# Freshness SLA: a decision whose source snapshot is older than this (or has been
+# superseded by a newer scoreboard) is not published as-is. FRESHNESS_ACTION is
+# "drop" to discard it or "regenerate" to redo the decision on the latest snapshot.
+FRESHNESS_SLA_SECONDS = int(os.getenv("FRESHNESS_SLA_SECONDS", "90"))
+FRESHNESS_ACTION = os.getenv("FRESHNESS_ACTION", "drop")
+
+# X write rate limit (sliding window) shared by single posts and thread jobs
+X_POSTS_PER_WINDOW = int(os.getenv("X_POSTS_PER_WINDOW", "50"))
+X_POST_WINDOW_SECONDS = int(os.getenv("X_POST_WINDOW_SECONDS", "900"))
+# Thread publishing jobs: pause between tweets and retry backoff after failures
+THREAD_TWEET_DELAY = float(os.getenv("THREAD_TWEET_DELAY", "1.5"))
+THREAD_MAX_ATTEMPTS = int(os.getenv("THREAD_MAX_ATTEMPTS", "5"))
+
+# Engagement time series: snapshot ages (seconds after posting) at which each post
+# is re-polled, and how many bulk lookups (≤100 ids each) a feedback cycle may spend
+ENGAGEMENT_POLL_AGES = [900, 3600, 6 * 3600, 24 * 3600]
+ENGAGEMENT_POLL_BUDGET = int(os.getenv("ENGAGEMENT_POLL_BUDGET", "3"))
+# Ids due within this many seconds ride along in a lookup that has spare slots
+ENGAGEMENT_COALESCE_SECONDS = int(os.getenv("ENGAGEMENT_COALESCE_SECONDS", "600"))
+# A post left out of a lookup response without a not-found/not-authorized error
+# is retried after this many seconds, doubling per miss (capped at the last poll age)
+ENGAGEMENT_RETRY_SECONDS = int(os.getenv("ENGAGEMENT_RETRY_SECONDS", "300"))
+
+# Job runtime: shared executor size and feedback job interval
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+FEEDBACK_INTERVAL_SECONDS = int(os.getenv("FEEDBACK_INTERVAL_SECONDS", "900"))
+
+# Structured event log (logs/events.jsonl): rotate at LOG_MAX_BYTES or after
+# LOG_ROTATE_SECONDS, whichever comes first
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(20 * 1024 * 1024)))
+LOG_ROTATE_SECONDS = int(os.getenv("LOG_ROTATE_SECONDS", "86400"))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "14"))
+
+# Profile mode (main.py profile): reports go to PROFILE_DIR/<run>/; stack samples are
+# taken every PROFILE_SAMPLE_SECONDS and allocations keep PROFILE_TRACE_FRAMES frames
+PROFILE_DIR = os.getenv("PROFILE_DIR", "data/profiles")
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "30"))
+PROFILE_SAMPLE_SECONDS = float(os.getenv("PROFILE_SAMPLE_SECONDS", "0.005"))
+PROFILE_TRACE_FRAMES = int(os.getenv("PROFILE_TRACE_FRAMES", "25"))
+# Load tests (scripts/load_test.py): scratch DBs and report.json per run
+LOADTEST_DIR = os.getenv("LOADTEST_DIR", "data/loadtests")
+
+# Shared CricAPI snapshot cache on the data/ volume: one process refreshes it when
+# older than SNAPSHOT_TTL_SECONDS (0 disables the cache), the others read it. Cached
+# data older than SNAPSHOT_MAX_STALE_SECONDS is not served when a refresh fails.
+SNAPSHOT_CACHE_PATH = os.getenv("SNAPSHOT_CACHE_PATH", "data/cache/current_matches.json")
+SNAPSHOT_TTL_SECONDS = int(os.getenv("SNAPSHOT_TTL_SECONDS", "25"))
+SNAPSHOT_LOCK_WAIT_SECONDS = float(os.getenv("SNAPSHOT_LOCK_WAIT_SECONDS", "15"))
+SNAPSHOT_MAX_STALE_SECONDS = int(os.getenv("SNAPSHOT_MAX_STALE_SECONDS", "120"))
+
+# Sharded workers: with SHARDED_WORKERS=1 several processes/containers sharing the
+# learning DB split live matches through lease rows. A lease not renewed within
+# LEASE_TTL_SECONDS (worker crashed or hung) can be taken over by another worker.
+SHARDED_WORKERS = os.getenv("SHARDED_WORKERS", "0").lower() in ("1", "true", "yes")
+WORKER_ID = os.getenv("WORKER_ID") or "{}:{}".format(socket.gethostname(), os.getpid())
+LEASE_TTL_SECONDS = int(os.getenv("LEASE_TTL_SECONDS", "120"))
+LEASE_HEARTBEAT_SECONDS = int(os.getenv("LEASE_HEARTBEAT_SECONDS", "30"))
+
+# Declarative narrative/virality/posting rules (services/rules.py), reloaded when
+# the file changes; the file's mtime is checked at most every RULES_CHECK_SECONDS
+RULES_PATH = os.getenv("RULES_PATH", str(Path(__file__).resolve().parent / "rules.json"))
+RULES_CHECK_SECONDS = float(os.getenv("RULES_CHECK_SECONDS", "2"))
+
+# Offline learning (services/learning.py, main.py learn): refits virality weights, postable
+# emotions, the posting threshold and the candidate count from posts with backfilled
+# engagement every LEARN_INTERVAL_SECONDS; versioned params go to PARAMS_DIR. Groups with
+# fewer than LEARN_MIN_GROUP posts keep their current values, and fitted weights are
+# shrunk towards the current ones as if those came from LEARN_PRIOR_WEIGHT posts.
+PARAMS_DIR = os.getenv("PARAMS_DIR", "data/params")
+LEARN_ENABLED = os.getenv("LEARN_ENABLED", "1").lower() in ("1", "true", "yes")
+LEARN_INTERVAL_SECONDS = int(os.getenv("LEARN_INTERVAL_SECONDS", str(6 * 3600)))
+LEARN_MIN_POSTS = int(os.getenv("LEARN_MIN_POSTS", "30"))
+LEARN_MIN_GROUP = int(os.getenv("LEARN_MIN_GROUP", "10"))
+LEARN_PRIOR_WEIGHT = float(os.getenv("LEARN_PRIOR_WEIGHT", "50"))
+LEARN_CHUNK_SIZE = int(os.getenv("LEARN_CHUNK_SIZE", "1000"))
+LEARN_KEEP_VERSIONS = int(os.getenv("LEARN_KEEP_VERSIONS", "20"))
+# Candidates generated per LLM decision (until learned), the counts learning may pick
+# from, and how often a different count is tried so the alternatives get data
+NUM_CANDIDATES = int(os.getenv("NUM_CANDIDATES", "3"))
+CANDIDATE_CHOICES = [int(n) for n in os.getenv("CANDIDATE_CHOICES", "1,2,3,4,5").split(",")]
+CANDIDATE_EXPLORE_RATE = float(os.getenv("CANDIDATE_EXPLORE_RATE", "0.1"))
+
+# X read caches (tweets / users looked up for banter and reply context)
+X_TWEET_CACHE_SIZE = int(os.getenv("X_TWEET_CACHE_SIZE", "5000"))
+X_USER_CACHE_SIZE = int(os.getenv("X_USER_CACHE_SIZE", "5000"))
+X_USER_CACHE_TTL = int(os.getenv("X_USER_CACHE_TTL", "3600"))
+
+# Banter: mentions and replies to our recent posts are ingested every
+# BANTER_INTERVAL_SECONDS, ranked locally, and the best few (score >= BANTER_MIN_SCORE)
+# get an LLM reply draft; drafts are only posted with BANTER_AUTO_REPLY=1
+BANTER_ENABLED = os.getenv("BANTER_ENABLED", "0").lower() in ("1", "true", "yes")
+BANTER_AUTO_REPLY = os.getenv("BANTER_AUTO_REPLY", "0").lower() in ("1", "true", "yes")
+BANTER_INTERVAL_SECONDS = int(os.getenv("BANTER_INTERVAL_SECONDS", "120"))
+BANTER_REPLY_WINDOW_HOURS = int(os.getenv("BANTER_REPLY_WINDOW_HOURS", "24"))
+BANTER_REPLIES_PER_RUN = int(os.getenv("BANTER_REPLIES_PER_RUN", "3"))
+BANTER_MIN_SCORE = float(os.getenv("BANTER_MIN_SCORE", "30"))
+BANTER_MAX_AGE_MINUTES = int(os.getenv("BANTER_MAX_AGE_MINUTES", "60"))
+# A candidate whose reply fails (LLM or X error) goes back to new; skipped after this many tries
+BANTER_MAX_ATTEMPTS = int(os.getenv("BANTER_MAX_ATTEMPTS", "3"))
@@ -1,13 +1,19 @@
 import json
 import os
+import time
+from email.utils import parsedate_to_datetime
 from pathlib import Path
 import requests
 
+from config import SNAPSHOT_TTL_SECONDS
+from match_types import MatchSnapshot
+from services.snapshot_cache import get_matches
+
 CRICAPI_URL = "https://api.cricapi.com/v1/currentMatches"
 CRICAPI_KEY = os.getenv("CRICAPI_API_KEY")
 
-# Overs per format for state derivation
-OVERS_PER_FORMAT = {"t20": 20, "odi": 50, "test": None}
+# Optional replacement for the live API (see set_match_source)
+_match_source = None
 
 # International indicators (CricAPI match name/series); domestic e.g. Ranji Trophy lack these
 INTERNATIONAL_KEYWORDS = ("ICC", "ACC", "World Cup", "Asia Cup", "T20I", "ODI", " tour of ")
@@ -57,80 +63,85 @@ def has_women_team(match):
     return False
 
 
-def _state_from_match(match):
+def _api_time(response):
+    """Server-side timestamp of the response (epoch seconds), if the API sent one."""
+    header = response.headers.get("Last-Modified") or response.headers.get("Date")
+    if not header:
+        return None
+    try:
+        return parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def set_match_source(source):
     """
-    Build state dict for narrative/strategist from one match dict (current_matches.json shape).
-    Provides required_rr and overs_left for limited-overs; narrative_agent uses these.
+    Serve get_match_event() from `source` instead of CricAPI: a callable returning
+    a list of CricAPI match dicts (recorded payloads, fakes, the simulator).
+    Pass None to go back to the live API.
     """
-    state = {
-        "required_rr": 0.0,
-        "overs_left": 0,
-        "match_type": match.get("matchType", ""),
-        "match_ended": match.get("matchEnded", False),
-        "status": match.get("status", ""),
-        "name": match.get("name", ""),
-        "teams": match.get("teams", []),
-        "score": match.get("score", []),
-    }
-    score_list = match.get("score") or []
-    if not score_list:
-        return state
-
-    match_type = (match.get("matchType") or "").lower()
-    max_overs = OVERS_PER_FORMAT.get(match_type) if match_type in OVERS_PER_FORMAT else None
-
-    if max_overs and len(score_list) >= 1:
-        # Last inning in list is current or just finished
-        last = score_list[-1]
-        runs = last.get("r", 0)
-        overs_bowled = float(last.get("o", 0) or 0)
-        state["overs_left"] = max(0, int(max_overs - overs_bowled))
-
-        if len(score_list) >= 2:
-            # Second inning: target = first inning runs + 1
-            target = (score_list[0].get("r", 0) or 0) + 1
-            runs_needed = max(0, target - runs)
-            if state["overs_left"] > 0:
-                state["required_rr"] = round(runs_needed / state["overs_left"], 2)
-            else:
-                state["required_rr"] = 0.0
-
-    return state
-
-
-def _event_summary_from_match(match):
-    """Build a short event string for narrative/decision from one match."""
-    name = match.get("name", "Match")
-    status = match.get("status", "Unknown status")
-    score_parts = []
-    for s in match.get("score") or []:
-        inn = s.get("inning", "")
-        r, w, o = s.get("r", ""), s.get("w", ""), s.get("o", "")
-        score_parts.append(f"{inn}: {r}/{w} ({o} overs)")
-    score_str = " | ".join(score_parts) if score_parts else ""
-    return f"{name}. {status}. {score_str}".strip()
+    global _match_source
+    _match_source = source
 
 
-def get_match_event():
+def _request_current_matches():
+    """One CricAPI currentMatches call: (matches, fetched_at, api_time). Raises on failure."""
+    response = requests.get(CRICAPI_URL, params={"apikey": CRICAPI_KEY, "offset": 0}, timeout=10)
+    response.raise_for_status()
+    fetched_at = time.time()
+    data = response.json()
+    if data.get("status") == "failure":
+        # e.g. quota exhausted; don't let it overwrite a good cached snapshot
+        raise ValueError("CricAPI failure: {}".format(data.get("reason")))
+    return data.get("data", []), fetched_at, _api_time(response)
+
+
+def fetch_current_matches():
     """
-    Load current matches from current_matches.json (or CricAPI if file missing).
-    Returns list of match dicts (each with keys from current_matches.json).
+    Live matches, stamped as described in get_match_event(). Served from the shared
+    on-disk snapshot cache (one API call per SNAPSHOT_TTL_SECONDS across all
+    processes); with a TTL of 0 every call goes to the API.
     """
+    if SNAPSHOT_TTL_SECONDS > 0:
+        return get_matches(_request_current_matches)
     try:
-        response = requests.get(CRICAPI_URL, params={"apikey": CRICAPI_KEY, "offset": 0}, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        return data.get("data", [])
+        matches, fetched_at, api_time = _request_current_matches()
     except Exception:
         return []
+    for m in matches:
+        m["_fetched_at"] = fetched_at
+        m["_api_time"] = api_time
+    return matches
+
+
+def get_match_event():
+    """
+    Load current matches from the shared snapshot cache / CricAPI (or from the
+    source set with set_match_source). Returns list of match dicts (each with keys from current_matches.json), each
+    stamped with `_fetched_at` (local epoch) and `_api_time` (server epoch, if sent).
+    """
+    if _match_source is None:
+        return fetch_current_matches()
+    fetched_at = time.time()
+    matches = _match_source()
+    for m in matches:
+        m.setdefault("_fetched_at", fetched_at)
+        m.setdefault("_api_time", None)
+    return matches
 
 
 def get_event_and_state(match):
     """
-    From one match dict, return (event_string, state_dict) for pipeline.
+    From one match dict (or an already parsed MatchSnapshot), return
+    (event_string, MatchState) for pipeline.
     event_string: summary for narrative/decision agents.
-    state_dict: required_rr, overs_left, match_type, status, etc. for narrative_agent.
+    MatchState: required_rr, overs_left, match_type, status, etc. for narrative_agent,
+    plus match_id, fetched_at/api_time and state_key for freshness checks. It shares
+    teams/score with the snapshot and is indexable like the old state dict.
     """
+    if isinstance(match, MatchSnapshot):
+        return match.event, match.state
     if not match or match.get("_error"):
         return None, None
-    return _event_summary_from_match(match), _state_from_match(match)
+    snapshot = MatchSnapshot.from_api(match)
+    return snapshot.event, snapshot.state
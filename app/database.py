@@ -1,32 +1,231 @@
+import os
 import sqlite3
+import threading
 
-conn = sqlite3.connect("data/learning.db", check_same_thread=False)
-c = conn.cursor()
-
-c.execute("""
-CREATE TABLE IF NOT EXISTS posts(
-    id TEXT,
-    text TEXT,
-    emotion TEXT,
-    narrative TEXT,
-    score INTEGER DEFAULT 0,
-    predicted_score INTEGER,
-    actual_likes INTEGER,
-    actual_retweets INTEGER,
-    engagement_fetched_at TEXT
-)
-""")
-
-# V6: add new columns if table already existed
-for col, typ in [
-    ("predicted_score", "INTEGER"),
-    ("actual_likes", "INTEGER"),
-    ("actual_retweets", "INTEGER"),
-    ("engagement_fetched_at", "TEXT"),
-]:
+DB_PATH = os.getenv("LEARNING_DB_PATH", "data/learning.db")
+
+_local = threading.local()
+
+
+def get_conn():
+    """
+    This thread's connection to the learning DB. Jobs and pipeline workers run on
+    different threads, so each gets its own connection (and transaction) instead
+    of interleaving statements on one shared handle; WAL + busy_timeout let them
+    read concurrently and queue briefly for writes.
+    """
+    db = getattr(_local, "conn", None)
+    if db is None:
+        db = sqlite3.connect(DB_PATH, timeout=30, check_same_thread=False)
+        db.execute("PRAGMA busy_timeout = 30000")
+        _local.conn = db
+    return db
+
+
+class _ThreadConnection:
+    """`conn` stand-in that forwards to the calling thread's connection."""
+
+    def __getattr__(self, name):
+        return getattr(get_conn(), name)
+
+
+conn = _ThreadConnection()
+
+
+def init_db():
+    """Create tables (and add columns missing from older DBs) on the current DB_PATH."""
+    c = conn.cursor()
+    c.execute("PRAGMA journal_mode = WAL")
+
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS posts(
+        id TEXT,
+        text TEXT,
+        emotion TEXT,
+        narrative TEXT,
+        score INTEGER DEFAULT 0,
+        predicted_score INTEGER,
+        actual_likes INTEGER,
+        actual_retweets INTEGER,
+        engagement_fetched_at TEXT,
+        source TEXT,
+        match_id TEXT,
+        event_fetched_at TEXT,
+        posted_at TEXT,
+        latency_ms INTEGER,
+        trace_id TEXT,
+        num_candidates INTEGER,
+        features TEXT
+    )
+    """)
+
+    # V6: add new columns if table already existed
+    for col, typ in [
+        ("predicted_score", "INTEGER"),
+        ("actual_likes", "INTEGER"),
+        ("actual_retweets", "INTEGER"),
+        ("engagement_fetched_at", "TEXT"),
+        ("source", "TEXT"),  # decision path that produced the post: llm | template
+        ("match_id", "TEXT"),
+        ("event_fetched_at", "TEXT"),  # when the source match snapshot was fetched
+        ("posted_at", "TEXT"),
+        ("latency_ms", "INTEGER"),  # event-to-post latency (fetch → tweet live)
+        ("trace_id", "TEXT"),  # links the post to its records in logs/events.jsonl
+        ("num_candidates", "INTEGER"),  # LLM candidates generated for the decision
+        ("features", "TEXT"),  # JSON rule features at decision time (services/learning.py)
+        ("engagement_gone_at", "TEXT"),  # tweet deleted/protected: never polled again
+    ]:
+        try:
+            c.execute(f"ALTER TABLE posts ADD COLUMN {col} {typ}")
+        except sqlite3.OperationalError:
+            pass  # column already exists
+
+    # Materialized engagement aggregates (see services/engagement_stats.py)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS engagement_stats(
+        dimension TEXT NOT NULL,
+        key TEXT NOT NULL,
+        n INTEGER NOT NULL DEFAULT 0,
+        mean REAL NOT NULL DEFAULT 0,
+        m2 REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (dimension, key)
+    )
+    """)
+
+    # Engagement time series: one row per snapshot, plus the re-poll schedule per post
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS engagement_snapshots(
+        post_id TEXT NOT NULL,
+        taken_at TEXT NOT NULL,
+        age_seconds INTEGER,
+        likes INTEGER,
+        retweets INTEGER,
+        replies INTEGER,
+        quotes INTEGER
+    )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_engagement_snapshots_post ON engagement_snapshots(post_id)")
+
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS engagement_schedule(
+        post_id TEXT PRIMARY KEY,
+        posted_at REAL NOT NULL,
+        stage INTEGER NOT NULL DEFAULT 0,
+        next_due REAL NOT NULL,
+        misses INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    try:
+        # Lookups in a row that left the post out without an error (retried with backoff)
+        c.execute("ALTER TABLE engagement_schedule ADD COLUMN misses INTEGER NOT NULL DEFAULT 0")
+    except sqlite3.OperationalError:
+        pass  # column already exists
+    c.execute("CREATE INDEX IF NOT EXISTS idx_engagement_schedule_due ON engagement_schedule(next_due)")
+
+    # Thread publishing jobs: one row per thread, one row per tweet with its posted id
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS threads(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        match_id TEXT,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL DEFAULT 0,
+        last_error TEXT,
+        created_at TEXT,
+        updated_at TEXT
+    )
+    """)
+
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS thread_tweets(
+        thread_id INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        text TEXT NOT NULL,
+        tweet_id TEXT,
+        posted_at TEXT,
+        inflight_at TEXT,
+        PRIMARY KEY (thread_id, position)
+    )
+    """)
+    # post_tweet may have landed for a tweet marked in flight; owner is the worker
+    # holding a thread's publish claim (see services/thread_publisher.py)
+    for table, col in [("thread_tweets", "inflight_at TEXT"), ("threads", "owner TEXT")]:
+        try:
+            c.execute(f"ALTER TABLE {table} ADD COLUMN {col}")
+        except sqlite3.OperationalError:
+            pass  # column already exists
+
+    # Sharded workers: one lease row per match (held by worker_id until expires_at)
+    # and one row per live worker for fair-share balancing (see services/leases.py)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS match_leases(
+        match_id TEXT PRIMARY KEY,
+        worker_id TEXT NOT NULL,
+        acquired_at REAL NOT NULL,
+        expires_at REAL NOT NULL,
+        published_key TEXT
+    )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_match_leases_worker ON match_leases(worker_id)")
+
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS workers(
+        worker_id TEXT PRIMARY KEY,
+        started_at REAL NOT NULL,
+        heartbeat_at REAL NOT NULL
+    )
+    """)
+
+    # Banter ingestion: since-id cursor per X stream, and ranked reply candidates
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS x_cursors(
+        stream TEXT PRIMARY KEY,
+        since_id TEXT,
+        updated_at TEXT
+    )
+    """)
+
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS banter_candidates(
+        tweet_id TEXT PRIMARY KEY,
+        stream TEXT,
+        author_id TEXT,
+        author_username TEXT,
+        text TEXT,
+        conversation_id TEXT,
+        reply_to_id TEXT,
+        our_post_id TEXT,
+        created_at TEXT,
+        score REAL,
+        status TEXT NOT NULL DEFAULT 'new',
+        reply_text TEXT,
+        reply_id TEXT,
+        ingested_at TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0
+    )
+    """)
     try:
-        c.execute(f"ALTER TABLE posts ADD COLUMN {col} {typ}")
+        # Failed reply attempts (the candidate goes back to new until BANTER_MAX_ATTEMPTS)
+        c.execute("ALTER TABLE banter_candidates ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
     except sqlite3.OperationalError:
         pass  # column already exists
+    c.execute("CREATE INDEX IF NOT EXISTS idx_banter_status_score ON banter_candidates(status, score)")
+
+    conn.commit()
+
+
+def use_database(path):
+    """
+    Point this process at another learning DB (e.g. a scratch DB for profiling or
+    load tests). Call before worker threads open their connections.
+    """
+    global DB_PATH
+    db = getattr(_local, "conn", None)
+    if db is not None:
+        db.close()
+        _local.conn = None
+    DB_PATH = path
+    init_db()
+
 
-conn.commit()
+init_db()
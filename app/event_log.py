@@ -0,0 +1,183 @@
+"""
+Non-blocking structured event log.
+
+Callers only put log records on a queue; a QueueListener thread formats them
+(lazily, off the hot path) as JSON lines into logs/events.jsonl, rotated by size
+and by age, plus a short human-readable line on stdout. Every record carries
+the current trace ids (cycle, per-match trace, match id) from context vars, so
+the decision path of any posted tweet can be replayed from the log.
+
+Record schema (one JSON object per line):
+    ts, level, logger, msg, cycle_id, trace_id, match_id, event, data
+`event` is a dotted name such as "decision.made" and `data` its structured
+payload, both set via log_event(); plain logger calls have event = null.
+"""
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+import uuid
+
+from config import LOG_DIR, LOG_MAX_BYTES, LOG_ROTATE_SECONDS, LOG_BACKUP_COUNT, LOG_LEVEL
+
+EVENT_LOG_NAME = "events.jsonl"
+
+_cycle_id = contextvars.ContextVar("cycle_id", default=None)
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+_match_id = contextvars.ContextVar("match_id", default=None)
+
+_listener = None
+
+
+def new_id():
+    return uuid.uuid4().hex[:12]
+
+
+def current_trace():
+    """Trace ids bound in this context: {"cycle_id", "trace_id", "match_id"}."""
+    return {"cycle_id": _cycle_id.get(), "trace_id": _trace_id.get(), "match_id": _match_id.get()}
+
+
+@contextlib.contextmanager
+def bind(cycle_id=None, trace_id=None, match_id=None):
+    """Bind trace ids for log records emitted inside the block (this thread/context only)."""
+    tokens = []
+    for var, value in ((_cycle_id, cycle_id), (_trace_id, trace_id), (_match_id, match_id)):
+        if value is not None:
+            tokens.append((var, var.set(value)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def log_event(logger, event, msg, *args, level=logging.INFO, **data):
+    """
+    Emit a structured event. `msg` % args is only rendered by the listener, and
+    nothing is done at all when the level is disabled.
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, msg, *args, extra={"event": event, "data": data})
+
+
+class _ContextFilter(logging.Filter):
+    """Stamp trace ids on the record in the emitting thread (context vars don't cross the queue)."""
+
+    def filter(self, record):
+        record.cycle_id = _cycle_id.get()
+        record.trace_id = _trace_id.get()
+        record.match_id = _match_id.get()
+        return True
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that does not format in the caller: msg % args is left to the
+    listener thread. Only the traceback is rendered here (it holds live frames).
+    """
+
+    def prepare(self, record):
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _json_default(obj):
+    """Objects with to_dict() (e.g. MatchState) are logged as their dict form."""
+    to_dict = getattr(obj, "to_dict", None)
+    return to_dict() if callable(to_dict) else str(obj)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "cycle_id": getattr(record, "cycle_id", None),
+            "trace_id": getattr(record, "trace_id", None),
+            "match_id": getattr(record, "match_id", None),
+            "event": getattr(record, "event", None),
+            "data": getattr(record, "data", None),
+        }
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=_json_default, ensure_ascii=False)
+
+
+class SizeAndTimeRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Roll over when the file exceeds maxBytes or is older than `interval` seconds."""
+
+    def __init__(self, filename, maxBytes, interval, backupCount):
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, encoding="utf-8")
+        self.interval = interval
+        self._opened_at = time.time()
+
+    def shouldRollover(self, record):
+        if self.interval and time.time() - self._opened_at >= self.interval:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self._opened_at = time.time()
+
+
+class _ConsoleFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        trace = getattr(record, "trace_id", None) or getattr(record, "cycle_id", None)
+        return "{} [{}]".format(line, trace) if trace else line
+
+
+def setup_logging(name="main_logger"):
+    """
+    Route `name` (and its children) through the async queue. Returns the logger.
+    Safe to call more than once; the previous listener is stopped first.
+    """
+    global _listener
+    os.makedirs(LOG_DIR, exist_ok=True)
+    log_file = os.path.join(LOG_DIR, EVENT_LOG_NAME)
+
+    if _listener is not None:
+        _listener.stop()
+
+    file_handler = SizeAndTimeRotatingFileHandler(log_file, LOG_MAX_BYTES, LOG_ROTATE_SECONDS, LOG_BACKUP_COUNT)
+    file_handler.setFormatter(JsonFormatter())
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(_ConsoleFormatter("%(asctime)s %(levelname)s %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+    logger = logging.getLogger(name)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
+    queue_handler = _LazyQueueHandler(log_queue)
+    queue_handler.addFilter(_ContextFilter())
+    logger.addHandler(queue_handler)
+
+    logger.info("Logger initialized. Writing structured events to %s", log_file)
+    return logger
+
+
+def shutdown_logging():
+    """Flush queued records to the handlers and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
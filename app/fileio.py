@@ -0,0 +1,28 @@
+"""
+Crash-safe file writes shared by the snapshot cache and the learning job.
+"""
+import contextlib
+import json
+import os
+import tempfile
+
+
+def write_json_atomic(path, data, **dump_kwargs):
+    """
+    Replace `path` with `data` as JSON: written to a temp file in the same
+    directory, fsynced, then os.replace'd, so readers see the old or the new
+    file, never a partial one. dump_kwargs go to json.dump.
+    """
+    directory = os.path.dirname(path) or "."
+    name = os.path.basename(path)
+    fd, tmp = tempfile.mkstemp(prefix=".{}.".format(os.path.splitext(name)[0]), suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, **dump_kwargs)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
@@ -1,98 +1,100 @@
+import json
 import logging
-import os
 import time
-from datetime import datetime
 
 from openai import RateLimitError
-from config import MATCH_LOOP_SECONDS
-from agents.watcher_agent import watch_match
-from agents.narrative_agent import detect_narrative
-from agents.strategist_agent import should_post
-from agents.decision_agent import run_decision
-from agents.engagement_agent import save_post
-from x_client import post_tweet
-from safety import human_delay, is_duplicate, remember_post
+from config import (
+    MATCH_LOOP_SECONDS,
+    FEEDBACK_INTERVAL_SECONDS,
+    JOB_WORKERS,
+    SHARDED_WORKERS,
+    LEASE_HEARTBEAT_SECONDS,
+    BANTER_ENABLED,
+    BANTER_INTERVAL_SECONDS,
+    LEARN_ENABLED,
+    LEARN_INTERVAL_SECONDS,
+)
+from pipeline import get_pipeline, shutdown_pipeline
+from runtime import JobRuntime
+from services.rules import log_rule_stats
+from event_log import setup_logging, bind, new_id
 from openai_errors import handle_openai_rate_limit
 
 def setup_logger():
-    # Called once per main start. Log file path: logs/run_YYYYMMDD_HHMMSS.log
-    log_dir = "logs"
-    os.makedirs(log_dir, exist_ok=True)
-    now_str = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_file = os.path.join(log_dir, f"run_{now_str}.log")
+    # Called once per main start. Structured JSON events go to logs/events.jsonl
+    # (rotated by size/age) through a background queue; short lines go to stdout.
+    return setup_logging("main_logger")
 
-    logger = logging.getLogger("main_logger")
-    logger.setLevel(logging.INFO)
-    # Remove all old handlers if called more than once
-    for handler in logger.handlers[:]:
-        logger.removeHandler(handler)
-
-    formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
-    
-    file_handler = logging.FileHandler(log_file)
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-    # Optional: also output to stdout (visible in docker/logs)
-    stream_handler = logging.StreamHandler()
-    stream_handler.setFormatter(formatter)
-    logger.addHandler(stream_handler)
-
-    logger.info("Logger initialized. Writing logs to %s", log_file)
-    return logger
-
-logger = None  # Will be set in __main__
+# Handlers are attached by setup_logger(); usable (no-op) when imported elsewhere
+logger = logging.getLogger("main_logger")
 
 def run_cycle():
-    """V6: Simulate 3 candidates, predict engagement, post best, save predicted for learning."""
-    global logger
+    """
+    Feed one ingest tick into the staged pipeline (ingest → narrative → decision
+    → publish → persist). Returns immediately; if the previous tick has not been
+    picked up yet the new one is coalesced into it.
+    """
+    pipeline = get_pipeline()
+    if pipeline.error is not None:
+        raise pipeline.error
+    cycle_id = new_id()
+    with bind(cycle_id=cycle_id):
+        if not pipeline.submit({"tick": time.time(), "cycle_id": cycle_id}):
+            logger.info("Previous ingest still pending, coalescing this cycle.")
+        pipeline.log_stats()
+
+
+def run_feedback_job():
+    """Feedback cycle as a runtime job: OpenAI quota errors still stop the process."""
+    from services.feedback_learning import run_feedback_cycle
     try:
-        logger.info("Starting run_cycle")
-
-        match_list = watch_match()
-        if not match_list:
-            logger.info("No matches to process, skipping cycle.")
-            return
-
-        for event, state in match_list:
-            logger.info("Processing match: %s %s", event, state)
-            print(event, state)
-
-            emotion = detect_narrative(event, state)
-            logger.info("Detected narrative/emotion: %s", emotion)
-
-            if not should_post(event, emotion):
-                logger.info("Should not post for this event-emotion, skipping.")
-                continue
-
-            # V6 Decision Intelligence: 3 candidates → predict engagement → choose best
-            post, predicted_score = run_decision(event, emotion, num_candidates=3)
-            logger.info("Decision made: post candidate '%s' with predicted score %s", post, predicted_score)
-
-            if is_duplicate(post):
-                logger.warning("Post is a duplicate, aborting: '%s'", post)
-                continue
-
-            logger.info("Waiting human delay before posting...")
-            human_delay()
-
-            post_id = post_tweet(post)
-            logger.info("Posted tweet with id %s", post_id)
-
-            remember_post(post)
-            logger.info("Remembered post for duplicate checking.")
-
-            save_post(post_id, post, emotion, emotion, predicted_score=predicted_score)
-            logger.info("Saved post: %s (predicted score %s)", post, predicted_score)
-
-            print("Posted (predicted score {}): {}".format(predicted_score, post))
-            logger.info("Posted (predicted score {}): {}".format(predicted_score, post))
-            # wait for 5 secconds
-            print("Waiting for 5 Seconds")
-            time.sleep(5)
-
-    except Exception as e:
-        logger.exception("Exception occurred in run_cycle: %s", e)
-        raise
+        n = run_feedback_cycle()
+        logger.info("Updated engagement for %d posts", n)
+    except RateLimitError as e:
+        logger.error("OpenAI RateLimitError: %s", e)
+        handle_openai_rate_limit(e)
+
+
+def create_runtime(with_feedback=True):
+    """
+    Job runtime used by both entry points (main loop and scheduler.py).
+    run_cycle never overlaps itself; missed runs coalesce into one.
+    """
+    from services.thread_publisher import start_thread_publisher, stop_thread_publisher
+
+    runtime = JobRuntime(max_workers=JOB_WORKERS)
+    runtime.add_job(run_cycle, MATCH_LOOP_SECONDS, priority=10, jitter=2, max_instances=1, coalesce=True)
+    if with_feedback:
+        # V6: learn from misses — backfill actual engagement every 15 min
+        runtime.add_job(run_feedback_job, FEEDBACK_INTERVAL_SECONDS, name="feedback", priority=1,
+                        jitter=30, max_instances=1, coalesce=True, run_immediately=False)
+        if LEARN_ENABLED:
+            from services.learning import run_learning
+            # Refit weights/thresholds from the backfilled engagement; rules hot-load the result
+            runtime.add_job(run_learning, LEARN_INTERVAL_SECONDS, name="learning", priority=0,
+                            jitter=60, max_instances=1, coalesce=True, run_immediately=False)
+    if BANTER_ENABLED:
+        from services.banter import run_banter_cycle
+        # Mentions/replies: below run_cycle so live match posts always go first
+        runtime.add_job(run_banter_cycle, BANTER_INTERVAL_SECONDS, name="banter", priority=5,
+                        jitter=10, max_instances=1, coalesce=True, run_immediately=False)
+    runtime.add_job(runtime.log_stats, 300, name="runtime_stats", priority=0, run_immediately=False)
+    runtime.add_job(log_rule_stats, 300, name="rule_stats", priority=0, run_immediately=False)
+    if SHARDED_WORKERS:
+        from services.leases import heartbeat, release_all
+        from services.thread_publisher import renew_claims
+        # Keep leases alive even when a cycle runs long; hand them back once posts are drained
+        runtime.add_job(heartbeat, LEASE_HEARTBEAT_SECONDS, name="lease_heartbeat", priority=20,
+                        run_immediately=False)
+        # Thread claims too: the publisher may sit in the X write limiter for minutes
+        runtime.add_job(renew_claims, LEASE_HEARTBEAT_SECONDS, name="thread_claims", priority=20,
+                        run_immediately=False)
+    start_thread_publisher()  # resumes threads left unfinished by a previous run
+    runtime.on_shutdown(shutdown_pipeline)
+    if SHARDED_WORKERS:
+        runtime.on_shutdown(release_all)
+    runtime.on_shutdown(stop_thread_publisher)
+    return runtime
 
 
 if __name__ == "__main__":
@@ -116,14 +118,27 @@ if __name__ == "__main__":
         except Exception as e:
             logger.exception("Exception in feedback mode: %s", e)
             raise
+    elif len(sys.argv) > 1 and sys.argv[1] == "calibration":
+        # Predicted vs actual engagement, from the materialized aggregates
+        from services.engagement_stats import format_calibration_report
+        report = format_calibration_report()
+        logger.info("Calibration report:\n%s", report)
+        print(report)
+    elif len(sys.argv) > 2 and sys.argv[1] == "trace":
+        # Replay the decision path of a posted tweet from logs/events.jsonl
+        from services.trace_replay import replay_post, format_replay
+        replay = replay_post(sys.argv[2])
+        print(format_replay(replay) if replay else "No trace recorded for post {}".format(sys.argv[2]))
+    elif len(sys.argv) > 1 and sys.argv[1] == "learn":
+        # Refit decision params from measured posts into data/params/ (--dry-run to only print them)
+        from services.learning import main as learn_main
+        params = learn_main(sys.argv[2:])
+        print(json.dumps(params, indent=2) if params else "Not enough measured posts to learn from yet")
+    elif len(sys.argv) > 1 and sys.argv[1] == "profile":
+        # N dry-run cycles under cProfile/tracemalloc; reports go to data/profiles/<run>/
+        from profiling import main as profile_main
+        run_dir = profile_main(sys.argv[2:])
+        print("Profile written to {}".format(run_dir))
     else:
         logger.info("Starting main cron-loop (infinite mode)")
-        while True:
-            try:
-                run_cycle()
-                time.sleep(MATCH_LOOP_SECONDS)
-            except RateLimitError as e:
-                logger.error("OpenAI RateLimitError: %s", e)
-                handle_openai_rate_limit(e)
-            except Exception as e:
-                logger.exception("Unhandled exception in main loop: %s", e)
\ No newline at end of file
+        create_runtime(with_feedback=False).run()
\ No newline at end of file
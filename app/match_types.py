@@ -0,0 +1,208 @@
+"""
+Compact match representations shared by reference across the agent pipeline.
+
+A CricAPI match dict is parsed once into a MatchSnapshot (teams and innings as
+tuples of slotted InningsScore). Its event summary and MatchState are built on
+first use and cached; MatchState reads teams/score from the snapshot instead of
+copying them, and derives required_rr / overs_left lazily.
+
+MatchState also answers state["required_rr"] / state.get("teams") so callers
+written against the old state dict keep working.
+"""
+
+# Overs per format for state derivation
+OVERS_PER_FORMAT = {"t20": 20, "odi": 50, "test": None}
+
+_UNSET = object()
+
+
+class InningsScore:
+    __slots__ = ("inning", "runs", "wickets", "overs")
+
+    def __init__(self, inning, runs, wickets, overs):
+        self.inning = inning
+        self.runs = runs
+        self.wickets = wickets
+        self.overs = overs
+
+    @classmethod
+    def from_api(cls, s):
+        return cls(s.get("inning", ""), s.get("r", 0) or 0, s.get("w", 0) or 0, float(s.get("o", 0) or 0))
+
+    def get(self, key, default=None):
+        """API-shaped access (r / w / o / inning) for older callers."""
+        return _INNINGS_KEYS[key](self) if key in _INNINGS_KEYS else default
+
+    def key(self):
+        return (self.inning, self.runs, self.wickets, self.overs)
+
+    def to_dict(self):
+        return {"inning": self.inning, "r": self.runs, "w": self.wickets, "o": self.overs}
+
+
+_INNINGS_KEYS = {
+    "inning": lambda s: s.inning,
+    "r": lambda s: s.runs,
+    "w": lambda s: s.wickets,
+    "o": lambda s: s.overs,
+}
+
+
+class MatchSnapshot:
+    """One match as fetched from CricAPI, parsed once."""
+
+    __slots__ = (
+        "match_id", "name", "match_type", "status", "teams", "score",
+        "started", "ended", "fetched_at", "api_time",
+        "_event", "_state", "_key",
+    )
+
+    def __init__(self, match_id, name, match_type, status, teams, score, started, ended,
+                 fetched_at=None, api_time=None):
+        self.match_id = match_id
+        self.name = name
+        self.match_type = match_type
+        self.status = status
+        self.teams = teams
+        self.score = score
+        self.started = started
+        self.ended = ended
+        self.fetched_at = fetched_at
+        self.api_time = api_time
+        self._event = None
+        self._state = None
+        self._key = None
+
+    @classmethod
+    def from_api(cls, match):
+        return cls(
+            match.get("id"),
+            match.get("name", ""),
+            match.get("matchType", ""),
+            match.get("status", ""),
+            tuple(match.get("teams") or ()),
+            tuple(InningsScore.from_api(s) for s in match.get("score") or ()),
+            bool(match.get("matchStarted")),
+            bool(match.get("matchEnded")),
+            match.get("_fetched_at"),
+            match.get("_api_time"),
+        )
+
+    @property
+    def is_live(self):
+        return self.started and not self.ended
+
+    @property
+    def event(self):
+        """Short event string for narrative/decision agents (built once)."""
+        if self._event is None:
+            parts = ["{}: {}/{} ({} overs)".format(s.inning, s.runs, s.wickets, _overs_str(s.overs))
+                     for s in self.score]
+            self._event = "{}. {}. {}".format(self.name or "Match", self.status or "Unknown status",
+                                              " | ".join(parts)).strip()
+        return self._event
+
+    @property
+    def state(self):
+        if self._state is None:
+            self._state = MatchState(self)
+        return self._state
+
+    @property
+    def state_key(self):
+        """Signature of the scoreboard; changes whenever runs, wickets, overs or status move."""
+        if self._key is None:
+            self._key = (tuple(s.key() for s in self.score), self.status)
+        return self._key
+
+
+def _overs_str(overs):
+    return str(int(overs)) if overs == int(overs) else str(overs)
+
+
+class MatchState:
+    """Derived match state for narrative/strategist; fields computed on first access."""
+
+    __slots__ = ("snapshot", "_required_rr", "_overs_left")
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self._required_rr = _UNSET
+        self._overs_left = _UNSET
+
+    def _derive(self):
+        required_rr, overs_left = 0.0, 0
+        score = self.snapshot.score
+        max_overs = OVERS_PER_FORMAT.get((self.snapshot.match_type or "").lower())
+        if score and max_overs:
+            # Last inning in list is current or just finished
+            last = score[-1]
+            overs_left = max(0, int(max_overs - last.overs))
+            if len(score) >= 2 and overs_left > 0:
+                # Second inning: target = first inning runs + 1
+                runs_needed = max(0, score[0].runs + 1 - last.runs)
+                required_rr = round(runs_needed / overs_left, 2)
+        self._required_rr = required_rr
+        self._overs_left = overs_left
+
+    @property
+    def required_rr(self):
+        if self._required_rr is _UNSET:
+            self._derive()
+        return self._required_rr
+
+    @property
+    def overs_left(self):
+        if self._overs_left is _UNSET:
+            self._derive()
+        return self._overs_left
+
+    @property
+    def runs_needed(self):
+        score = self.snapshot.score
+        if len(score) < 2:
+            return None
+        return max(0, score[0].runs + 1 - score[-1].runs)
+
+    @property
+    def batting_team(self):
+        """Team of the most recent innings (CricAPI inning label, e.g. 'India Inning 1')."""
+        snap = self.snapshot
+        if snap.score:
+            inning = snap.score[-1].inning or ""
+            for t in snap.teams:
+                if t and inning.startswith(t):
+                    return t
+        return snap.teams[0] if snap.teams else None
+
+    # Shared with the snapshot, never copied
+    match_id = property(lambda self: self.snapshot.match_id)
+    name = property(lambda self: self.snapshot.name)
+    match_type = property(lambda self: self.snapshot.match_type)
+    status = property(lambda self: self.snapshot.status)
+    match_ended = property(lambda self: self.snapshot.ended)
+    teams = property(lambda self: self.snapshot.teams)
+    score = property(lambda self: self.snapshot.score)
+    fetched_at = property(lambda self: self.snapshot.fetched_at)
+    api_time = property(lambda self: self.snapshot.api_time)
+    state_key = property(lambda self: self.snapshot.state_key)
+
+    KEYS = (
+        "required_rr", "overs_left", "match_type", "match_ended", "status", "name",
+        "teams", "score", "match_id", "fetched_at", "api_time", "state_key",
+    )
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.KEYS else default
+
+    def to_dict(self):
+        """Plain dict (API-shaped scores) for logs and JSON."""
+        d = {k: getattr(self, k) for k in self.KEYS}
+        d["teams"] = list(d["teams"])
+        d["score"] = [s.to_dict() for s in d["score"]]
+        return d
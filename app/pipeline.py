@@ -0,0 +1,467 @@
+"""
+Staged posting pipeline: ingest → narrative → decision → publish → persist.
+
+Each stage has its own worker pool and a bounded input queue. When a downstream
+stage is slow (usually OpenAI or X), upstream puts block for a short while
+(backpressure); if the queue is still full the oldest queued event is shed, and
+workers drop events that have gone stale while waiting.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+from config import (
+    PIPELINE_WORKERS,
+    PIPELINE_QUEUE_SIZE,
+    STALE_EVENT_SECONDS,
+    BACKPRESSURE_TIMEOUT,
+    MIN_POST_DELAY,
+    DECISION_BUDGET_SECONDS,
+    FRESHNESS_ACTION,
+    SHARDED_WORKERS,
+)
+from agents.watcher_agent import watch_match
+from agents.narrative_agent import detect_narrative
+from agents.strategist_agent import should_post, choose_num_candidates
+from services.rules import evaluate_batch, extract_features
+from agents.decision_agent import run_decision
+from agents.engagement_agent import save_post
+from x_client import post_tweet
+from safety import human_delay, is_duplicate, remember_post
+from event_log import bind, log_event, new_id
+from services.freshness import record_snapshot, latest_snapshot, check_freshness, mark_published, was_published
+from services.leases import filter_owned, holds_lease, record_published
+
+logger = logging.getLogger("main_logger.pipeline")
+
+# Window (seconds) over which per-stage throughput is reported
+THROUGHPUT_WINDOW = 60
+
+
+def _bind(item):
+    """Bind the item's cycle/trace/match ids for log records emitted while handling it."""
+    state = item.get("state")
+    return bind(cycle_id=item.get("cycle_id"), trace_id=item.get("trace_id"),
+                match_id=state.match_id if state is not None else None)
+
+
+class Stage:
+    """One pipeline stage: a bounded queue drained by a pool of worker threads."""
+
+    def __init__(self, name, handler, workers=1, maxsize=16, max_age=None):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.max_age = max_age
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.next = None
+        self.pipeline = None
+        self.stopping = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._done_times = deque()
+        self.busy = 0
+        self.processed = 0
+        self.filtered = 0
+        self.shed = 0
+        self.errors = 0
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout=None):
+        """Let workers drain what is already queued, then exit."""
+        self.stopping.set()
+        for t in self._threads:
+            t.join(timeout)
+
+    def put(self, item, timeout=None):
+        """
+        Enqueue an item, blocking up to `timeout` (default BACKPRESSURE_TIMEOUT) seconds
+        while the stage is full. If it is still full, shed the oldest queued item to make room.
+        """
+        item.setdefault("enqueued_at", time.monotonic())
+        try:
+            self.queue.put(item, timeout=BACKPRESSURE_TIMEOUT if timeout is None else timeout)
+            return True
+        except queue.Full:
+            pass
+        try:
+            old = self.queue.get_nowait()
+            self.queue.task_done()
+            self._count("shed")
+            with _bind(old):
+                log_event(logger, "stage.shed", "Stage %s full, shed oldest event", self.name,
+                          level=logging.WARNING, stage=self.name)
+        except queue.Empty:
+            pass
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self._count("shed")
+            with _bind(item):
+                log_event(logger, "stage.shed", "Stage %s full, shed new event", self.name,
+                          level=logging.WARNING, stage=self.name)
+            return False
+
+    def _is_stale(self, item):
+        if not self.max_age:
+            return False
+        return time.monotonic() - item.get("ingested_at", time.monotonic()) > self.max_age
+
+    def _count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def _record_done(self):
+        """One item handled: counted as processed and in the per-minute throughput."""
+        with self._lock:
+            self.processed += 1
+            self._done_times.append(time.monotonic())
+
+    def _work(self):
+        while not (self.stopping.is_set() and self.queue.empty()):
+            try:
+                item = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                if self._is_stale(item):
+                    self._count("shed")
+                    with _bind(item):
+                        log_event(logger, "stage.shed", "Stage %s dropped stale event", self.name, stage=self.name)
+                    continue
+                with self._lock:
+                    self.busy += 1
+                try:
+                    with _bind(item):
+                        out = self.handler(item)
+                finally:
+                    with self._lock:
+                        self.busy -= 1
+                    self._record_done()
+                if out is None:
+                    self._count("filtered")
+                    continue
+                if self.next is not None:
+                    for nxt in out if isinstance(out, list) else [out]:
+                        nxt["enqueued_at"] = time.monotonic()
+                        self.next.put(nxt)
+            except SystemExit as e:
+                # handle_openai_rate_limit exits on exhausted quota; surface it to the caller
+                self.pipeline.fail(e)
+            except Exception as e:
+                self._count("errors")
+                logger.exception("Stage %s failed on event %s: %s", self.name, item.get("event"), e)
+            finally:
+                self.queue.task_done()
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._done_times and now - self._done_times[0] > THROUGHPUT_WINDOW:
+                self._done_times.popleft()
+            return {
+                "depth": self.queue.qsize(),
+                "maxsize": self.queue.maxsize,
+                "workers": self.workers,
+                "busy": self.busy,
+                "processed": self.processed,
+                "filtered": self.filtered,
+                "shed": self.shed,
+                "errors": self.errors,
+                "per_min": round(len(self._done_times) * 60.0 / THROUGHPUT_WINDOW, 1),
+            }
+
+
+class Pipeline:
+    """Chain of stages; items returned by one stage's handler flow into the next."""
+
+    def __init__(self, stages):
+        self.stages = stages
+        self.error = None
+        for stage, nxt in zip(stages, stages[1:] + [None]):
+            stage.pipeline = self
+            stage.next = nxt
+        self._started = False
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        for stage in self.stages:
+            stage.start()
+
+    def fail(self, exc):
+        self.error = exc
+        for stage in self.stages:
+            stage.stopping.set()
+
+    def submit(self, item):
+        """
+        Feed an item into the first stage without blocking.
+        Returns False if the stage is still full from the previous submit (coalesced).
+        """
+        item.setdefault("enqueued_at", time.monotonic())
+        try:
+            self.stages[0].queue.put_nowait(item)
+            return True
+        except queue.Full:
+            return False
+
+    def run_inline(self, item):
+        """
+        Push one item through every stage handler in the calling thread, without
+        queues or workers (profile mode: all the work lands in one profiled thread).
+        Returns the items that came out of the last stage.
+        """
+        items = [item]
+        for stage in self.stages:
+            out_items = []
+            for it in items:
+                try:
+                    with _bind(it):
+                        out = stage.handler(it)
+                except Exception as e:
+                    stage._count("errors")
+                    logger.exception("Stage %s failed on event %s: %s", stage.name, it.get("event"), e)
+                    continue
+                stage._record_done()
+                if out is None:
+                    stage._count("filtered")
+                    continue
+                out_items.extend(out if isinstance(out, list) else [out])
+            items = out_items
+        return items
+
+    def stop(self, timeout=None):
+        """
+        Discard pending ingest ticks, then drain the remaining stages in order so
+        every event already in flight is posted and saved before exit.
+        """
+        first = self.stages[0].queue
+        while True:
+            try:
+                first.get_nowait()
+                first.task_done()
+            except queue.Empty:
+                break
+        for stage in self.stages:
+            stage.stop(timeout)
+
+    def stats(self):
+        return {stage.name: stage.stats() for stage in self.stages}
+
+    def log_stats(self):
+        for name, s in self.stats().items():
+            logger.info(
+                "stage=%s depth=%d/%d busy=%d/%d processed=%d per_min=%s filtered=%d shed=%d errors=%d",
+                name, s["depth"], s["maxsize"], s["busy"], s["workers"], s["processed"],
+                s["per_min"], s["filtered"], s["shed"], s["errors"],
+            )
+
+
+# -----------------------------------------------------------------------------
+# Stage handlers (posting flow)
+# -----------------------------------------------------------------------------
+
+
+def ingest(tick):
+    """Fetch matches once and fan out one item (with its own trace id) per match."""
+    match_list = watch_match()
+    if match_list and SHARDED_WORKERS:
+        match_list = filter_owned(match_list)  # only matches this worker holds a lease on
+    if not match_list:
+        logger.info("No matches to process.")
+        return None
+    now = time.monotonic()
+    # Narrative/posting rules for every match in one pass; narrate() uses the verdicts
+    verdicts = evaluate_batch(match_list)
+    items = []
+    for (event, state), verdict in zip(match_list, verdicts):
+        record_snapshot(event, state)
+        item = {
+            "event": event,
+            "state": state,
+            "verdict": verdict,
+            "ingested_at": now,
+            "cycle_id": tick.get("cycle_id"),
+            "trace_id": new_id(),
+        }
+        with _bind(item):
+            log_event(logger, "ingest.snapshot", "Processing match: %s", event, event_text=event, state=state)
+        items.append(item)
+    return items
+
+
+def narrate(item):
+    """Detect narrative and drop events the strategist would not post."""
+    event, state = item["event"], item["state"]
+    verdict = item.pop("verdict", None)  # evaluated at ingest; absent for regenerated items
+    if verdict is not None:
+        emotion, _, post = verdict
+    else:
+        emotion = detect_narrative(event, state)
+        post = should_post(event, emotion, state)
+    log_event(logger, "narrative.detected", "Detected narrative/emotion: %s (post=%s)", emotion, post,
+              emotion=emotion, should_post=post)
+    if not post:
+        return None
+    item["emotion"] = emotion
+    return item
+
+
+def _decision_deadline(item):
+    """
+    time.monotonic() deadline DECISION_BUDGET_SECONDS after the snapshot was fetched.
+    fetched_at is wall clock (a cached snapshot may already be SNAPSHOT_TTL_SECONDS
+    old at ingest), so the time already spent is taken off the budget.
+    """
+    fetched_at = item["state"].fetched_at
+    if fetched_at is None:
+        return item["ingested_at"] + DECISION_BUDGET_SECONDS
+    return time.monotonic() + (fetched_at + DECISION_BUDGET_SECONDS - time.time())
+
+
+def decide(item):
+    """
+    V6 Decision Intelligence: N candidates (learned, see choose_num_candidates) →
+    predict engagement → choose best, within DECISION_BUDGET_SECONDS of the fetch
+    (template fast path otherwise).
+    """
+    deadline = _decision_deadline(item)
+    item["num_candidates"] = choose_num_candidates()
+    post, predicted_score, source = run_decision(
+        item["event"], item["emotion"], num_candidates=item["num_candidates"], state=item["state"],
+        deadline=deadline,
+    )
+    log_event(logger, "decision.made", "Decision made (%s path): '%s' with predicted score %s",
+              source, post, predicted_score, post=post, predicted_score=predicted_score, source=source)
+    item["post"] = post
+    item["predicted_score"] = predicted_score
+    item["source"] = source
+    return item
+
+
+def _regenerate(item, reason):
+    """Redo narrative + decision on the newest snapshot of the same match (same trace id)."""
+    event, state = latest_snapshot(item["state"].match_id)
+    if event is None or check_freshness(state):
+        log_event(logger, "freshness.dropped", "No fresh snapshot to regenerate from (%s), dropping", reason,
+                  reason=reason)
+        return None
+    log_event(logger, "freshness.regenerate", "Regenerating %s decision on latest snapshot: %s", reason, event,
+              reason=reason, event_text=event, state=state)
+    new = dict(item, event=event, state=state, ingested_at=time.monotonic(), regenerated=True)
+    new = narrate(new)
+    return decide(new) if new is not None else None
+
+
+def publish(item):
+    """
+    Human delay, then a freshness check against the SLA (drop or regenerate if the
+    source state went stale or was superseded), post to X and remember the text.
+    """
+    if is_duplicate(item["post"]):
+        log_event(logger, "publish.duplicate", "Post is a duplicate, aborting", level=logging.WARNING)
+        return None
+    human_delay()
+
+    reason = check_freshness(item["state"])
+    if reason:
+        if FRESHNESS_ACTION != "regenerate" or item.get("regenerated"):
+            log_event(logger, "freshness.dropped", "Dropping %s decision", reason, reason=reason)
+            return None
+        item = _regenerate(item, reason)
+        if item is None or is_duplicate(item["post"]):
+            return None
+    if was_published(item["state"]):
+        log_event(logger, "publish.skipped", "Already posted about this scoreboard, skipping",
+                  reason="already_published")
+        return None
+    if SHARDED_WORKERS and not holds_lease(item["state"].match_id):
+        log_event(logger, "publish.skipped", "Lease on this match moved to another worker, skipping",
+                  reason="lease_lost")
+        return None
+
+    post = item["post"]
+    item["post_id"] = post_tweet(post)
+    item["posted_at"] = time.time()
+    remember_post(post)
+    mark_published(item["state"])
+    if SHARDED_WORKERS:
+        record_published(item["state"])
+    log_event(logger, "publish.posted", "Posted tweet with id %s: %s", item["post_id"], post,
+              post_id=item["post_id"], post=post)
+    time.sleep(MIN_POST_DELAY)  # pace consecutive posts
+    return item
+
+
+def persist(item):
+    """
+    Save the post with its predicted score, event-to-post latency and decision
+    features for learning from misses.
+    """
+    emotion = item["emotion"]
+    state = item["state"]
+    features = dict(extract_features(item["event"], state), emotion=emotion)
+    save_post(
+        item["post_id"], item["post"], emotion, emotion,
+        predicted_score=item["predicted_score"], source=item["source"],
+        match_id=state.match_id, event_fetched_at=state.fetched_at,
+        posted_at=item["posted_at"], trace_id=item.get("trace_id"),
+        num_candidates=item.get("num_candidates"), features=features,
+    )
+    log_event(logger, "persist.saved", "Saved post %s", item["post_id"], post_id=item["post_id"])
+    return item
+
+
+def _stage(name, handler, max_age=None):
+    return Stage(
+        name,
+        handler,
+        workers=PIPELINE_WORKERS.get(name, 1),
+        maxsize=PIPELINE_QUEUE_SIZE.get(name, 16),
+        max_age=max_age,
+    )
+
+
+def build_pipeline():
+    return Pipeline([
+        _stage("ingest", ingest),
+        _stage("narrative", narrate, max_age=STALE_EVENT_SECONDS),
+        _stage("decision", decide, max_age=STALE_EVENT_SECONDS),
+        _stage("publish", publish, max_age=STALE_EVENT_SECONDS),
+        _stage("persist", persist),
+    ])
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline():
+    """Process-wide posting pipeline, started on first use."""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = build_pipeline()
+            _pipeline.start()
+        return _pipeline
+
+
+def shutdown_pipeline(timeout=None):
+    """Drain and stop the process-wide pipeline if it was started."""
+    global _pipeline
+    with _pipeline_lock:
+        pipeline, _pipeline = _pipeline, None
+    if pipeline is not None:
+        logger.info("Draining pipeline before exit")
+        pipeline.stop(timeout)
+        pipeline.log_stats()
@@ -0,0 +1,256 @@
+"""
+Profile mode: run N posting cycles (and optionally the feedback job) under
+cProfile, tracemalloc and a stack sampler, then write reports to
+PROFILE_DIR/<run>/:
+
+    hot_functions.txt   cProfile ranking by cumulative and by own time
+    profile.prof        raw cProfile stats (pstats / snakeviz)
+    allocations.txt     tracemalloc top-N by module (innermost app frame) and by line
+    stacks.folded       collapsed stacks of every thread (flamegraph.pl, speedscope)
+    summary.json        run settings and per-cycle timings
+
+Cycles run the real stage handlers inline in this thread (Pipeline.run_inline),
+against live CricAPI, a recording (--input FILE), the fake feed (--input fake)
+or the match simulator (--input sim).
+Nothing is posted (dry-run ids), and all writes go to a copy of the learning DB.
+
+    python app/main.py profile [--cycles N] [--input live|fake|sim|FILE] [--record FILE]
+                               [--offline] [--feedback] [--interval SECONDS]
+"""
+import argparse
+import collections
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+from config import PROFILE_DIR, PROFILE_TOP_N, PROFILE_SAMPLE_SECONDS, PROFILE_TRACE_FRAMES
+import cricket_events
+import database
+import sandbox
+from event_log import bind, new_id
+from pipeline import build_pipeline
+from simulator import MatchSimulator
+
+logger = logging.getLogger("main_logger.profile")
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _module_name(filename):
+    """Dotted module for app files (agents.writer_agent); top-level package/module otherwise."""
+    path = os.path.abspath(filename)
+    if path.startswith(APP_DIR + os.sep):
+        rel = os.path.relpath(path, APP_DIR)
+        return os.path.splitext(rel)[0].replace(os.sep, ".")
+    parts = path.replace("\\", "/").split("/")
+    if "site-packages" in parts:
+        return parts[parts.index("site-packages") + 1].split(".")[0]
+    if filename.startswith("<"):
+        return filename
+    return os.path.splitext(parts[-1])[0]
+
+
+def _is_app_file(filename):
+    return os.path.abspath(filename).startswith(APP_DIR + os.sep)
+
+
+class StackSampler:
+    """Samples every thread's stack at a fixed interval into collapsed-stack counts."""
+
+    def __init__(self, interval=PROFILE_SAMPLE_SECONDS):
+        self.interval = interval
+        self.counts = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append("{}:{}".format(_module_name(code.co_filename), code.co_name))
+                    frame = frame.f_back
+                stack.append(names.get(ident, "thread-{}".format(ident)))
+                self.counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.counts.most_common():
+                f.write("{} {}\n".format(stack, count))
+
+
+def _hot_functions(profile, top_n):
+    out = io.StringIO()
+    for sort, title in (("cumulative", "by cumulative time"), ("tottime", "by own time")):
+        out.write("=== Hot functions {} (top {}) ===\n".format(title, top_n))
+        stats = pstats.Stats(profile, stream=out)
+        stats.strip_dirs().sort_stats(sort).print_stats(top_n)
+    return out.getvalue()
+
+
+def _allocations(before, after, top_n):
+    """Net allocations during the run, by app module (innermost app frame) and by line."""
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    before, after = before.filter_traces(ignore), after.filter_traces(ignore)
+    diffs = after.compare_to(before, "traceback")
+    by_module = collections.defaultdict(lambda: [0, 0])
+    by_alloc_module = collections.defaultdict(lambda: [0, 0])
+    for d in diffs:
+        if d.size_diff <= 0:
+            continue
+        frames = list(d.traceback)  # oldest → most recent
+        owner = next((f for f in reversed(frames) if _is_app_file(f.filename)), frames[-1])
+        for table, frame in ((by_module, owner), (by_alloc_module, frames[-1])):
+            entry = table[_module_name(frame.filename)]
+            entry[0] += d.size_diff
+            entry[1] += d.count_diff
+
+    lines = []
+    for title, table in (("by app module (innermost app frame)", by_module),
+                         ("by allocating module", by_alloc_module)):
+        lines.append("=== Net allocations {} (top {}) ===".format(title, top_n))
+        lines.append("{:>12} {:>10}  {}".format("bytes", "blocks", "module"))
+        for name, (size, count) in sorted(table.items(), key=lambda kv: -kv[1][0])[:top_n]:
+            lines.append("{:>12} {:>10}  {}".format(size, count, name))
+        lines.append("")
+
+    lines.append("=== Net allocations by line (top {}) ===".format(top_n))
+    for d in after.compare_to(before, "lineno")[:top_n]:
+        frame = d.traceback[0]
+        lines.append("{:>12} {:>10}  {}:{}".format(d.size_diff, d.count_diff,
+                                                   _module_name(frame.filename), frame.lineno))
+    return "\n".join(lines) + "\n"
+
+
+def _match_source(input_name, record):
+    if input_name == "fake":
+        return sandbox.fake_source()
+    if input_name == "sim":
+        return MatchSimulator(num_matches=10).source
+    if input_name != "live":
+        return sandbox.recorded_source(input_name)
+    if record:
+        return sandbox.recording_source(record, cricket_events.fetch_current_matches)
+    return None
+
+
+def run_profile(cycles=5, input_name="live", record=None, offline=False, feedback=False,
+                interval=0.0, top_n=PROFILE_TOP_N, out_dir=PROFILE_DIR):
+    """Profile `cycles` posting cycles (plus one feedback cycle if asked). Returns the report directory."""
+    run_dir = os.path.join(out_dir, datetime.now().strftime("%Y%m%d-%H%M%S"))
+    os.makedirs(run_dir, exist_ok=True)
+
+    # Dry run against a copy of the learning DB so profiling never touches real data
+    real_db = database.DB_PATH
+    scratch_db = os.path.join(run_dir, "learning.db")
+    copied = sandbox.copy_database(real_db, scratch_db)
+    database.use_database(scratch_db)
+    cricket_events.set_match_source(_match_source(input_name, record))
+    pipeline = build_pipeline()
+    logger.info("Profiling %d cycle(s), input=%s offline=%s feedback=%s → %s",
+                cycles, input_name, offline, feedback, run_dir)
+
+    timings = []
+    profile = cProfile.Profile()
+    sampler = StackSampler()
+    tracemalloc.start(PROFILE_TRACE_FRAMES)
+    before = tracemalloc.take_snapshot()
+    sampler.start()
+    started = time.monotonic()
+    try:
+        with sandbox.fake_sinks(offline=offline):
+            for i in range(cycles):
+                if i and interval:
+                    time.sleep(interval)
+                cycle_id = new_id()
+                t0 = time.monotonic()
+                with bind(cycle_id=cycle_id):
+                    profile.enable()
+                    try:
+                        done = pipeline.run_inline({"tick": time.time(), "cycle_id": cycle_id})
+                    finally:
+                        profile.disable()
+                timings.append({"cycle": i, "cycle_id": cycle_id, "seconds": round(time.monotonic() - t0, 4),
+                                "posts": len(done)})
+            if feedback:
+                from services.feedback_learning import run_feedback_cycle
+                t0 = time.monotonic()
+                profile.enable()
+                try:
+                    updated = run_feedback_cycle(delay_seconds=0)
+                finally:
+                    profile.disable()
+                timings.append({"cycle": "feedback", "seconds": round(time.monotonic() - t0, 4),
+                                "updated": updated})
+    finally:
+        elapsed = time.monotonic() - started
+        sampler.stop()
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        cricket_events.set_match_source(None)
+        database.use_database(real_db)
+
+    profile.dump_stats(os.path.join(run_dir, "profile.prof"))
+    with open(os.path.join(run_dir, "hot_functions.txt"), "w", encoding="utf-8") as f:
+        f.write(_hot_functions(profile, top_n))
+    with open(os.path.join(run_dir, "allocations.txt"), "w", encoding="utf-8") as f:
+        f.write("traced memory: current {} B, peak {} B\n\n".format(current, peak))
+        f.write(_allocations(before, after, top_n))
+    sampler.write(os.path.join(run_dir, "stacks.folded"))
+    summary = {
+        "cycles": cycles,
+        "input": input_name,
+        "offline": offline,
+        "feedback": feedback,
+        "db_copied": copied,
+        "wall_seconds": round(elapsed, 3),
+        "stack_samples": sampler.samples,
+        "traced_current_bytes": current,
+        "traced_peak_bytes": peak,
+        "stages": pipeline.stats(),
+        "timings": timings,
+    }
+    with open(os.path.join(run_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    logger.info("Profile written to %s (%.1fs, %d stack samples)", run_dir, elapsed, sampler.samples)
+    return run_dir
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py profile", description="Profile posting cycles.")
+    parser.add_argument("--cycles", type=int, default=5, help="posting cycles to run (default 5)")
+    parser.add_argument("--input", default="live",
+                        help="'live' (CricAPI), 'fake' (synthetic feed), 'sim' (ball-by-ball simulator, "
+                             "10 matches) or a recorded JSON file")
+    parser.add_argument("--record", help="with --input live, save the polled payloads to this file")
+    parser.add_argument("--offline", action="store_true",
+                        help="template decisions and fake engagement lookups (no OpenAI/X calls)")
+    parser.add_argument("--feedback", action="store_true", help="also profile one feedback cycle")
+    parser.add_argument("--interval", type=float, default=0.0, help="seconds between cycles")
+    parser.add_argument("--top", type=int, default=PROFILE_TOP_N, help="rows per report table")
+    args = parser.parse_args(argv)
+    return run_profile(cycles=args.cycles, input_name=args.input, record=args.record, offline=args.offline,
+                       feedback=args.feedback, interval=args.interval, top_n=args.top)
@@ -0,0 +1,194 @@
+"""
+Cooperative job runtime shared by main.py and scheduler.py.
+
+One dispatcher thread feeds interval jobs into a shared executor with explicit
+rules: a job never overlaps itself beyond max_instances (extra runs are skipped),
+missed runs are coalesced into one unless coalesce=False, due jobs are started
+in priority order when the executor is busy, and each run gets optional jitter
+(added to the dispatch time only, so it never drifts the schedule).
+On SIGTERM/SIGINT the runtime stops dispatching, waits for running jobs and runs
+shutdown hooks (e.g. draining in-flight posts) before returning.
+"""
+import heapq
+import itertools
+import logging
+import random
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("main_logger.runtime")
+
+
+class Job:
+    """An interval job plus its scheduling rules and run-time stats."""
+
+    def __init__(self, func, seconds, name=None, priority=0, jitter=0.0, max_instances=1,
+                 coalesce=True, misfire_grace_time=None, run_immediately=True):
+        self.func = func
+        self.seconds = seconds
+        self.name = name or func.__name__
+        self.priority = priority
+        self.jitter = jitter
+        self.max_instances = max_instances
+        self.coalesce = coalesce
+        self.misfire_grace_time = misfire_grace_time
+        # scheduled_at is the jitter-free base; next_run is when it is actually dispatched
+        self.scheduled_at = time.monotonic() + (0 if run_immediately else seconds)
+        self.next_run = self.scheduled_at
+        self.running = 0
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.missed = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.last_time = None
+
+    def reschedule(self, now):
+        """Advance the schedule; coalescing collapses any backlog of missed runs into one."""
+        self.scheduled_at += self.seconds
+        if self.scheduled_at <= now:
+            behind = int((now - self.scheduled_at) // self.seconds) + 1
+            if self.coalesce:
+                self.missed += behind
+                self.scheduled_at += behind * self.seconds
+        self.next_run = self.scheduled_at + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def stats(self):
+        return {
+            "runs": self.runs,
+            "running": self.running,
+            "failures": self.failures,
+            "skipped_overlap": self.skipped,
+            "missed": self.missed,
+            "avg_sec": round(self.total_time / self.runs, 3) if self.runs else None,
+            "max_sec": round(self.max_time, 3),
+            "last_sec": round(self.last_time, 3) if self.last_time is not None else None,
+        }
+
+
+class JobRuntime:
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self.jobs = []
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._in_flight = 0
+        self._shutdown_hooks = []
+        self._seq = itertools.count()
+        self.exit_error = None
+
+    def add_job(self, func, seconds, **kwargs):
+        job = Job(func, seconds, **kwargs)
+        self.jobs.append(job)
+        return job
+
+    def on_shutdown(self, func):
+        """Register a callable run (in order) after running jobs have finished."""
+        self._shutdown_hooks.append(func)
+
+    def _run(self, job):
+        started = time.monotonic()
+        try:
+            job.func()
+        except SystemExit as e:
+            # e.g. OpenAI quota exhausted: stop the whole runtime
+            logger.error("Job %s requested exit: %s", job.name, e)
+            self.exit_error = e
+            self.stop()
+        except Exception as e:
+            job.failures += 1
+            logger.exception("Job %s failed: %s", job.name, e)
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                job.running -= 1
+                job.runs += 1
+                job.total_time += elapsed
+                job.max_time = max(job.max_time, elapsed)
+                job.last_time = elapsed
+                self._in_flight -= 1
+            self._wake.set()
+
+    def _dispatch_due(self, now):
+        """
+        Start due jobs, highest priority first, while executor slots are free.
+        Returns True if due jobs are left waiting for a slot.
+        """
+        due = [j for j in self.jobs if j.next_run <= now]
+        heap = [(-j.priority, next(self._seq), j) for j in due]
+        heapq.heapify(heap)
+        while heap:
+            _, _, job = heapq.heappop(heap)
+            with self._lock:
+                if self._in_flight >= self.max_workers:
+                    return True  # leave it due; it starts as soon as a slot frees up
+                late = now - job.next_run
+                job.reschedule(now)
+                if job.misfire_grace_time is not None and late > job.misfire_grace_time:
+                    job.missed += 1
+                    logger.info("Job %s misfired by %.1fs, skipping this run", job.name, late)
+                    continue
+                if job.running >= job.max_instances:
+                    job.skipped += 1
+                    logger.info("Job %s still running, skipping overlapping run", job.name)
+                    continue
+                job.running += 1
+                self._in_flight += 1
+            self._executor.submit(self._run, job)
+        return False
+
+    def run(self, install_signals=True):
+        """Dispatch jobs until stop() (or SIGTERM/SIGINT), then shut down gracefully."""
+        if install_signals and threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(sig, lambda signum, frame: self.stop())
+        logger.info("Job runtime started: %s", ", ".join(
+            "{} every {}s (priority {})".format(j.name, j.seconds, j.priority) for j in self.jobs))
+        try:
+            while not self._stopping.is_set():
+                now = time.monotonic()
+                if self._dispatch_due(now):
+                    self._wake.wait()  # saturated: a finishing job (or stop) sets _wake
+                else:
+                    next_run = min((j.next_run for j in self.jobs), default=now + 1)
+                    self._wake.wait(max(0.05, min(1.0, next_run - now)))
+                self._wake.clear()
+        finally:
+            self.shutdown()
+        if self.exit_error is not None:
+            raise self.exit_error
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+
+    def shutdown(self, timeout=60):
+        """Wait for running jobs, then run shutdown hooks (drain posts, stop workers)."""
+        self._stopping.set()
+        logger.info("Shutting down: waiting for %d running job(s)", self._in_flight)
+        deadline = time.monotonic() + timeout
+        while self._in_flight and time.monotonic() < deadline:
+            time.sleep(0.1)
+        self._executor.shutdown(wait=False)
+        for hook in self._shutdown_hooks:
+            try:
+                hook()
+            except Exception as e:
+                logger.exception("Shutdown hook %s failed: %s", getattr(hook, "__name__", hook), e)
+        self.log_stats()
+
+    def stats(self):
+        return {j.name: j.stats() for j in self.jobs}
+
+    def log_stats(self):
+        for name, s in self.stats().items():
+            logger.info(
+                "job=%s runs=%d running=%d failures=%d skipped_overlap=%d missed=%d avg=%ss max=%ss last=%ss",
+                name, s["runs"], s["running"], s["failures"], s["skipped_overlap"], s["missed"],
+                s["avg_sec"], s["max_sec"], s["last_sec"],
+            )
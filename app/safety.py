@@ -3,8 +3,11 @@ import time
 
 recent_posts = []
 
+# Seconds a post waits before going out (uniform, whole seconds)
+HUMAN_DELAY_RANGE = (5, 20)
+
 def human_delay():
-    time.sleep(random.randint(5, 20))
+    time.sleep(random.randint(*HUMAN_DELAY_RANGE))
 
 def is_duplicate(text):
     return any(text[:50] in p for p in recent_posts)
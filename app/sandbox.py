@@ -0,0 +1,276 @@
+"""
+Offline inputs and sinks for profiling (and load tests).
+
+Match sources plug into cricket_events.set_match_source(): recorded CricAPI
+payloads, a recorder that saves live payloads for later runs, and a small
+deterministic fake feed (simulator.py has the full ball-by-ball one). fake_sinks() swaps the outward calls (posting to X,
+engagement lookups, OpenAI) for local stand-ins for the duration of a block,
+so the real posting code runs without touching the network or posting anything.
+For load tests, fake_llm() stands in for the OpenAI decision path with a given
+latency and failure rate, and scaled_clock() runs every pipeline delay, deadline
+and the X write limit `scale` times faster, so an hour of production timing
+plays out in 3600 / scale seconds.
+"""
+import contextlib
+import itertools
+import json
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+import zlib
+
+DRY_RUN_ID_PREFIX = "dryrun-"
+
+_ids = itertools.count(1)
+_ids_lock = threading.Lock()
+
+
+# -----------------------------------------------------------------------------
+# Match sources
+# -----------------------------------------------------------------------------
+
+
+def _payloads(data):
+    """Normalize a recording into a list of polls (each a list of match dicts)."""
+    if isinstance(data, dict):
+        return [data.get("data", [])]
+    if data and all(isinstance(p, dict) and "id" in p for p in data):
+        return [data]  # a single poll saved as a bare match list
+    return [p.get("data", []) if isinstance(p, dict) else p for p in data]
+
+
+def recorded_source(path):
+    """
+    Replay recorded CricAPI polls from a JSON file, one poll per call (looping).
+    The file holds a currentMatches response, a match list, or a list of either.
+    """
+    with open(path, encoding="utf-8") as f:
+        polls = _payloads(json.load(f))
+    if not polls:
+        raise ValueError("No match payloads in {}".format(path))
+    cycle = itertools.cycle(polls)
+
+    def source():
+        return [dict(m) for m in next(cycle)]
+
+    return source
+
+
+def recording_source(path, fetch):
+    """Call the live `fetch` and append every poll to `path` (replayable with recorded_source)."""
+    polls = []
+
+    def source():
+        matches = fetch()
+        polls.append([{k: v for k, v in m.items() if not k.startswith("_")} for m in matches])
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(polls, f)
+        os.replace(tmp, path)
+        return matches
+
+    return source
+
+
+def fake_source(num_matches=3):
+    """
+    Deterministic fake feed: `num_matches` India T20Is, each second innings moving
+    by one over per poll (death overs come round every few polls) so narratives change.
+    """
+    from simulator import ordinal
+
+    polls = itertools.count()
+
+    def source():
+        poll = next(polls)
+        matches = []
+        for i in range(num_matches):
+            opponent = ("Australia", "England", "Pakistan", "South Africa", "New Zealand")[i % 5]
+            target = 160 + 7 * i
+            overs = 14 + (poll + i) % 7
+            runs = min(target + 4, int(overs * (7.5 + i % 3)))
+            wickets = min(9, overs // 3)
+            need = max(0, target + 1 - runs)
+            matches.append({
+                "id": "fake-{}".format(i),
+                "name": "India vs {}, {} T20I".format(opponent, ordinal(i + 1)),
+                "matchType": "t20",
+                "status": "India need {} runs in {} balls".format(need, (20 - overs) * 6),
+                "teams": ["India", opponent],
+                "score": [
+                    {"r": target, "w": 7, "o": 20, "inning": "{} Inning 1".format(opponent)},
+                    {"r": runs, "w": wickets, "o": overs, "inning": "India Inning 1"},
+                ],
+                "matchStarted": True,
+                "matchEnded": overs >= 20,
+            })
+        return matches
+
+    return source
+
+
+# -----------------------------------------------------------------------------
+# Sinks
+# -----------------------------------------------------------------------------
+
+
+def fake_post_tweet(text, reply_to_id=None, quote_tweet_id=None):
+    """Stand-in for x_client.post_tweet: returns a dry-run id, posts nothing."""
+    with _ids_lock:
+        return "{}{}".format(DRY_RUN_ID_PREFIX, next(_ids))
+
+
+def fake_tweets_engagement(tweet_ids):
+    """Stand-in for x_client.get_tweets_engagement: stable pseudo-metrics per id, none gone."""
+    out = {}
+    for tid in [str(t) for t in tweet_ids][:100]:
+        h = zlib.crc32(tid.encode())
+        out[tid] = {"likes": h % 200, "retweets": h % 37, "replies": h % 11, "quotes": h % 5}
+    return out, set()
+
+
+def _no_delay():
+    pass
+
+
+def _slow_post_tweet(seconds, rate_limited=False):
+    import x_client
+
+    def post(text, reply_to_id=None, quote_tweet_id=None):
+        if rate_limited:
+            x_client.write_limiter.acquire()  # looked up per call: scaled_clock swaps it
+        if seconds:
+            time.sleep(seconds)
+        return fake_post_tweet(text, reply_to_id, quote_tweet_id)
+    return post
+
+
+@contextlib.contextmanager
+def fake_sinks(offline=False, post_latency=0.0, keep_delays=False):
+    """
+    Swap outward calls for local stand-ins inside the block: tweets are not posted
+    (dry-run ids) and the human/pacing delays are skipped. With offline=True the
+    decision agent always takes the template path and engagement lookups are
+    faked too, so nothing leaves the machine. post_latency (seconds) makes each
+    fake post take as long as an X round trip would. keep_delays=True keeps the
+    human/pacing delays and the shared X write limit (combine with scaled_clock).
+    """
+    import pipeline
+    from agents import decision_agent
+    from services import engagement_poller
+
+    if post_latency or keep_delays:
+        post = _slow_post_tweet(post_latency, rate_limited=keep_delays)
+    else:
+        post = fake_post_tweet
+    swaps = [(pipeline, "post_tweet", post)]
+    if not keep_delays:
+        swaps += [(pipeline, "human_delay", _no_delay), (pipeline, "MIN_POST_DELAY", 0)]
+    if offline:
+        swaps += [
+            (decision_agent, "MIN_LLM_BUDGET_SECONDS", math.inf),
+            (engagement_poller, "get_tweets_engagement", fake_tweets_engagement),
+        ]
+    with _swapped(swaps):
+        yield
+
+
+@contextlib.contextmanager
+def _swapped(swaps):
+    """Set (module, name, value) attributes inside the block, restoring the old values after."""
+    saved = [(module, name, getattr(module, name)) for module, name, _ in swaps]
+    for module, name, value in swaps:
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for module, name, value in saved:
+            setattr(module, name, value)
+
+
+@contextlib.contextmanager
+def fake_llm(latency, failure_rate=0.0, seed=0):
+    """
+    Stand in for the OpenAI decision path (candidates + scoring) inside the block.
+    Each call takes a lognormal time with median `latency` seconds (a few calls
+    run past twice the median) and fails with probability `failure_rate`;
+    otherwise it returns a phrase-bank tweet, numbered so that (like a real LLM)
+    it never repeats itself and only template-path posts trip the duplicate
+    check. run_decision's budget, timeout and template fallback all run as in
+    production.
+    """
+    from agents import decision_agent
+
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    calls = itertools.count(1)
+
+    def run_llm_decision(event, emotion, num_candidates, deadline):
+        with lock:
+            seconds = rng.lognormvariate(math.log(latency), 0.5) if latency > 0 else 0.0
+            failed = rng.random() < failure_rate
+        # Requests are capped at the budget left, as decision_agent does for OpenAI
+        left = deadline - time.monotonic()
+        time.sleep(max(0.0, min(seconds, left)))
+        if seconds > left:
+            raise TimeoutError("simulated OpenAI timeout")
+        if failed:
+            raise RuntimeError("simulated OpenAI failure")
+        candidates = decision_agent.generate_template_candidates(event, emotion, None, n=num_candidates)
+        scored = [(text, decision_agent.predict_engagement_local(text, event, emotion)) for text in candidates]
+        text, score = max(scored, key=lambda x: x[1])
+        return "#{} {}".format(next(calls), text)[:280], score
+
+    with _swapped([(decision_agent, "_run_llm_decision", run_llm_decision)]):
+        yield
+
+
+def _scaled_human_delay(scale):
+    import safety
+
+    def delay():
+        time.sleep(random.randint(*safety.HUMAN_DELAY_RANGE) / scale)
+    return delay
+
+
+@contextlib.contextmanager
+def scaled_clock(scale):
+    """
+    Run the posting pipeline's timing `scale` times faster inside the block: human
+    and pacing delays, stage staleness, backpressure, the decision budget, the
+    freshness SLA and the X write limit window are all divided by `scale`. Enter
+    it before build_pipeline() (stage max ages are read at build time). Latencies
+    measured in the block are wall seconds; multiply by `scale` for production time.
+    """
+    import pipeline
+    import x_client
+    from agents import decision_agent
+    from services import freshness
+
+    limiter = x_client.write_limiter
+    swaps = [
+        (pipeline, "human_delay", _scaled_human_delay(scale)),
+        (pipeline, "MIN_POST_DELAY", pipeline.MIN_POST_DELAY / scale),
+        (pipeline, "STALE_EVENT_SECONDS", pipeline.STALE_EVENT_SECONDS / scale),
+        (pipeline, "BACKPRESSURE_TIMEOUT", pipeline.BACKPRESSURE_TIMEOUT / scale),
+        (pipeline, "DECISION_BUDGET_SECONDS", pipeline.DECISION_BUDGET_SECONDS / scale),
+        (pipeline, "THROUGHPUT_WINDOW", pipeline.THROUGHPUT_WINDOW / scale),
+        (decision_agent, "DECISION_BUDGET_SECONDS", decision_agent.DECISION_BUDGET_SECONDS / scale),
+        (decision_agent, "MIN_LLM_BUDGET_SECONDS", decision_agent.MIN_LLM_BUDGET_SECONDS / scale),
+        (freshness, "FRESHNESS_SLA_SECONDS", freshness.FRESHNESS_SLA_SECONDS / scale),
+        (x_client, "write_limiter", x_client.RateLimiter(limiter.limit, limiter.window / scale)),
+    ]
+    with _swapped(swaps):
+        yield
+
+
+def copy_database(src, dst):
+    """Consistent copy of a (possibly WAL-mode, in-use) SQLite DB via the backup API."""
+    if not os.path.exists(src):
+        return False
+    with contextlib.closing(sqlite3.connect(src)) as source, contextlib.closing(sqlite3.connect(dst)) as target:
+        source.backup(target)
+    return True
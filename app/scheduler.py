@@ -1,11 +1,7 @@
-from apscheduler.schedulers.blocking import BlockingScheduler
-from main import run_cycle
-from services.feedback_learning import run_feedback_cycle
+from main import setup_logger, create_runtime
 
-scheduler = BlockingScheduler()
+setup_logger()
 
-scheduler.add_job(run_cycle, "interval", seconds=30)
-# V6: learn from misses — backfill actual engagement every 15 min
-scheduler.add_job(run_feedback_cycle, "interval", minutes=15)
-
-scheduler.start()
+# run_cycle every MATCH_LOOP_SECONDS plus the V6 feedback job (backfill actual
+# engagement every 15 min) on the shared job runtime
+create_runtime(with_feedback=True).run()
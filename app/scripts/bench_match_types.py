@@ -0,0 +1,115 @@
+"""
+Memory / allocation benchmark: legacy state dicts vs slotted MatchSnapshot/MatchState.
+
+Builds a synthetic currentMatches payload with many tracked matches and measures,
+per poll, the bytes still held once the raw payload is dropped (what the
+pipeline and freshness registry keep alive through the (event, state) pairs) and
+the number of allocations made while building them.
+
+Run from project root:
+  python app/scripts/bench_match_types.py [num_matches] [num_polls]
+"""
+import gc
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from match_types import MatchSnapshot, OVERS_PER_FORMAT  # noqa: E402
+
+
+def _payload(num_matches, poll):
+    matches = []
+    for i in range(num_matches):
+        runs = 150 + (i + poll) % 40
+        matches.append({
+            "id": "match-{}".format(i),
+            "name": "India vs Team {}, {}th T20I".format(i, i % 5 + 1),
+            "matchType": ("t20", "odi", "test")[i % 3],
+            "status": "Team {} need {} runs".format(i, 40 - poll % 40),
+            "teams": ["India", "Team {}".format(i)],
+            "score": [
+                {"r": runs, "w": 6, "o": 20, "inning": "India Inning 1"},
+                {"r": runs - 30 + poll % 30, "w": poll % 10, "o": 15 + poll % 5, "inning": "Team {} Inning 1".format(i)},
+            ],
+            "matchStarted": True,
+            "matchEnded": False,
+            "_fetched_at": time.time(),
+        })
+    return matches
+
+
+def legacy_event_and_state(match):
+    """The pre-MatchState implementation: fresh state dict + f-string event per poll."""
+    state = {
+        "required_rr": 0.0,
+        "overs_left": 0,
+        "match_type": match.get("matchType", ""),
+        "match_ended": match.get("matchEnded", False),
+        "status": match.get("status", ""),
+        "name": match.get("name", ""),
+        "teams": match.get("teams", []),
+        "score": match.get("score", []),
+        "match_id": match.get("id"),
+        "fetched_at": match.get("_fetched_at"),
+        "state_key": (
+            tuple((s.get("inning", ""), s.get("r"), s.get("w"), s.get("o")) for s in match.get("score") or []),
+            match.get("status", ""),
+        ),
+    }
+    score_list = match.get("score") or []
+    max_overs = OVERS_PER_FORMAT.get((match.get("matchType") or "").lower())
+    if max_overs and score_list:
+        last = score_list[-1]
+        state["overs_left"] = max(0, int(max_overs - float(last.get("o", 0) or 0)))
+        if len(score_list) >= 2 and state["overs_left"] > 0:
+            runs_needed = max(0, (score_list[0].get("r", 0) or 0) + 1 - last.get("r", 0))
+            state["required_rr"] = round(runs_needed / state["overs_left"], 2)
+    parts = ["{}: {}/{} ({} overs)".format(s.get("inning", ""), s.get("r", ""), s.get("w", ""), s.get("o", ""))
+             for s in score_list]
+    event = "{}. {}. {}".format(match.get("name", "Match"), match.get("status", ""), " | ".join(parts)).strip()
+    return event, state
+
+
+def slotted_event_and_state(match):
+    snapshot = MatchSnapshot.from_api(match)
+    state = snapshot.state
+    state.required_rr  # what narrative/strategist touch every poll
+    return snapshot.event, state
+
+
+def measure(build, num_matches, num_polls):
+    """Bytes retained (payload dropped) and allocations per poll, averaged over the polls."""
+    retained, blocks = [], []
+    for poll in range(num_polls):
+        tracemalloc.start()
+        matches = _payload(num_matches, poll)
+        before = tracemalloc.take_snapshot()
+        out = [build(m) for m in matches]
+        after = tracemalloc.take_snapshot()
+        diff = after.compare_to(before, "filename")
+        blocks.append(sum(max(0, d.count_diff) for d in diff))
+        del before, after, diff
+        del matches  # the raw payload is gone; only what the pairs reference survives
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        retained.append(current)
+        del out
+    return sum(retained) / len(retained), sum(blocks) / len(blocks)
+
+
+def main():
+    num_matches = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    num_polls = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    print("{} tracked matches, {} polls".format(num_matches, num_polls))
+    for label, build in (("legacy dicts", legacy_event_and_state), ("slotted types", slotted_event_and_state)):
+        mem, blocks = measure(build, num_matches, num_polls)
+        print("  {:<14} retained/poll {:>9.0f} B ({:>5.0f} B/match)  allocations/poll {:>7.0f}".format(
+            label, mem, mem / num_matches, blocks))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+"""
+Load test: the whole posting system against simulated tournament days, with
+production timing.
+
+Matches come from simulator.MatchSimulator (plugged into get_match_event), and
+ticks go through the real threaded pipeline (ingest → narrative → decision →
+publish → persist) exactly as run_cycle feeds it: one submit every
+MATCH_LOOP_SECONDS, coalesced if the previous ingest has not been picked up.
+Nothing is skipped to make it fast. Instead, everything runs on a clock
+--time-scale times faster (sandbox.scaled_clock):
+
+  - the single publish worker's human delay (5–20 s) and pacing (MIN_POST_DELAY)
+    per post, and the shared X write limit;
+  - an OpenAI decision path with --llm-latency (median seconds per decision) and
+    --llm-failure-rate (sandbox.fake_llm), so the decision budget, its timeout
+    and the template fallback all run;
+  - stage staleness, backpressure, the decision budget and the freshness SLA;
+  - the match feed itself, which follows the scaled wall clock.
+
+Posts are dry-run ids; nothing leaves the machine. Each run writes to its own
+scratch learning DB under LOADTEST_DIR/<run>/. Times in the report are
+production seconds (wall × scale).
+
+1. Ladder: runs with an increasing number of concurrent qualifying matches. A
+   worker sustains N matches when nothing was shed, coalesced, dropped as stale
+   or failed, and p95 event-to-post latency stays within FRESHNESS_SLA_SECONDS;
+   otherwise the run lists which of these it hit (limited_by). Fallbacks and
+   skips (already published, duplicate, lease lost) are reported by reason but
+   do not count against it.
+2. Day: a full simulated day (default 12 h) at the largest sustained N (or
+   --day-matches), with end-to-end latency (fetch → post), LLM/template share,
+   fallbacks and drops, and traced / resident memory every simulated hour, plus
+   the lines whose allocations grew most after the first hour.
+
+Run from project root:
+  python app/scripts/load_test.py [--matches 1,2,4,8] [--ladder-hours 1] [--hours 12]
+                                  [--day-matches N] [--formats t20,odi,test] [--others N]
+                                  [--time-scale 60] [--llm-latency 4] [--llm-failure-rate 0.05]
+                                  [--post-latency SECONDS] [--seed N]
+"""
+import argparse
+import collections
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import cricket_events  # noqa: E402
+import database  # noqa: E402
+import safety  # noqa: E402
+import sandbox  # noqa: E402
+from config import MATCH_LOOP_SECONDS, LOADTEST_DIR, FRESHNESS_SLA_SECONDS  # noqa: E402
+from event_log import bind, new_id  # noqa: E402
+from pipeline import build_pipeline  # noqa: E402
+from simulator import MatchSimulator  # noqa: E402
+
+APP_DIR = str(Path(__file__).resolve().parents[1])
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _rss_bytes():
+    """Resident set size of this process (Linux /proc), or None elsewhere."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _drain(pipeline):
+    """Wait until every queued item has left all stages (upstream task_done follows downstream put)."""
+    for stage in pipeline.stages:
+        stage.queue.join()
+
+
+class _EventCounter(logging.Handler):
+    """Counts structured events (event_log.log_event) by name and reason: drops, fallbacks, sheds."""
+
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.counts = collections.Counter()
+
+    def emit(self, record):
+        event = getattr(record, "event", None)
+        if event:
+            reason = (getattr(record, "data", None) or {}).get("reason")
+            self.counts[event if reason is None else "{}:{}".format(event, reason)] += 1
+
+
+def _posts():
+    """(latency_ms, source) of the dry-run posts in the run's DB."""
+    c = database.conn.cursor()
+    c.execute("SELECT latency_ms, source FROM posts WHERE id LIKE ?", (sandbox.DRY_RUN_ID_PREFIX + "%",))
+    return c.fetchall()
+
+
+def _summary(values, scale=1.0, digits=1):
+    if not values:
+        return {"p50": None, "p95": None, "max": None}
+    return {"p50": round(_percentile(values, 50) * scale, digits),
+            "p95": round(_percentile(values, 95) * scale, digits),
+            "max": round(max(values) * scale, digits)}
+
+
+def _by_reason(counts, event, **extra):
+    """{reason: n} for one event's counts (keys "event:reason"), plus extra non-zero counts."""
+    prefix = event + ":"
+    out = {k[len(prefix):]: v for k, v in counts.items() if k.startswith(prefix)}
+    out.update((k, v) for k, v in extra.items() if v)
+    return out
+
+
+def _growth_lines(first, last, top_n=10):
+    """Lines whose traced allocations grew most between two snapshots (app files only)."""
+    app_only = [tracemalloc.Filter(True, APP_DIR + os.sep + "*")]
+    diffs = last.filter_traces(app_only).compare_to(first.filter_traces(app_only), "lineno")
+    out = []
+    for d in diffs[:top_n]:
+        if d.size_diff <= 0:
+            break
+        frame = d.traceback[0]
+        out.append({"line": "{}:{}".format(os.path.relpath(frame.filename, APP_DIR), frame.lineno),
+                    "bytes": d.size_diff, "blocks": d.count_diff})
+    return out
+
+
+def run_load(num_matches, hours, seed, run_dir, formats=("t20", "odi", "test"), others=0, time_scale=60.0,
+             llm_latency=4.0, llm_failure_rate=0.05, post_latency=0.0, trace_memory=False):
+    """
+    Simulate `hours` of production with `num_matches` concurrent qualifying matches,
+    `time_scale` times faster than real time. Returns drop/fallback counters,
+    event-to-post latency (production seconds) and (hourly) memory samples.
+    """
+    sim = MatchSimulator(num_matches=num_matches, seed=seed, formats=formats, others=others)
+    db_path = os.path.join(run_dir, "matches-{}-seed-{}.db".format(num_matches, seed))
+    real_db = database.DB_PATH
+    database.use_database(db_path)
+    main_logger = logging.getLogger("main_logger")
+    counter = _EventCounter()
+    main_logger.addHandler(counter)
+    level = main_logger.level
+    main_logger.setLevel(logging.INFO)  # log_event is a no-op below its level
+    safety.recent_posts.clear()  # duplicate check: earlier runs' posts must not skip this run's
+
+    tick_wall = sim.tick_seconds / time_scale
+    cycles = int(hours * 3600 / sim.tick_seconds)
+    ticks_per_hour = int(3600 / sim.tick_seconds)
+    hourly, coalesced, max_lag, publish_depth = [], 0, 0.0, 0
+    first_snapshot = last_snapshot = None
+    started = None
+
+    def source():
+        # The feed moves with the (scaled) clock, not per poll: a late poll sees more balls
+        sim.advance(max(0.0, (time.monotonic() - started) * time_scale - sim.clock))
+        return sim.payload()
+
+    if trace_memory:
+        tracemalloc.start(1)
+    try:
+        with sandbox.scaled_clock(time_scale), \
+                sandbox.fake_sinks(post_latency=post_latency / time_scale, keep_delays=True), \
+                sandbox.fake_llm(llm_latency / time_scale, llm_failure_rate, seed=seed):
+            pipeline = build_pipeline()
+            pipeline.start()
+            cricket_events.set_match_source(source)
+            started = time.monotonic()
+            try:
+                for i in range(cycles):
+                    lag = time.monotonic() - (started + i * tick_wall)
+                    if lag < 0:
+                        time.sleep(-lag)
+                    max_lag = max(max_lag, lag)
+                    cycle_id = new_id()
+                    with bind(cycle_id=cycle_id):
+                        if not pipeline.submit({"tick": time.time(), "cycle_id": cycle_id}):
+                            coalesced += 1
+                    if pipeline.error is not None:
+                        raise pipeline.error
+                    stats = pipeline.stats()  # as run_cycle's log_stats does every cycle
+                    publish_depth = max(publish_depth, stats["publish"]["depth"])
+                    if (i + 1) % ticks_per_hour == 0 or i + 1 == cycles:
+                        sample = {
+                            "sim_hour": round(sim.clock / 3600, 2),
+                            "live_matches": sim.live_count(),
+                            "fixtures_finished": sim.finished,
+                            "posts": stats["persist"]["processed"],
+                            "shed": sum(s["shed"] for s in stats.values()),
+                            "dropped": counter.counts["freshness.dropped:stale"]
+                            + counter.counts["freshness.dropped:superseded"],
+                            "fallbacks": sum(v for k, v in counter.counts.items()
+                                             if k.startswith("decision.fallback")),
+                            "publish_depth_max": publish_depth,
+                            "rss_bytes": _rss_bytes(),
+                        }
+                        if trace_memory:
+                            sample["traced_bytes"] = tracemalloc.get_traced_memory()[0]
+                            last_snapshot = tracemalloc.take_snapshot()
+                            if first_snapshot is None:
+                                first_snapshot = last_snapshot
+                        hourly.append(sample)
+                        publish_depth = 0
+                _drain(pipeline)  # what is still queued is posted (or dropped as stale), as in production
+            finally:
+                pipeline.stop()
+                cricket_events.set_match_source(None)
+    finally:
+        posts = _posts()
+        database.use_database(real_db)
+        main_logger.removeHandler(counter)
+        main_logger.setLevel(level)
+        if trace_memory:
+            tracemalloc.stop()
+
+    stats = pipeline.stats()
+    counts = counter.counts
+    sources = collections.Counter(src for _, src in posts)
+    latencies = [ms for ms, _ in posts if ms is not None]
+    result = {
+        "matches": num_matches,
+        "others": others,
+        "sim_hours": hours,
+        "cycles": cycles,
+        "wall_seconds": round(time.monotonic() - started, 2),
+        "coalesced": coalesced,
+        "max_tick_lag_s": round(max_lag * time_scale, 1),
+        "decisions": stats["decision"]["processed"],
+        "posts": len(posts),
+        "llm_posts": sources.get("llm", 0),
+        "template_posts": sources.get("template", 0),
+        "fallbacks": _by_reason(counts, "decision.fallback"),
+        "dropped_stale": counts["freshness.dropped:stale"],
+        "dropped_superseded": counts["freshness.dropped:superseded"],
+        # Expected skips (already_published: the scoreboard did not change; duplicate text), not capacity
+        "skipped": _by_reason(counts, "publish.skipped", duplicate=counts["publish.duplicate"]),
+        "shed": sum(s["shed"] for s in stats.values()),
+        "shed_by_stage": {name: s["shed"] for name, s in stats.items() if s["shed"]},
+        "errors": sum(s["errors"] for s in stats.values()),
+        "publish_depth_max": max((h["publish_depth_max"] for h in hourly), default=0),
+        "latency_s": _summary(latencies, time_scale / 1000),
+        "sla_misses": sum(1 for ms in latencies if ms * time_scale / 1000 > FRESHNESS_SLA_SECONDS),
+        "hourly": hourly,
+    }
+    # What kept this run from being sustained: lost work (shed, coalesced ticks, stale drops,
+    # errors) is reported apart from posts that went out but missed the SLA
+    result["limited_by"] = [name for name, failed in (
+        ("shed", result["shed"]),
+        ("coalesced", result["coalesced"]),
+        ("dropped_stale", result["dropped_stale"]),
+        ("errors", result["errors"]),
+        ("latency_p95", (result["latency_s"]["p95"] or 0) > FRESHNESS_SLA_SECONDS),
+    ) if failed]
+    result["sustained"] = not result["limited_by"]
+    if trace_memory and len(hourly) > 1:
+        first, last = hourly[0], hourly[-1]
+        hours_between = max(last["sim_hour"] - first["sim_hour"], 1e-9)
+        result["memory"] = {
+            "traced_growth_bytes": last["traced_bytes"] - first["traced_bytes"],
+            "traced_growth_per_hour": int((last["traced_bytes"] - first["traced_bytes"]) / hours_between),
+            "rss_growth_bytes": (last["rss_bytes"] - first["rss_bytes"]) if last["rss_bytes"] else None,
+            "top_growth": _growth_lines(first_snapshot, last_snapshot),
+        }
+    return result
+
+
+def _format_counts(counts):
+    return ", ".join("{} {}".format(k, v) for k, v in sorted(counts.items())) or "0"
+
+
+def _print_run(label, r):
+    lat = r["latency_s"]
+    print("{:<6} matches={:<3} posts={:<4} (llm {} / template {}) latency p50/p95/max={}/{}/{} s "
+          "sla misses={}  {}".format(
+              label, r["matches"], r["posts"], r["llm_posts"], r["template_posts"], lat["p50"], lat["p95"],
+              lat["max"], r["sla_misses"],
+              "sustained" if r["sustained"] else "NOT sustained ({})".format(", ".join(r["limited_by"]))))
+    print("       shed: {}  coalesced={} dropped stale/superseded={}/{} errors={} publish backlog={}".format(
+        _format_counts(r["shed_by_stage"]), r["coalesced"], r["dropped_stale"], r["dropped_superseded"],
+        r["errors"], r["publish_depth_max"]))
+    print("       fallbacks: {}  skipped: {}".format(_format_counts(r["fallbacks"]), _format_counts(r["skipped"])))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the posting system on simulated matches.")
+    parser.add_argument("--matches", default="1,2,4,8", help="ladder of concurrent qualifying matches")
+    parser.add_argument("--ladder-hours", type=float, default=1.0, help="simulated hours per ladder step")
+    parser.add_argument("--hours", type=float, default=12.0, help="simulated hours of the day run (0 to skip)")
+    parser.add_argument("--day-matches", type=int, help="matches in the day run (default: largest sustained)")
+    parser.add_argument("--formats", default="t20,odi,test", help="formats fixtures rotate through")
+    parser.add_argument("--others", type=int, default=None,
+                        help="non-qualifying fixtures in the feed (default: half the matches)")
+    parser.add_argument("--time-scale", type=float, default=60.0,
+                        help="simulated seconds per wall second (all delays and deadlines are scaled)")
+    parser.add_argument("--llm-latency", type=float, default=4.0, help="median seconds per simulated LLM decision")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.05, help="share of simulated LLM calls that fail")
+    parser.add_argument("--post-latency", type=float, default=0.0, help="seconds per fake X post")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    # Per-event warnings (fallbacks, drops, sheds) would flood stderr; they are counted in the report
+    logging.getLogger("main_logger").addHandler(logging.NullHandler())
+    logging.getLogger("main_logger").propagate = False
+
+    run_dir = os.path.join(LOADTEST_DIR, datetime.now().strftime("%Y%m%d-%H%M%S"))
+    os.makedirs(run_dir, exist_ok=True)
+    formats = tuple(f.strip() for f in args.formats.split(",") if f.strip())
+    ladder = [int(n) for n in args.matches.split(",") if n.strip()]
+    timing = {"time_scale": args.time_scale, "llm_latency": args.llm_latency,
+              "llm_failure_rate": args.llm_failure_rate, "post_latency": args.post_latency}
+
+    def others(n):
+        return args.others if args.others is not None else n // 2
+
+    report = dict(timing, match_loop_seconds=MATCH_LOOP_SECONDS, freshness_sla_seconds=FRESHNESS_SLA_SECONDS,
+                  formats=formats, ladder=[])
+    # A different seed per run: freshness/published state is per match id and process-wide
+    seed = args.seed
+    for n in ladder:
+        result = run_load(n, args.ladder_hours, seed, run_dir, formats, others(n), **timing)
+        seed += 1
+        report["ladder"].append(result)
+        _print_run("ladder", result)
+    sustained = [r["matches"] for r in report["ladder"] if r["sustained"]]
+    report["matches_per_worker"] = max(sustained) if sustained else 0
+    report["saturated"] = not sustained or max(sustained) < max(ladder)
+    print("Sustained matches per worker: {}{}".format(
+        report["matches_per_worker"], "" if report["saturated"] else "+ (never saturated; extend --matches)"))
+
+    if args.hours > 0:
+        n = args.day_matches or report["matches_per_worker"] or min(ladder)
+        day = run_load(n, args.hours, seed, run_dir, formats, others(n), trace_memory=True, **timing)
+        report["day"] = day
+        _print_run("day", day)
+        print("{:>8} {:>5} {:>9} {:>6} {:>5} {:>8} {:>10} {:>8} {:>10} {:>8}".format(
+            "sim_hour", "live", "finished", "posts", "shed", "dropped", "fallbacks", "backlog", "traced MB",
+            "rss MB"))
+        for h in day["hourly"]:
+            print("{:>8} {:>5} {:>9} {:>6} {:>5} {:>8} {:>10} {:>8} {:>10.2f} {:>8}".format(
+                h["sim_hour"], h["live_matches"], h["fixtures_finished"], h["posts"], h["shed"], h["dropped"],
+                h["fallbacks"], h["publish_depth_max"], h["traced_bytes"] / 2 ** 20,
+                "{:.1f}".format(h["rss_bytes"] / 2 ** 20) if h["rss_bytes"] else "-"))
+        memory = day.get("memory")
+        if memory:
+            print("Memory growth after hour 1: traced {:+.2f} MB ({:+.1f} KB/h), rss {}".format(
+                memory["traced_growth_bytes"] / 2 ** 20, memory["traced_growth_per_hour"] / 1024,
+                "{:+.1f} MB".format(memory["rss_growth_bytes"] / 2 ** 20)
+                if memory["rss_growth_bytes"] is not None else "-"))
+            for g in memory["top_growth"]:
+                print("  {:>+10} B {:>+7} blocks  {}".format(g["bytes"], g["blocks"], g["line"]))
+
+    with open(os.path.join(run_dir, "report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print("Report written to {}".format(os.path.join(run_dir, "report.json")))
+    return report
+
+
+if __name__ == "__main__":
+    main()
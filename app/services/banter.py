@@ -0,0 +1,227 @@
+"""
+Banter ingestion: mentions of our account and replies to our recent posts.
+
+Each run pulls only tweets newer than the since-id cursor stored per stream in
+x_cursors (100 per request; replies to all recent posts share a few OR-ed
+search queries). Authors and parent tweets arrive as expansions of the same
+responses and go into the LRU caches in x_client, so context lookups rarely
+need another request. Every candidate is ranked locally (no LLM) and stored in
+banter_candidates; only the best few of a run get an LLM reply, which is
+posted with post_reply when BANTER_AUTO_REPLY is set (otherwise kept as a draft).
+A candidate is claimed (new → replying, one conditional UPDATE) before its reply
+is written, so workers sharing the DB never answer the same fan twice. If the
+reply fails, the claim is released (back to new, skipped after BANTER_MAX_ATTEMPTS).
+"""
+import logging
+import math
+import re
+import time
+from datetime import datetime, timezone
+
+from tweepy import TooManyRequests
+from config import (
+    BANTER_AUTO_REPLY,
+    BANTER_REPLY_WINDOW_HOURS,
+    BANTER_REPLIES_PER_RUN,
+    BANTER_MIN_SCORE,
+    BANTER_MAX_AGE_MINUTES,
+    BANTER_MAX_ATTEMPTS,
+)
+from database import conn
+from safety import is_duplicate, remember_post
+from x_client import get_mentions, search_replies, lookup_tweets, lookup_users, post_reply, tweet_cache, user_cache
+
+logger = logging.getLogger("main_logger.banter")
+
+# Candidate states: new → replying (claimed by a worker) → drafted (reply written, not posted) /
+# replied; skipped when filtered out
+NEW, REPLYING, DRAFTED, REPLIED, SKIPPED = "new", "replying", "drafted", "replied", "skipped"
+
+RIVALRY_WORDS = ("pakistan", "australia", "england", "choke", "bottle", "overrated", "trophy", "cope",
+                 "fraud", "flat track", "worst", "best", "goat")
+BLOCKED_WORDS = {"idiot", "stupid", "kill", "die", "slur"}
+
+# Half-life (minutes) of a candidate's rank as it ages
+RANK_HALF_LIFE_MINUTES = 30
+
+
+def _now_iso():
+    return datetime.utcnow().isoformat()
+
+
+def _get_cursor(stream):
+    c = conn.cursor()
+    c.execute("SELECT since_id FROM x_cursors WHERE stream = ?", (stream,))
+    row = c.fetchone()
+    return row[0] if row else None
+
+
+def _age_minutes(created_at, now):
+    if not created_at:
+        return 0.0
+    try:
+        created = datetime.fromisoformat(str(created_at).replace("Z", "+00:00"))
+    except ValueError:
+        return 0.0
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    return max(0.0, (now - created.timestamp()) / 60)
+
+
+def rank_candidate(tweet, author=None, our_post_ids=(), now=None):
+    """
+    Local rank of a tweet as a reply candidate (higher is better); None to skip it.
+    Direct replies to our posts, bigger/verified accounts, rivalry talk, questions
+    and likes count up; very short or link-only tweets count down; rank halves
+    every RANK_HALF_LIFE_MINUTES.
+    """
+    text = (tweet.get("text") or "").lower()
+    if set(re.findall(r"[a-z']+", text)) & BLOCKED_WORDS:
+        return None
+    words = [w for w in text.split() if not w.startswith(("@", "http"))]
+    score = 30.0 if tweet.get("replied_to") in our_post_ids else 10.0
+    if author:
+        score += min(25.0, 5 * math.log10(1 + author.get("followers", 0)))
+        score += 5 if author.get("verified") else 0
+    score += min(15.0, 3 * math.log2(1 + tweet.get("likes", 0)))
+    score += min(20, 10 * sum(1 for w in RIVALRY_WORDS if w in text))
+    score += 5 if "?" in text else 0
+    if len(words) < 3:
+        score -= 15
+    age = _age_minutes(tweet.get("created_at"), now or time.time())
+    return round(score * 0.5 ** (age / RANK_HALF_LIFE_MINUTES), 2)
+
+
+def _recent_post_ids():
+    since = datetime.utcfromtimestamp(time.time() - BANTER_REPLY_WINDOW_HOURS * 3600).isoformat()
+    c = conn.cursor()
+    c.execute("SELECT id FROM posts WHERE posted_at >= ? AND id IS NOT NULL AND id NOT LIKE 'dryrun-%'", (since,))
+    return [row[0] for row in c.fetchall()]
+
+
+def ingest_banter():
+    """Pull new mentions and replies to our recent posts, rank and store them. Returns the number stored."""
+    our_posts = _recent_post_ids()
+    streams = {"mentions": lambda since: get_mentions(since_id=since)}
+    if our_posts:
+        streams["replies"] = lambda since: search_replies(our_posts, since_id=since)
+
+    our_post_ids = set(our_posts)
+    stored = 0
+    now = time.time()
+    for stream, fetch in streams.items():
+        since = _get_cursor(stream)
+        try:
+            tweets = fetch(since)
+        except TooManyRequests:
+            logger.warning("X rate limit on %s ingestion, retrying next run", stream)
+            continue
+        if not tweets:
+            continue
+        # Authors came with the response (cached); whatever is missing is one bulk lookup
+        authors = lookup_users({t["author_id"] for t in tweets if t["author_id"]})
+        rows = []
+        for t in tweets:
+            author = authors.get(t["author_id"]) or {}
+            score = rank_candidate(t, author, our_post_ids, now)
+            rows.append((
+                t["id"], stream, t["author_id"], author.get("username"), t["text"], t["conversation_id"],
+                t["replied_to"], t["conversation_id"] if t["conversation_id"] in our_post_ids else None,
+                t["created_at"], score, SKIPPED if score is None else NEW, _now_iso(),
+            ))
+        newest = max((t["id"] for t in tweets), key=int)
+        c = conn.cursor()
+        c.executemany("""
+            INSERT OR IGNORE INTO banter_candidates
+                (tweet_id, stream, author_id, author_username, text, conversation_id, reply_to_id,
+                 our_post_id, created_at, score, status, ingested_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        stored += c.rowcount if c.rowcount > 0 else 0
+        # Cursor moves in the same transaction as the rows it covers
+        c.execute("""
+            INSERT INTO x_cursors (stream, since_id, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(stream) DO UPDATE SET since_id = excluded.since_id, updated_at = excluded.updated_at
+        """, (stream, newest, _now_iso()))
+        conn.commit()
+        logger.info("Banter %s: %d new tweets (since %s)", stream, len(tweets), since)
+    return stored
+
+
+def _top_candidates(limit):
+    since = datetime.utcfromtimestamp(time.time() - BANTER_MAX_AGE_MINUTES * 60).isoformat()
+    c = conn.cursor()
+    c.execute("""
+        SELECT tweet_id, author_username, text, reply_to_id FROM banter_candidates
+        WHERE status = ? AND score >= ? AND ingested_at >= ?
+        ORDER BY score DESC LIMIT ?
+    """, (NEW, BANTER_MIN_SCORE, since, limit))
+    return c.fetchall()
+
+
+def _claim(tweet_id):
+    """True if this worker moved the candidate from new to replying (no other worker has it)."""
+    cur = conn.execute("UPDATE banter_candidates SET status = ? WHERE tweet_id = ? AND status = ?",
+                       (REPLYING, tweet_id, NEW))
+    conn.commit()
+    return cur.rowcount == 1
+
+
+def _release(tweet_id):
+    """Give a failed claim back: new again, or skipped once it has failed BANTER_MAX_ATTEMPTS times."""
+    conn.execute("""
+        UPDATE banter_candidates
+        SET attempts = attempts + 1, status = CASE WHEN attempts + 1 >= ? THEN ? ELSE ? END
+        WHERE tweet_id = ? AND status = ?
+    """, (BANTER_MAX_ATTEMPTS, SKIPPED, NEW, tweet_id, REPLYING))
+    conn.commit()
+
+
+def respond_to_banter(limit=BANTER_REPLIES_PER_RUN):
+    """LLM replies for the best-ranked new candidates; posted only with BANTER_AUTO_REPLY."""
+    from agents.writer_agent import generate_reply
+
+    candidates = _top_candidates(limit)
+    if not candidates:
+        return 0
+    # Parents (usually our posts) in one cached bulk lookup
+    parents = lookup_tweets([row[3] for row in candidates if row[3]])
+    done = 0
+    for tweet_id, username, text, reply_to_id in candidates:
+        if not _claim(tweet_id):
+            continue  # another worker is answering it
+        try:
+            parent = parents.get(reply_to_id) or {}
+            reply = generate_reply(text, username or "", parent.get("text", ""))
+            if not reply or is_duplicate(reply):
+                conn.execute("UPDATE banter_candidates SET status = ? WHERE tweet_id = ?", (SKIPPED, tweet_id))
+                conn.commit()
+                continue
+            reply_id, status = None, DRAFTED
+            if BANTER_AUTO_REPLY:
+                reply_id = post_reply(reply, tweet_id)
+                status = REPLIED
+        except Exception as e:
+            _release(tweet_id)
+            logger.warning("Banter reply to %s failed, released: %s", tweet_id, e)
+            continue
+        except BaseException:
+            _release(tweet_id)  # e.g. OpenAI quota exit: leave it for the next run
+            raise
+        conn.execute("UPDATE banter_candidates SET status = ?, reply_text = ?, reply_id = ? WHERE tweet_id = ?",
+                     (status, reply, reply_id, tweet_id))
+        conn.commit()
+        if status == REPLIED:
+            remember_post(reply)
+        logger.info("Banter %s to @%s (%s): %s", status, username, tweet_id, reply)
+        done += 1
+    return done
+
+
+def run_banter_cycle():
+    """Runtime job: ingest, rank, reply to the best few."""
+    stored = ingest_banter()
+    replied = respond_to_banter()
+    logger.info("Banter cycle: %d candidates stored, %d replies (tweet cache %s, user cache %s)",
+                stored, replied, tweet_cache.stats(), user_cache.stats())
+    return replied
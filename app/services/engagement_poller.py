@@ -0,0 +1,176 @@
+"""
+Engagement time series: re-poll each post at decaying intervals after posting
+(ENGAGEMENT_POLL_AGES, e.g. 15 min, 1 h, 6 h, 24 h) and keep every snapshot.
+
+Due posts go through a priority queue: earlier stages first (the first readings
+matter most for learning), then the most overdue. They are packed into bulk
+lookups of up to 100 ids, and spare slots are filled with posts due soon, so the
+extra snapshots cost almost no extra requests.
+"""
+import heapq
+import logging
+import time
+from datetime import datetime
+
+from tweepy import TooManyRequests
+from config import (
+    ENGAGEMENT_POLL_AGES,
+    ENGAGEMENT_POLL_BUDGET,
+    ENGAGEMENT_COALESCE_SECONDS,
+    ENGAGEMENT_RETRY_SECONDS,
+)
+from database import conn
+from x_client import get_tweets_engagement
+from agents.engagement_agent import update_actual_engagement
+
+logger = logging.getLogger("main_logger.engagement")
+
+LOOKUP_BATCH = 100  # max ids per X tweet lookup
+
+
+def _seed_unscheduled():
+    """
+    Posts saved before the time series existed and never measured (nor gone): poll
+    them now, aged from their real posted_at (UTC ISO text → epoch; now if unknown),
+    so the first poll records the true age and skips the stages already past.
+    """
+    now = time.time()
+    c = conn.cursor()
+    c.execute(
+        """
+        INSERT OR IGNORE INTO engagement_schedule (post_id, posted_at, stage, next_due)
+        SELECT id, COALESCE((julianday(posted_at) - 2440587.5) * 86400.0, ?), 0, ? FROM posts
+        WHERE engagement_fetched_at IS NULL AND engagement_gone_at IS NULL AND id IS NOT NULL
+        """,
+        (now, now),
+    )
+    conn.commit()
+
+
+def _due_queue(now, horizon):
+    """Heap of (stage, next_due, post_id, posted_at) for posts due before `horizon`."""
+    c = conn.cursor()
+    c.execute(
+        "SELECT stage, next_due, post_id, posted_at FROM engagement_schedule WHERE next_due <= ?",
+        (horizon,),
+    )
+    due, soon = [], []
+    for stage, next_due, post_id, posted_at in c.fetchall():
+        (due if next_due <= now else soon).append((stage, next_due, post_id, posted_at))
+    heapq.heapify(due)
+    soon.sort(key=lambda r: r[1])
+    return due, soon
+
+
+def plan_batches(now=None, budget=None):
+    """
+    Pick the post ids to poll this cycle.
+
+    Returns:
+        List of batches (each ≤100 rows of (stage, next_due, post_id, posted_at)),
+        at most `budget` of them. Overdue posts are taken in priority order;
+        spare slots in the last batch are topped up with posts due within
+        ENGAGEMENT_COALESCE_SECONDS.
+    """
+    now = now or time.time()
+    budget = ENGAGEMENT_POLL_BUDGET if budget is None else budget
+    due, soon = _due_queue(now, now + ENGAGEMENT_COALESCE_SECONDS)
+    batches = []
+    while due and len(batches) < budget:
+        batch = [heapq.heappop(due) for _ in range(min(LOOKUP_BATCH, len(due)))]
+        batches.append(batch)
+    if batches and len(batches[-1]) < LOOKUP_BATCH:
+        spare = LOOKUP_BATCH - len(batches[-1])
+        batches[-1].extend(soon[:spare])
+    return batches
+
+
+def _record(c, row, metrics, now):
+    stage, _, post_id, posted_at = row
+    c.execute(
+        """
+        INSERT INTO engagement_snapshots (post_id, taken_at, age_seconds, likes, retweets, replies, quotes)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        (post_id, datetime.utcfromtimestamp(now).isoformat(), int(now - posted_at),
+         metrics["likes"], metrics["retweets"], metrics["replies"], metrics["quotes"]),
+    )
+    # Advance past every age we've already reached (late polls skip missed stages)
+    age = now - posted_at
+    nxt = stage + 1
+    while nxt < len(ENGAGEMENT_POLL_AGES) and ENGAGEMENT_POLL_AGES[nxt] <= age:
+        nxt += 1
+    if nxt >= len(ENGAGEMENT_POLL_AGES):
+        c.execute("DELETE FROM engagement_schedule WHERE post_id = ?", (post_id,))
+    else:
+        c.execute(
+            "UPDATE engagement_schedule SET stage = ?, next_due = ?, misses = 0 WHERE post_id = ?",
+            (nxt, posted_at + ENGAGEMENT_POLL_AGES[nxt], post_id),
+        )
+
+
+def poll_engagement(budget=None, delay_seconds=1):
+    """
+    Take one round of engagement snapshots within the request budget.
+    The latest snapshot is also written to posts via update_actual_engagement.
+
+    Returns:
+        Number of posts updated.
+    """
+    _seed_unscheduled()
+    batches = plan_batches(budget=budget)
+    updated = 0
+    for i, batch in enumerate(batches):
+        if i:
+            time.sleep(delay_seconds)  # respect rate limits
+        try:
+            metrics, gone = get_tweets_engagement([row[2] for row in batch])
+        except TooManyRequests:
+            logger.warning("X lookup rate-limited; %d batches left for next cycle", len(batches) - i)
+            break
+        except Exception as e:
+            logger.warning("Engagement lookup failed: %s", e)
+            continue
+        now = time.time()
+        c = conn.cursor()
+        for row in batch:
+            post_id = row[2]
+            m = metrics.get(str(post_id))
+            if str(post_id) in gone:
+                # X says deleted or protected: nothing more to learn from it; never re-seeded
+                c.execute("DELETE FROM engagement_schedule WHERE post_id = ?", (post_id,))
+                c.execute("UPDATE posts SET engagement_gone_at = ? WHERE id = ?",
+                          (datetime.utcfromtimestamp(now).isoformat(), post_id))
+            elif m is None:
+                # Left out without an error (partial response): try again later, backing off
+                c.execute(
+                    """
+                    UPDATE engagement_schedule
+                    SET misses = misses + 1, next_due = ? + MIN(? * (1 << MIN(misses, 20)), ?)
+                    WHERE post_id = ?
+                    """,
+                    (now, ENGAGEMENT_RETRY_SECONDS, ENGAGEMENT_POLL_AGES[-1], post_id),
+                )
+            else:
+                _record(c, row, m, now)
+        conn.commit()
+        for row in batch:
+            m = metrics.get(str(row[2]))
+            if m is not None:
+                update_actual_engagement(row[2], m["likes"], m["retweets"])
+                updated += 1
+    logger.info("Engagement poll: %d posts updated in %d lookups", updated, len(batches))
+    return updated
+
+
+def get_engagement_series(post_id):
+    """Snapshots for one post, oldest first: [(age_seconds, likes, retweets, replies, quotes)]."""
+    c = conn.cursor()
+    c.execute(
+        """
+        SELECT age_seconds, likes, retweets, replies, quotes FROM engagement_snapshots
+        WHERE post_id = ? ORDER BY age_seconds
+        """,
+        (post_id,),
+    )
+    return c.fetchall()
@@ -10,10 +10,11 @@ from openai_errors import handle_openai_rate_limit
 client = OpenAI(api_key=OPENAI_API_KEY)
 
 
-def predict_engagement(text: str, event: str, emotion: str) -> int:
+def predict_engagement(text: str, event: str, emotion: str, timeout: float = None) -> int:
     """
     Predict virality of a candidate tweet (0–100).
     Used to rank candidates; later we compare with actual engagement to learn.
+    timeout caps the request in seconds, without retries (decision path).
     """
     prompt = f"""
 You are judging how viral a cricket tweet will be on X.
@@ -29,7 +30,8 @@ Reply with ONLY a number from 0 to 100 (no explanation).
 """
 
     try:
-        r = client.chat.completions.create(
+        api = client if timeout is None else client.with_options(timeout=timeout, max_retries=0)
+        r = api.chat.completions.create(
             model="gpt-4o-mini",
             messages=[{"role": "user", "content": prompt}]
         )
@@ -43,3 +45,30 @@ Reply with ONLY a number from 0 to 100 (no explanation).
         return 50
     score = min(100, max(0, int(digits[:3] if len(digits) > 2 else digits)))
     return score
+
+
+# Words that tend to pull replies/quotes on cricket Twitter
+_HOOK_WORDS = ("six", "wicket", "chase", "nerve", "panic", "carnage", "final", "win", "?")
+
+
+def predict_engagement_local(text: str, event: str, emotion: str) -> int:
+    """
+    Cheap 0–100 virality estimate with no API call (fast path when the LLM budget is gone).
+    Rewards punchy length, hook words, emoji/exclamation energy and overlap with the event.
+    """
+    score = 40
+    length = len(text)
+    if 60 <= length <= 180:
+        score += 15
+    elif length > 240:
+        score -= 10
+    lower = text.lower()
+    score += 5 * sum(1 for w in _HOOK_WORDS if w in lower)
+    if "!" in text or any(ord(ch) > 0x2600 for ch in text):
+        score += 5
+    event_words = {w.strip(".,:|()").lower() for w in event.split() if len(w) > 3}
+    if event_words & set(lower.split()):
+        score += 10
+    if emotion in ("panic", "hype", "tension"):
+        score += 5
+    return min(100, max(0, score))
@@ -0,0 +1,168 @@
+"""
+Materialized engagement aggregates, maintained incrementally.
+
+engagement_stats holds count / mean / M2 (Welford) of the composite engagement
+(likes + 2*retweets) per emotion, narrative and posting hour, plus two
+calibration dimensions: actual engagement per predicted_score bucket, and the
+prediction error (actual clamped to 0–100 minus predicted) histogram. Updating
+a post's engagement replaces its old value, so reads are O(groups), not O(posts).
+"""
+from database import conn
+
+DIMENSIONS = ("emotion", "narrative", "hour", "predicted_bucket", "error_bucket")
+BUCKET_WIDTH = 10
+
+
+def _bucket(value):
+    """Lower edge of the 10-point bucket a value falls into (e.g. 37 → 30, -12 → -20)."""
+    return int(value // BUCKET_WIDTH * BUCKET_WIDTH)
+
+
+def _groups(post):
+    """
+    (dimension, key, value) rows a measured post contributes to.
+    `post` is a dict with emotion, narrative, posted_at, predicted_score, score.
+    """
+    value = post["score"]
+    hour = post["posted_at"][11:13] if post.get("posted_at") else "unknown"
+    rows = [
+        ("emotion", post.get("emotion") or "unknown", value),
+        ("narrative", post.get("narrative") or "unknown", value),
+        ("hour", hour, value),
+    ]
+    predicted = post.get("predicted_score")
+    if predicted is not None:
+        rows.append(("predicted_bucket", str(_bucket(min(predicted, 99))), value))
+        error = min(value, 100) - predicted
+        rows.append(("error_bucket", str(_bucket(error)), error))
+    return rows
+
+
+def _apply(c, dimension, key, x, sign):
+    """Add (sign=1) or remove (sign=-1) one observation x from a group (Welford)."""
+    c.execute(
+        "SELECT n, mean, m2 FROM engagement_stats WHERE dimension = ? AND key = ?",
+        (dimension, key),
+    )
+    row = c.fetchone()
+    n, mean, m2 = row if row else (0, 0.0, 0.0)
+    if sign > 0:
+        n += 1
+        delta = x - mean
+        mean += delta / n
+        m2 += delta * (x - mean)
+    elif n <= 1:
+        n, mean, m2 = 0, 0.0, 0.0
+    else:
+        old_mean = mean
+        n -= 1
+        mean = (old_mean * (n + 1) - x) / n
+        m2 = max(0.0, m2 - (x - mean) * (x - old_mean))
+    c.execute(
+        """
+        INSERT INTO engagement_stats (dimension, key, n, mean, m2) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(dimension, key) DO UPDATE SET n = excluded.n, mean = excluded.mean, m2 = excluded.m2
+        """,
+        (dimension, key, n, mean, m2),
+    )
+
+
+def record_engagement(c, old_post, new_post):
+    """
+    Move a post's contribution from its previous measurement (None if first) to
+    the new one. Runs on the caller's cursor so it commits with the post update.
+    """
+    if old_post is not None:
+        for dimension, key, x in _groups(old_post):
+            _apply(c, dimension, key, x, -1)
+    for dimension, key, x in _groups(new_post):
+        _apply(c, dimension, key, x, 1)
+
+
+def rebuild_engagement_stats():
+    """Recompute every aggregate from posts (one full scan; used to initialise/repair)."""
+    c = conn.cursor()
+    c.execute("DELETE FROM engagement_stats")
+    c.execute("""
+        SELECT emotion, narrative, posted_at, predicted_score, score
+        FROM posts WHERE engagement_fetched_at IS NOT NULL
+    """)
+    cols = ("emotion", "narrative", "posted_at", "predicted_score", "score")
+    for row in c.fetchall():
+        record_engagement(conn.cursor(), None, dict(zip(cols, row)))
+    conn.commit()
+
+
+def get_group_stats(dimension):
+    """
+    Aggregates for one dimension.
+
+    Returns:
+        List of dicts with key, n, mean, variance (sample), ordered by key.
+    """
+    c = conn.cursor()
+    c.execute(
+        "SELECT key, n, mean, m2 FROM engagement_stats WHERE dimension = ? AND n > 0 ORDER BY key",
+        (dimension,),
+    )
+    return [
+        {"key": key, "n": n, "mean": mean, "variance": m2 / (n - 1) if n > 1 else 0.0}
+        for key, n, mean, m2 in c.fetchall()
+    ]
+
+
+def calibration_report():
+    """
+    How predicted_score lines up with actual engagement.
+
+    Returns:
+        Dict with `buckets` (predicted bucket → n, mean/std of actual composite),
+        `errors` (error bucket → n), `mean_error`, `mean_abs_error` and
+        `inversions` (adjacent predicted buckets whose mean actual goes down).
+    """
+    buckets = sorted(get_group_stats("predicted_bucket"), key=lambda r: int(r["key"]))
+    errors = sorted(get_group_stats("error_bucket"), key=lambda r: int(r["key"]))
+    n_err = sum(r["n"] for r in errors)
+    mean_error = sum(r["mean"] * r["n"] for r in errors) / n_err if n_err else None
+    mean_abs_error = sum(abs(r["mean"]) * r["n"] for r in errors) / n_err if n_err else None
+    inversions = sum(1 for a, b in zip(buckets, buckets[1:]) if b["mean"] < a["mean"])
+    return {
+        "buckets": [
+            {"predicted": int(r["key"]), "n": r["n"], "mean_actual": r["mean"], "std_actual": r["variance"] ** 0.5}
+            for r in buckets
+        ],
+        "errors": [{"error": int(r["key"]), "n": r["n"]} for r in errors],
+        "mean_error": mean_error,
+        "mean_abs_error": mean_abs_error,
+        "inversions": inversions,
+    }
+
+
+def format_calibration_report(report=None):
+    """Plain-text version of calibration_report() for logs and the CLI."""
+    report = report or calibration_report()
+    lines = ["Predicted bucket | posts | mean actual (likes + 2*RT) | std"]
+    for b in report["buckets"]:
+        lines.append("{:>3}-{:<3}          | {:>5} | {:>10.1f} | {:>8.1f}".format(
+            b["predicted"], b["predicted"] + BUCKET_WIDTH - 1, b["n"], b["mean_actual"], b["std_actual"]))
+    lines.append("Prediction error (actual clamped to 0–100 minus predicted):")
+    for e in report["errors"]:
+        lines.append("  {:>4} to {:>4}: {}".format(e["error"], e["error"] + BUCKET_WIDTH - 1, e["n"]))
+    if report["mean_error"] is not None:
+        lines.append("Mean error {:.1f}, mean |error| {:.1f}, non-monotonic buckets {}".format(
+            report["mean_error"], report["mean_abs_error"], report["inversions"]))
+    return "\n".join(lines)
+
+
+def _ensure_built():
+    """First run against an existing DB: materialize aggregates from past posts once."""
+    c = conn.cursor()
+    c.execute("SELECT 1 FROM engagement_stats LIMIT 1")
+    if c.fetchone() is not None:
+        return
+    c.execute("SELECT 1 FROM posts WHERE engagement_fetched_at IS NOT NULL LIMIT 1")
+    if c.fetchone() is not None:
+        rebuild_engagement_stats()
+
+
+_ensure_built()
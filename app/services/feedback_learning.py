@@ -1,24 +1,19 @@
 """
 V6 Learning from misses: backfill actual engagement and compare to predicted.
 Run periodically (e.g. every 15 min) so the system learns which predictions were right/wrong.
+
+Each run takes the due engagement snapshots (15 min, 1 h, 6 h, 24 h after posting)
+in bulk lookups; see services/engagement_poller.py.
 """
 
-from x_client import get_tweet_engagement
-from agents.engagement_agent import get_posts_without_engagement, update_actual_engagement
-import time
+from config import ENGAGEMENT_POLL_BUDGET
+from services.engagement_poller import poll_engagement
 
 
-def run_feedback_cycle(batch_size=20, delay_seconds=1):
+def run_feedback_cycle(budget=ENGAGEMENT_POLL_BUDGET, delay_seconds=1):
     """
-    Fetch engagement for recent posts that don't have it yet.
-    Updates DB so we can analyze predicted_score vs actual (likes + 2*retweets) and improve.
+    Fetch engagement for posts whose next snapshot is due, spending at most
+    `budget` bulk lookups. Updates DB so we can analyze predicted_score vs
+    actual (likes + 2*retweets) and improve. Returns the number of posts updated.
     """
-    post_ids = get_posts_without_engagement(limit=batch_size)
-    updated = 0
-    for post_id in post_ids:
-        likes, retweets = get_tweet_engagement(post_id)
-        if likes is not None:
-            update_actual_engagement(post_id, likes, retweets)
-            updated += 1
-        time.sleep(delay_seconds)  # respect rate limits
-    return updated
+    return poll_engagement(budget=budget, delay_seconds=delay_seconds)
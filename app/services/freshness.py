@@ -0,0 +1,89 @@
+"""
+Event freshness: remember the latest scoreboard seen per match so a decision
+built on an older snapshot can be caught before it is published.
+"""
+import threading
+import time
+
+from config import FRESHNESS_SLA_SECONDS
+
+_latest = {}  # match_id -> (state_key, fetched_at, event, state)
+_published = {}  # match_id -> state_key of the last scoreboard we posted about
+_lock = threading.Lock()
+
+
+def record_snapshot(event, state):
+    """Register a freshly fetched snapshot; older ones for the same match become superseded."""
+    match_id = state.match_id
+    if not match_id:
+        return
+    fetched_at = state.fetched_at or 0
+    with _lock:
+        current = _latest.get(match_id)
+        if current is None or fetched_at >= current[1]:
+            _latest[match_id] = (state.state_key, fetched_at, event, state)
+
+
+def latest_snapshot(match_id):
+    """(event, state) of the newest snapshot for a match, or (None, None)."""
+    with _lock:
+        current = _latest.get(match_id)
+    if current is None:
+        return None, None
+    return current[2], current[3]
+
+
+def event_age(state, now=None):
+    """Seconds since the source state was fetched, or None if unstamped."""
+    fetched_at = state.fetched_at
+    if not fetched_at:
+        return None
+    return (now or time.time()) - fetched_at
+
+
+def is_superseded(state):
+    """True if a newer snapshot with a different scoreboard exists for this match."""
+    match_id = state.match_id
+    if not match_id:
+        return False
+    with _lock:
+        current = _latest.get(match_id)
+    if current is None:
+        return False
+    return current[0] != state.state_key and current[1] > (state.fetched_at or 0)
+
+
+def check_freshness(state, now=None):
+    """
+    Return None if the state may still be published, else a reason string
+    ("superseded" or "stale") for dropping/regenerating the decision.
+    """
+    if is_superseded(state):
+        return "superseded"
+    age = event_age(state, now)
+    if age is not None and age > FRESHNESS_SLA_SECONDS:
+        return "stale"
+    return None
+
+
+def mark_published(state):
+    """Remember the scoreboard we just posted about so a second decision on it is skipped."""
+    match_id = state.match_id
+    if match_id:
+        with _lock:
+            _published[match_id] = state.state_key
+
+
+def was_published(state):
+    match_id = state.match_id
+    if not match_id:
+        return False
+    with _lock:
+        return _published.get(match_id) == state.state_key
+
+
+def restore_published(match_id, state_key):
+    """Adopt the last posted scoreboard of a match handed over by another worker (see leases)."""
+    if match_id and state_key is not None:
+        with _lock:
+            _published.setdefault(match_id, state_key)
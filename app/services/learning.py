@@ -0,0 +1,246 @@
+"""
+Offline learning: refit decision parameters from posts with backfilled engagement.
+
+feedback_learning fills in actual likes/retweets; this job reads them back and
+refits, fully locally with numpy:
+
+    virality_weights   score of each virality rule in rules.json (ridge fit of
+                       log engagement on which rules fired, rescaled to the
+                       current total and shrunk towards the current weights)
+    post_emotions      emotions posted unconditionally: those whose posts below
+                       the threshold still beat the median post
+    min_score          virality score threshold for the other emotions
+    num_candidates     LLM candidates per decision with the best engagement
+
+Posts are streamed from SQLite LEARN_CHUNK_SIZE rows at a time. Rule hits are
+recomputed from each post's stored features with the current rules, so renamed
+or edited rules are learned as they are now. Results go to a new versioned file
+PARAMS_DIR/params-<version>.json and PARAMS_DIR/current.json is switched to it;
+services/rules.py hot-loads whatever current.json names (roll back by pointing
+it at an older version).
+
+Only posted events are ever measured, so a threshold can be raised from the
+data but never lowered below what was posted, and an emotion can only be added
+to post_emotions once it has posts below the threshold (from an older regime).
+
+    python app/main.py learn [--dry-run]
+"""
+import argparse
+import contextlib
+import glob
+import json
+import logging
+import os
+import re
+from datetime import datetime
+
+import numpy as np
+
+from config import (
+    PARAMS_DIR,
+    LEARN_MIN_POSTS,
+    LEARN_MIN_GROUP,
+    LEARN_PRIOR_WEIGHT,
+    LEARN_CHUNK_SIZE,
+    LEARN_KEEP_VERSIONS,
+    NUM_CANDIDATES,
+    CANDIDATE_CHOICES,
+)
+from database import conn
+from fileio import write_json_atomic
+from services.rules import get_rules
+
+logger = logging.getLogger("main_logger.learning")
+
+# L2 penalty of the virality weight fit (on log1p engagement)
+RIDGE = 1.0
+# Thresholds min_score may take
+THRESHOLD_GRID = np.arange(0, 101, 5)
+
+
+def _chunks(chunk_size):
+    """Measured posts with stored features, chunk_size rows at a time."""
+    c = conn.cursor()
+    c.execute("""
+        SELECT score, emotion, source, num_candidates, features FROM posts
+        WHERE engagement_fetched_at IS NOT NULL AND features IS NOT NULL
+          AND id IS NOT NULL AND id NOT LIKE 'dryrun-%'
+    """)
+    while True:
+        rows = c.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield rows
+
+
+def load_training_set(ruleset, chunk_size=LEARN_CHUNK_SIZE):
+    """
+    Arrays for fitting: y (log1p engagement), hits (posts × virality rules, bool),
+    emotion (str), llm (bool) and candidates (int, 0 if unknown).
+    """
+    parts = {"y": [], "hits": [], "emotion": [], "llm": [], "candidates": []}
+    width = len(ruleset.virality)
+    for rows in _chunks(chunk_size):
+        features = [json.loads(r[4]) for r in rows]
+        parts["y"].append(np.log1p(np.array([r[0] or 0 for r in rows], dtype=float)))
+        parts["hits"].append(np.array([ruleset.virality_hits(f) for f in features], dtype=bool).reshape(-1, width))
+        parts["emotion"].append(np.array([r[1] or "unknown" for r in rows], dtype=object))
+        parts["llm"].append(np.array([r[2] == "llm" for r in rows], dtype=bool))
+        parts["candidates"].append(np.array([r[3] or 0 for r in rows], dtype=int))
+    if not parts["y"]:
+        return None
+    return {k: np.concatenate(v) for k, v in parts.items()}
+
+
+def fit_virality_weights(hits, y, prior):
+    """
+    Ridge fit of y on rule hits; negative lifts clip to 0, weights are rescaled to
+    the prior's total and each is shrunk towards its prior by how often it fired.
+    """
+    if hits.shape[1] == 0:
+        return prior
+    X = np.column_stack([np.ones(len(y)), hits.astype(float)])
+    penalty = RIDGE * np.eye(X.shape[1])
+    penalty[0, 0] = 0.0  # intercept is not penalized
+    coef = np.linalg.solve(X.T @ X + penalty, X.T @ y)
+    lift = np.clip(coef[1:], 0.0, None)
+    fitted = lift / lift.sum() * prior.sum() if lift.sum() > 0 else prior
+    fired = hits.sum(axis=0)
+    alpha = fired / (fired + LEARN_PRIOR_WEIGHT)
+    return alpha * fitted + (1 - alpha) * prior
+
+
+def _group_means(labels, y):
+    """(unique labels, counts, mean y) per label."""
+    keys, codes = np.unique(labels, return_inverse=True)
+    counts = np.bincount(codes, minlength=len(keys))
+    means = np.bincount(codes, weights=y, minlength=len(keys)) / np.maximum(counts, 1)
+    return keys, counts, means
+
+
+def fit_post_emotions(emotion, scores, y, current, min_score):
+    """
+    Posting an emotion unconditionally only matters for its posts below min_score:
+    an emotion with at least LEARN_MIN_GROUP such posts is kept (or added) when
+    their mean engagement reaches the median post, and dropped otherwise.
+    Emotions without enough data keep their current status. Returns (emotions, median).
+    """
+    median = float(np.median(y))
+    below = scores < min_score
+    postable = set(current)
+    for key, count, mean in zip(*_group_means(emotion[below], y[below])):
+        if count < LEARN_MIN_GROUP:
+            continue
+        if mean >= median:
+            postable.add(key)
+        else:
+            postable.discard(key)
+    return sorted(postable), median
+
+
+def fit_min_score(scores, y, current):
+    """
+    Threshold maximizing the summed engagement above the median of the posts it
+    lets through; ties go to the value closest to the current threshold.
+    """
+    if len(y) < LEARN_MIN_GROUP:
+        return current
+    gain = (THRESHOLD_GRID[:, None] <= scores[None, :]) @ (y - np.median(y))
+    best = THRESHOLD_GRID[gain >= gain.max() - 1e-9]
+    return int(best[np.argmin(np.abs(best - current))])
+
+
+def fit_num_candidates(candidates, y, current):
+    """Count in CANDIDATE_CHOICES with the best mean engagement (needs two groups of LEARN_MIN_GROUP)."""
+    keys, counts, means = _group_means(candidates, y)
+    eligible = np.isin(keys, CANDIDATE_CHOICES) & (counts >= LEARN_MIN_GROUP)
+    if eligible.sum() < 2:
+        return current
+    return int(keys[eligible][np.argmax(means[eligible])])
+
+
+def fit_params(data, ruleset):
+    """New parameters (plus fit metrics) from a training set, starting from the rule set in effect."""
+    names = [r["name"] for r in ruleset.virality]
+    prior = np.array([float(r["score"]) for r in ruleset.virality])
+    current_min = ruleset.min_score if ruleset.min_score is not None else 50
+    current_candidates = ruleset.params.get("num_candidates", NUM_CANDIDATES)
+
+    weights = fit_virality_weights(data["hits"], data["y"], prior)
+    scores = data["hits"].astype(float) @ weights  # virality scores under the new weights
+    emotions, median = fit_post_emotions(data["emotion"], scores, data["y"], ruleset.post_emotions, current_min)
+    # Only emotions left out of post_emotions depend on the threshold
+    gated = ~np.isin(data["emotion"], emotions)
+    min_score = fit_min_score(scores[gated], data["y"][gated], current_min)
+    llm = data["llm"] & (data["candidates"] > 0)
+    num_candidates = fit_num_candidates(data["candidates"][llm], data["y"][llm], current_candidates)
+
+    return {
+        "virality_weights": {name: round(float(w), 1) for name, w in zip(names, weights)},
+        "post_emotions": emotions,
+        "min_score": min_score,
+        "num_candidates": num_candidates,
+        "metrics": {
+            "posts": int(len(data["y"])),
+            "mean_log_engagement": round(float(data["y"].mean()), 3),
+            "median_log_engagement": round(median, 3),
+            "threshold_posts": int(gated.sum()),
+            "llm_posts": int(llm.sum()),
+            "rule_hits": {name: int(n) for name, n in zip(names, data["hits"].sum(axis=0))},
+        },
+    }
+
+
+def _versions(params_dir):
+    found = (re.fullmatch(r"params-(\d+)\.json", os.path.basename(p))
+             for p in glob.glob(os.path.join(params_dir, "params-*.json")))
+    return sorted(int(m.group(1)) for m in found if m)
+
+
+def write_params(params, params_dir=PARAMS_DIR, keep=LEARN_KEEP_VERSIONS):
+    """Write params as the next version, point current.json at it, prune old versions. Returns the version."""
+    os.makedirs(params_dir, exist_ok=True)
+    version = (_versions(params_dir) or [0])[-1] + 1
+    while True:
+        name = "params-{:06d}.json".format(version)
+        try:
+            # O_EXCL: two trainers never write the same version
+            os.close(os.open(os.path.join(params_dir, name), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            version += 1
+    params = dict(params, version=version, created_at=datetime.utcnow().isoformat())
+    write_json_atomic(os.path.join(params_dir, name), params, indent=2)
+    write_json_atomic(os.path.join(params_dir, "current.json"), {"version": version, "file": name}, indent=2)
+    for old in _versions(params_dir)[:-keep] if keep > 0 else []:
+        with contextlib.suppress(OSError):
+            os.unlink(os.path.join(params_dir, "params-{:06d}.json".format(old)))
+    return version
+
+
+def run_learning(dry_run=False, params_dir=PARAMS_DIR):
+    """
+    Fit new parameters and publish them (unless dry_run). Returns the params dict,
+    or None when fewer than LEARN_MIN_POSTS measured posts are available.
+    """
+    ruleset = get_rules()
+    data = load_training_set(ruleset)
+    n = 0 if data is None else len(data["y"])
+    if n < LEARN_MIN_POSTS:
+        logger.info("Learning skipped: %d measured posts with features (need %d)", n, LEARN_MIN_POSTS)
+        return None
+    params = fit_params(data, ruleset)
+    params["previous_version"] = ruleset.params.get("version")
+    if not dry_run:
+        params["version"] = write_params(params, params_dir)
+    logger.info("Learned params%s from %d posts: weights=%s post_emotions=%s min_score=%s num_candidates=%s",
+                "" if dry_run else " v{}".format(params["version"]), n, params["virality_weights"],
+                params["post_emotions"], params["min_score"], params["num_candidates"])
+    return params
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py learn", description="Refit decision parameters.")
+    parser.add_argument("--dry-run", action="store_true", help="print the fitted params without publishing them")
+    args = parser.parse_args(argv)
+    return run_learning(dry_run=args.dry_run)
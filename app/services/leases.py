@@ -0,0 +1,162 @@
+"""
+Match leases for sharded multi-worker deployments (SHARDED_WORKERS=1).
+
+Workers (processes or containers sharing data/learning.db) split live matches
+through rows in match_leases. Every cycle a worker renews the leases it holds,
+gives up matches that left watch_match output, have ended or exceed its fair
+share of the live matches (ceil(live matches / live workers)), and claims free
+or expired live ones up to that share, all in one write transaction. Upcoming
+and ended matches are never claimed. A match that ends while held is processed
+one last time by its holder (for the result), and the lease is kept until that
+result is posted or could no longer pass the freshness check (FRESHNESS_SLA_SECONDS).
+Only the holder processes a match, and publish re-checks the lease just before
+posting, so a match is never posted by two workers. A crashed worker's leases
+expire after LEASE_TTL_SECONDS and are taken over by the others; on clean
+shutdown they are released at once.
+
+The last scoreboard posted about is kept on the lease row, so the next owner
+does not post about it again.
+"""
+import json
+import logging
+import math
+import threading
+import time
+
+from config import WORKER_ID, LEASE_TTL_SECONDS, FRESHNESS_SLA_SECONDS
+from database import conn
+from services.freshness import restore_published
+
+logger = logging.getLogger("main_logger.leases")
+
+# Ended matches this worker gave a last pass: match_id → when (epoch). The lease is
+# kept until the result is posted (record_published) or FRESHNESS_SLA_SECONDS later
+_finished = {}
+_finished_lock = threading.Lock()  # claim (ingest thread) vs record_published (publish thread)
+
+
+def _key_from_json(value):
+    """state_key back from JSON (lists → tuples, recursively)."""
+    def to_tuple(v):
+        return tuple(to_tuple(x) for x in v) if isinstance(v, list) else v
+    return to_tuple(json.loads(value)) if value else None
+
+
+def claim_matches(match_ids, live_ids=None, now=None):
+    """
+    Renew, release and claim leases for this cycle's matches. Only ids in live_ids
+    (default: all of match_ids) are leased and count towards the fair share.
+
+    Returns:
+        (owned, handed_over): match ids this worker processes this cycle (leases
+        held plus matches that just ended under its lease), and
+        {match_id: published state_key} for leases taken over from another worker.
+    """
+    now = now or time.time()
+    expires = now + LEASE_TTL_SECONDS
+    listed = {m for m in match_ids if m}
+    wanted = sorted(listed if live_ids is None else listed.intersection(live_ids))
+    with _finished_lock:
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE")  # serialize claimers across processes
+        try:
+            c.execute("""
+                INSERT INTO workers(worker_id, started_at, heartbeat_at) VALUES (?, ?, ?)
+                ON CONFLICT(worker_id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at
+            """, (WORKER_ID, now, now))
+            c.execute("DELETE FROM workers WHERE heartbeat_at < ?", (now - LEASE_TTL_SECONDS,))
+            c.execute("SELECT COUNT(*) FROM workers")
+            share = math.ceil(len(wanted) / max(1, c.fetchone()[0]))
+
+            c.execute("SELECT match_id FROM match_leases WHERE worker_id = ? AND expires_at >= ?", (WORKER_ID, now))
+            held = {row[0] for row in c.fetchall()}
+            keep = sorted(held.intersection(wanted))[:share]
+            # Ended under our lease: kept (outside the share) for one last pass, so the result can be posted
+            finishing = (held & listed) - set(wanted) - set(_finished)
+            # After it, publish may still hold the result; anything older than the SLA is dropped there
+            holding = {m for m, at in list(_finished.items()) if m in held and now - at <= FRESHNESS_SLA_SECONDS}
+            release = held - set(keep) - finishing - holding
+
+            placeholders = ",".join("?" * len(wanted))
+            rows = {}
+            if wanted:
+                c.execute(f"""
+                    SELECT match_id, worker_id, expires_at, published_key FROM match_leases
+                    WHERE match_id IN ({placeholders})
+                """, wanted)
+                rows = {r[0]: r for r in c.fetchall()}
+            free = [m for m in wanted if m not in held and (m not in rows or rows[m][2] < now)]
+            take = free[:max(0, share - len(keep))]
+
+            if release:
+                c.executemany("UPDATE match_leases SET expires_at = 0 WHERE match_id = ? AND worker_id = ?",
+                              [(m, WORKER_ID) for m in release])
+            c.executemany("UPDATE match_leases SET expires_at = ? WHERE match_id = ? AND worker_id = ?",
+                          [(expires, m, WORKER_ID) for m in keep + sorted(finishing | holding)])
+            c.executemany("""
+                INSERT INTO match_leases(match_id, worker_id, acquired_at, expires_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(match_id) DO UPDATE SET
+                    worker_id = excluded.worker_id, acquired_at = excluded.acquired_at, expires_at = excluded.expires_at
+            """, [(m, WORKER_ID, now, expires) for m in take])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        for m in set(_finished) - holding:
+            _finished.pop(m, None)
+        _finished.update(dict.fromkeys(finishing, now))
+
+    handed_over = {m: _key_from_json(rows[m][3]) for m in take if m in rows and rows[m][3]}
+    if release or take:
+        logger.info("Leases: holding %d/%d live matches (share %d), claimed %s, released %s",
+                    len(keep) + len(take), len(wanted), share, take, sorted(release))
+    return set(keep) | set(take) | finishing, handed_over
+
+
+def filter_owned(match_list):
+    """Keep the (event, state) pairs of matches this worker holds a lease on."""
+    owned, handed_over = claim_matches([state.match_id for _, state in match_list],
+                                       {state.match_id for _, state in match_list if state.snapshot.is_live})
+    for match_id, state_key in handed_over.items():
+        restore_published(match_id, state_key)
+    return [(event, state) for event, state in match_list if state.match_id in owned]
+
+
+def holds_lease(match_id, now=None):
+    """True if this worker still holds an unexpired lease on the match."""
+    c = conn.cursor()
+    c.execute("SELECT 1 FROM match_leases WHERE match_id = ? AND worker_id = ? AND expires_at >= ?",
+              (match_id, WORKER_ID, now or time.time()))
+    return c.fetchone() is not None
+
+
+def record_published(state):
+    """
+    Store the scoreboard just posted about on the lease, for whoever holds the match
+    next. For a match that ended under our lease this was the result: release it.
+    """
+    conn.execute("UPDATE match_leases SET published_key = ? WHERE match_id = ? AND worker_id = ?",
+                 (json.dumps(state.state_key), state.match_id, WORKER_ID))
+    with _finished_lock:
+        if _finished.pop(state.match_id, None) is not None:
+            conn.execute("UPDATE match_leases SET expires_at = 0 WHERE match_id = ? AND worker_id = ?",
+                         (state.match_id, WORKER_ID))
+        conn.commit()
+
+
+def heartbeat(now=None):
+    """Keep this worker and its leases alive between cycles (e.g. while a cycle runs long)."""
+    now = now or time.time()
+    conn.execute("UPDATE workers SET heartbeat_at = ? WHERE worker_id = ?", (now, WORKER_ID))
+    cur = conn.execute("UPDATE match_leases SET expires_at = ? WHERE worker_id = ? AND expires_at >= ?",
+                       (now + LEASE_TTL_SECONDS, WORKER_ID, now))
+    conn.commit()
+    return cur.rowcount
+
+
+def release_all():
+    """Hand every lease back at once (clean shutdown) and leave the worker set."""
+    cur = conn.execute("UPDATE match_leases SET expires_at = 0 WHERE worker_id = ?", (WORKER_ID,))
+    conn.execute("DELETE FROM workers WHERE worker_id = ?", (WORKER_ID,))
+    conn.commit()
+    logger.info("Released %d match lease(s) held by %s", cur.rowcount, WORKER_ID)
@@ -0,0 +1,349 @@
+"""
+Declarative narrative / virality / posting rules.
+
+Rules live in RULES_PATH (JSON, see rules.json): conditions are Python-style
+expressions over a fixed set of match features (FEATURES). A rule file is
+validated against an AST whitelist (feature names, constants, boolean logic,
+comparisons, arithmetic) and compiled once into a single Python function that
+extracts only the features the rules use and runs every rule inline, so a
+match costs one call however many rules there are. Division and modulo by zero
+evaluate to 0 instead of raising. The file is reloaded when its mtime changes;
+a new rule set is first probed on default features and recently evaluated
+matches, and one that fails to compile or to evaluate is logged while the
+previous rules stay active. Parameters learned offline (services/learning.py, versioned
+files in PARAMS_DIR) override virality weights, postable emotions and the
+posting threshold, and are hot-loaded the same way.
+
+Each rule counts its hits (carried over reloads by rule name) for tuning; see
+rule_stats() / log_rule_stats().
+"""
+import ast
+import collections
+import json
+import logging
+import os
+import threading
+import time
+
+from config import RULES_PATH, RULES_CHECK_SECONDS, PARAMS_DIR
+
+logger = logging.getLogger("main_logger.rules")
+
+# Feature name -> expression over (event, low, state) in the compiled evaluator.
+# low = event.lower(); state is a MatchState or None.
+FEATURES = {
+    "wicket": '"WICKET" in event',
+    "six": '"six" in low',
+    "last_over": '"last over" in low',
+    "text": "low",
+    "required_rr": "state.required_rr if state is not None else 0.0",
+    "overs_left": "state.overs_left if state is not None else 0",
+    "runs_needed": "(state.runs_needed if state is not None else None) or 0",
+    "innings": "len(state.score) if state is not None else 0",
+    "runs": "state.score[-1].runs if state is not None and state.score else 0",
+    "wickets": "state.score[-1].wickets if state is not None and state.score else 0",
+    "overs": "state.score[-1].overs if state is not None and state.score else 0.0",
+    "match_type": '(state.match_type or "").lower() if state is not None else ""',
+    "status": '(state.status or "").lower() if state is not None else ""',
+    "is_live": "state is not None and not state.match_ended",
+}
+# Features derived from event text need the lowered string
+_NEEDS_LOW = {"six", "last_over", "text"}
+# Values used when a stored feature dict lacks a feature (older posts)
+_FEATURE_DEFAULTS = {
+    "wicket": False, "six": False, "last_over": False, "text": "", "required_rr": 0.0, "overs_left": 0,
+    "runs_needed": 0, "innings": 0, "runs": 0, "wickets": 0, "overs": 0.0, "match_type": "",
+    "status": "", "is_live": False, "emotion": None,
+}
+
+_features_fn = None
+
+
+def extract_features(event, state=None):
+    """All FEATURES for one event as a plain dict (stored with each post for offline learning)."""
+    global _features_fn
+    if _features_fn is None:
+        lines = ["def features(event, state):", "    low = event.lower()", "    return {"]
+        lines += ["        {!r}: {},".format(name, src) for name, src in FEATURES.items() if name != "text"]
+        lines.append("    }")
+        namespace = {"__builtins__": {"len": len}}
+        exec(compile("\n".join(lines), "<rules-features>", "exec"), namespace)
+        _features_fn = namespace["features"]
+    return _features_fn(event, state)
+
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub,
+    ast.Compare, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq, ast.In, ast.NotIn,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Mod,
+    ast.Name, ast.Load, ast.Constant, ast.Tuple, ast.List,
+)
+
+
+class RuleError(ValueError):
+    """A rule file that cannot be compiled (or fails on a sample match)."""
+
+
+def _div(a, b):
+    return a / b if b else 0.0
+
+
+def _mod(a, b):
+    return a % b if b else 0
+
+
+# Available to generated code; conditions reach them only through _GuardDivision
+_HELPERS = {"_div": _div, "_mod": _mod}
+
+
+class _GuardDivision(ast.NodeTransformer):
+    """Rewrite a / b and a % b into _div(a, b) / _mod(a, b) (0 when b is 0)."""
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        helper = {ast.Div: "_div", ast.Mod: "_mod"}.get(type(node.op))
+        if helper is None:
+            return node
+        return ast.Call(ast.Name(helper, ast.Load()), [node.left, node.right], [])
+
+
+def _parse_condition(rule, names):
+    """Validate a rule's `when` expression; returns (source, feature names it uses)."""
+    expr = rule.get("when")
+    if not isinstance(expr, str) or not expr.strip():
+        raise RuleError("rule {!r}: missing 'when'".format(rule.get("name")))
+    try:
+        tree = ast.parse(expr, mode="eval")
+    except SyntaxError as e:
+        raise RuleError("rule {!r}: {}".format(rule.get("name"), e)) from None
+    used = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise RuleError("rule {!r}: '{}' is not allowed".format(rule.get("name"), type(node).__name__))
+        if isinstance(node, ast.Name):
+            if node.id not in names:
+                raise RuleError("rule {!r}: unknown feature '{}'".format(rule.get("name"), node.id))
+            used.add(node.id)
+    return ast.unparse(ast.fix_missing_locations(_GuardDivision().visit(tree))), used
+
+
+class RuleSet:
+    """One compiled rule file."""
+
+    def __init__(self, spec, source_path=None, signature=None, params=None):
+        self.path = source_path
+        self.signature = signature
+        self.params = params or {}
+        narrative = spec.get("narrative") or []
+        virality = [dict(r) for r in spec.get("virality") or []]
+        post = dict(spec.get("post") or {})
+        # Learned parameters (services/learning.py) override the file's weights and thresholds
+        weights = self.params.get("virality_weights") or {}
+        for rule in virality:
+            if rule.get("name") in weights:
+                rule["score"] = weights[rule["name"]]
+        if "post_emotions" in self.params:
+            post["emotions"] = self.params["post_emotions"]
+        if "min_score" in self.params:
+            post["min_score"] = self.params["min_score"]
+        self.rules = narrative + virality
+        self.virality = virality
+        self.post_emotions = list(post.get("emotions") or [])
+        self.min_score = post.get("min_score")
+        self.names = [r.get("name") or "rule_{}".format(i) for i, r in enumerate(self.rules)]
+        if len(set(self.names)) != len(self.names):
+            raise RuleError("rule names must be unique")
+        self.hits = [0] * len(self.rules)
+        self.evaluations = 0
+        self._fn = self._compile(narrative, virality, spec.get("narrative_default", "neutral"),
+                                 self.post_emotions, self.min_score)
+        self._hits_fn = self._compile_hits(virality)
+
+    def _compile(self, narrative, virality, default, post_emotions, min_score):
+        features = set(FEATURES)
+        conditions = [_parse_condition(r, features | {"emotion"}) for r in narrative + virality]
+        for (_, used), rule in zip(conditions[:len(narrative)], narrative):
+            if "emotion" in used:
+                raise RuleError("rule {!r}: narrative rules cannot use 'emotion'".format(rule.get("name")))
+            if not isinstance(rule.get("emotion"), str):
+                raise RuleError("rule {!r}: narrative rules need an 'emotion'".format(rule.get("name")))
+        for rule in virality:
+            if not isinstance(rule.get("score"), (int, float)):
+                raise RuleError("rule {!r}: virality rules need a numeric 'score'".format(rule.get("name")))
+        used = set().union(*(u for _, u in conditions)) - {"emotion"}
+
+        lines = ["def evaluate(event, state, emotion=None, _hits=hits):"]
+        if used & _NEEDS_LOW:
+            lines.append("    low = event.lower()")
+        for name in sorted(used):
+            lines.append("    {} = {}".format(name, FEATURES[name]))
+        # Narrative: first match wins (skipped when the caller already knows the emotion)
+        lines.append("    if emotion is None:")
+        for i, rule in enumerate(narrative):
+            lines.append("        {} ({}):".format("if" if i == 0 else "elif", conditions[i][0]))
+            lines.append("            _hits[{}] += 1".format(i))
+            lines.append("            emotion = {!r}".format(rule["emotion"]))
+        if narrative:
+            lines.append("        else:")
+            lines.append("            emotion = {!r}".format(default))
+        else:
+            lines.append("        emotion = {!r}".format(default))
+        # Virality: every matching rule adds its score
+        lines.append("    score = 0")
+        for j, rule in enumerate(virality):
+            i = len(narrative) + j
+            lines.append("    if {}:".format(conditions[i][0]))
+            lines.append("        _hits[{}] += 1".format(i))
+            lines.append("        score += {!r}".format(rule["score"]))
+        post = "emotion in post_emotions"
+        if min_score is not None:
+            post += " or score >= {!r}".format(min_score)
+        lines.append("    return emotion, score, {}".format(post))
+
+        namespace = {"hits": self.hits, "post_emotions": frozenset(post_emotions), "__builtins__": {"len": len},
+                     **_HELPERS}
+        exec(compile("\n".join(lines), "<rules:{}>".format(self.path), "exec"), namespace)
+        self.source = "\n".join(lines)
+        return namespace["evaluate"]
+
+    def _compile_hits(self, virality):
+        """virality_hits(features): which virality rules fire for a stored feature dict (for learning)."""
+        names = set(FEATURES) | {"emotion"}
+        conditions = [_parse_condition(r, names) for r in virality]
+        used = set().union(*(u for _, u in conditions)) if conditions else set()
+        lines = ["def virality_hits(f):"]
+        for name in sorted(used):
+            lines.append("    {} = f.get({!r}, {!r})".format(name, name, _FEATURE_DEFAULTS.get(name)))
+        lines.append("    return ({})".format("".join("bool({}), ".format(src) for src, _ in conditions)))
+        namespace = {"__builtins__": {"bool": bool}, **_HELPERS}
+        exec(compile("\n".join(lines), "<rules-hits:{}>".format(self.path), "exec"), namespace)
+        return namespace["virality_hits"]
+
+    def virality_hits(self, features):
+        """Tuple of booleans, one per virality rule (self.virality order)."""
+        return self._hits_fn(features)
+
+    def probe(self, pairs=()):
+        """
+        Evaluate every rule on default features and on sample (event, state) pairs;
+        raises RuleError if any fails. Hit counters are left at zero.
+        """
+        samples = [("", None, None), ("WICKET six last over", None, None), ("", None, "hype")]
+        samples += [(event, state, None) for event, state in pairs]
+        try:
+            for event, state, emotion in samples:
+                self._fn(event, state, emotion)
+            self._hits_fn(dict(_FEATURE_DEFAULTS))
+        except Exception as e:
+            raise RuleError("rules fail on a sample match: {}: {}".format(type(e).__name__, e)) from None
+        finally:
+            self.hits[:] = [0] * len(self.hits)
+
+    def evaluate(self, event, state=None, emotion=None):
+        """(emotion, virality_score, post) for one match event."""
+        self.evaluations += 1
+        return self._fn(event, state, emotion)
+
+    def evaluate_batch(self, pairs):
+        """evaluate() over [(event, state), ...] in one pass."""
+        fn = self._fn
+        self.evaluations += len(pairs)
+        return [fn(event, state) for event, state in pairs]
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def load_params(params_dir=PARAMS_DIR):
+    """Learned parameters named by PARAMS_DIR/current.json, or {} if none were trained yet."""
+    pointer = os.path.join(params_dir, "current.json")
+    if not os.path.exists(pointer):
+        return {}
+    with open(pointer, encoding="utf-8") as f:
+        name = json.load(f)["file"]
+    with open(os.path.join(params_dir, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_rules(path=RULES_PATH, params_dir=PARAMS_DIR):
+    signature = (_mtime(path), _mtime(os.path.join(params_dir, "current.json")))
+    with open(path, encoding="utf-8") as f:
+        spec = json.load(f)
+    return RuleSet(spec, path, signature, load_params(params_dir))
+
+
+_ruleset = None
+# Recently evaluated (event, state) pairs; a reloaded rule set is probed on them before it goes live
+_recent = collections.deque(maxlen=32)
+_carried = collections.Counter()  # hits of rule sets replaced by a reload
+_carried_evaluations = 0
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_rules():
+    """
+    Active rule set (with learned parameters applied); reloaded when the rules
+    file or the params pointer changes (checked every RULES_CHECK_SECONDS).
+    """
+    global _ruleset, _checked_at, _carried_evaluations
+    now = time.monotonic()
+    if _ruleset is not None and now - _checked_at < RULES_CHECK_SECONDS:
+        return _ruleset
+    with _lock:
+        if _ruleset is not None and now - _checked_at < RULES_CHECK_SECONDS:
+            return _ruleset
+        _checked_at = now
+        signature = (_mtime(RULES_PATH), _mtime(os.path.join(PARAMS_DIR, "current.json")))
+        if _ruleset is not None and signature == _ruleset.signature:
+            return _ruleset
+        try:
+            new = load_rules(RULES_PATH, PARAMS_DIR)
+            new.probe(list(_recent))
+        except (OSError, ValueError, KeyError) as e:
+            if _ruleset is None:
+                raise
+            logger.error("Invalid rules/params (%s), keeping current rules", e)
+            _ruleset.signature = signature  # don't retry until a file changes again
+            return _ruleset
+        if _ruleset is not None:
+            _carried.update(dict(zip(_ruleset.names, _ruleset.hits)))
+            _carried_evaluations += _ruleset.evaluations
+            logger.info("Reloaded %d rules from %s (params version %s)", len(new.rules), RULES_PATH,
+                        new.params.get("version"))
+        _ruleset = new
+        return _ruleset
+
+
+def current_params():
+    """Learned parameters in effect ({} before the first training run)."""
+    return get_rules().params
+
+
+def evaluate(event, state=None, emotion=None):
+    _recent.append((event, state))
+    return get_rules().evaluate(event, state, emotion)
+
+
+def evaluate_batch(pairs):
+    _recent.extend(pairs)
+    return get_rules().evaluate_batch(pairs)
+
+
+def rule_stats():
+    """{"evaluations": n, "hits": {rule name: hits}} since process start (across reloads)."""
+    rules = get_rules()
+    hits = collections.Counter(_carried)
+    hits.update(dict(zip(rules.names, rules.hits)))
+    return {"evaluations": _carried_evaluations + rules.evaluations,
+            "hits": {name: hits[name] for name in rules.names}}
+
+
+def log_rule_stats():
+    stats = rule_stats()
+    logger.info("rules evaluations=%d hits=%s", stats["evaluations"],
+                " ".join("{}={}".format(k, v) for k, v in stats["hits"].items()))
@@ -0,0 +1,148 @@
+"""
+Shared on-disk cache of the CricAPI currentMatches payload.
+
+Every process (main loop, scheduler.py, profile runs, ad-hoc tools, other
+containers on the same data/ volume) reads SNAPSHOT_CACHE_PATH. Only when it is
+older than SNAPSHOT_TTL_SECONDS does one process refresh it: the refresher holds
+an exclusive flock on a lock file next to the cache, re-checks it (another
+process may have just written it), calls the API and replaces the file
+atomically (temp file + fsync + os.replace), so readers never see a partial
+write. Processes that lose the race wait for that refresh and read its result.
+API usage is one call per TTL however many workers run.
+
+Cached matches keep the fetched_at/api_time of the original response, so the
+freshness checks downstream see the real age of the data.
+"""
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: no cross-process lock, each process refreshes on its own
+    fcntl = None
+
+from config import SNAPSHOT_CACHE_PATH, SNAPSHOT_TTL_SECONDS, SNAPSHOT_LOCK_WAIT_SECONDS, SNAPSHOT_MAX_STALE_SECONDS
+from fileio import write_json_atomic
+
+logger = logging.getLogger("main_logger.snapshot_cache")
+
+# (file signature, snapshot, stamped matches) last parsed by this process
+_loaded = None
+_loaded_lock = threading.Lock()
+
+
+def _signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _stamp(snapshot):
+    matches = snapshot.get("data") or []
+    for m in matches:
+        m["_fetched_at"] = snapshot.get("fetched_at")
+        m["_api_time"] = snapshot.get("api_time")
+    return matches
+
+
+def _remember(sig, snapshot):
+    global _loaded
+    with _loaded_lock:
+        _loaded = (sig, snapshot, _stamp(snapshot))
+    return _loaded
+
+
+def _read(path):
+    """(signature, snapshot, matches) for the cache file, parsed once per file version; None if absent."""
+    sig = _signature(path)
+    if sig is None:
+        return None
+    loaded = _loaded
+    if loaded is not None and loaded[0] == sig:
+        return loaded
+    try:
+        with open(path, encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning("Unreadable CricAPI snapshot cache %s: %s", path, e)
+        return None
+    return _remember(sig, snapshot)
+
+
+def read_snapshot(path=SNAPSHOT_CACHE_PATH):
+    """Cached payload {"fetched_at", "api_time", "data"} or None."""
+    loaded = _read(path)
+    return loaded[1] if loaded else None
+
+
+def write_snapshot(snapshot, path=SNAPSHOT_CACHE_PATH):
+    """Atomically replace the cache file: readers see the old or the new file, never a partial one."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    write_json_atomic(path, snapshot, ensure_ascii=False)
+    _remember(_signature(path), snapshot)
+
+
+def _age(loaded, now):
+    return now - (loaded[1].get("fetched_at") or 0) if loaded else None
+
+
+@contextlib.contextmanager
+def _refresh_lock(path, wait):
+    """Hold the single-fetcher lock; yields False if it could not be taken within `wait` seconds."""
+    if fcntl is None:
+        yield True
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".lock", "a") as lock:
+        deadline = time.monotonic() + wait
+        while True:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    yield False
+                    return
+                time.sleep(0.05)
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def get_matches(fetch, ttl=SNAPSHOT_TTL_SECONDS, path=SNAPSHOT_CACHE_PATH):
+    """
+    Current matches from the shared cache, refreshed through `fetch` when older
+    than `ttl`. `fetch()` returns (matches, fetched_at, api_time) and raises on
+    failure; then (or if the refresher takes too long) the cached snapshot is
+    served while it is younger than SNAPSHOT_MAX_STALE_SECONDS, else [].
+    The match dicts are shared within the process; treat them as read-only.
+    """
+    loaded = _read(path)
+    if loaded and _age(loaded, time.time()) < ttl:
+        return list(loaded[2])
+
+    with _refresh_lock(path, SNAPSHOT_LOCK_WAIT_SECONDS) as locked:
+        loaded = _read(path)  # another process may have refreshed while we waited
+        if locked and not (loaded and _age(loaded, time.time()) < ttl):
+            try:
+                matches, fetched_at, api_time = fetch()
+            except Exception as e:
+                logger.warning("CricAPI refresh failed (%s), serving cached snapshot", e)
+            else:
+                write_snapshot({"fetched_at": fetched_at, "api_time": api_time, "data": matches}, path)
+                logger.info("Refreshed CricAPI snapshot cache: %d matches", len(matches))
+                loaded = _loaded
+        elif not locked:
+            logger.warning("CricAPI snapshot refresh by another process is taking too long, serving cache")
+
+    age = _age(loaded, time.time())
+    if age is None or age > SNAPSHOT_MAX_STALE_SECONDS:
+        return []
+    return list(loaded[2])
@@ -0,0 +1,298 @@
+"""
+Resumable thread publishing job.
+
+Threads are persisted to SQLite (threads + thread_tweets) and published by a
+background worker under the shared X write limiter. Every posted tweet id is
+checkpointed immediately, so after a crash or 429 the job resumes by replying
+to the last successful tweet instead of starting over. Each tweet is marked in
+flight before it is sent: if the process died between post_tweet and the
+checkpoint, resume finds the tweet among our recent ones (X rejects a repost of
+the same text with a duplicate-content 403) instead of failing the thread.
+
+Several workers can share the DB (SHARDED_WORKERS): a thread is claimed with
+one conditional UPDATE (owner = WORKER_ID, next_attempt_at pushed LEASE_TTL_SECONDS
+ahead) before anything is posted, and only the worker whose UPDATE matched
+publishes it. The claim is renewed before every tweet and by renew_claims; a
+crashed worker's claim expires and another worker resumes the thread.
+"""
+import html
+import logging
+import threading
+import time
+from datetime import datetime
+
+from tweepy import Forbidden, TooManyRequests
+from config import THREAD_TWEET_DELAY, THREAD_MAX_ATTEMPTS, WORKER_ID, LEASE_TTL_SECONDS
+from database import conn
+from x_client import get_my_recent_tweets, post_tweet, rate_limit_reset
+
+logger = logging.getLogger("main_logger.threads")
+
+# Job states: pending → publishing → done; retry after 429/errors; failed after THREAD_MAX_ATTEMPTS
+PENDING, PUBLISHING, RETRY, DONE, FAILED = "pending", "publishing", "retry", "done", "failed"
+
+_wake = threading.Event()
+_stop = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _now():
+    return datetime.utcnow().isoformat()
+
+
+def enqueue_thread(texts, match_id=None):
+    """Persist a thread and hand it to the publisher. Returns the thread job id."""
+    texts = [t for t in texts or [] if t and t.strip()]
+    if not texts:
+        return None
+    c = conn.cursor()
+    c.execute(
+        "INSERT INTO threads (match_id, status, created_at, updated_at) VALUES (?, ?, ?, ?)",
+        (match_id, PENDING, _now(), _now()),
+    )
+    thread_id = c.lastrowid
+    c.executemany(
+        "INSERT INTO thread_tweets (thread_id, position, text) VALUES (?, ?, ?)",
+        [(thread_id, i, t) for i, t in enumerate(texts)],
+    )
+    conn.commit()
+    start_thread_publisher()
+    _wake.set()
+    return thread_id
+
+
+def get_thread_status(thread_id):
+    """
+    Progress of a thread job.
+
+    Returns:
+        Dict with id, status, posted, total, tweet_ids, attempts, last_error; or None.
+    """
+    c = conn.cursor()
+    c.execute("SELECT status, attempts, last_error, match_id FROM threads WHERE id = ?", (thread_id,))
+    row = c.fetchone()
+    if row is None:
+        return None
+    c.execute(
+        "SELECT tweet_id, posted_at FROM thread_tweets WHERE thread_id = ? ORDER BY position", (thread_id,)
+    )
+    rows = c.fetchall()
+    return {
+        "id": thread_id,
+        "status": row[0],
+        "attempts": row[1],
+        "last_error": row[2],
+        "match_id": row[3],
+        "posted": sum(1 for r in rows if r[1]),
+        "total": len(rows),
+        "tweet_ids": [r[0] for r in rows if r[0]],
+    }
+
+
+def _set_status(thread_id, status, error=None, next_attempt_at=None, attempt=False):
+    c = conn.cursor()
+    c.execute(
+        """
+        UPDATE threads
+        SET status = ?, last_error = COALESCE(?, last_error), updated_at = ?,
+            next_attempt_at = COALESCE(?, next_attempt_at), attempts = attempts + ?
+        WHERE id = ?
+        """,
+        (status, error, _now(), next_attempt_at, 1 if attempt else 0, thread_id),
+    )
+    conn.commit()
+
+
+def _claim_next_thread():
+    """Claim the next due thread for this worker; None if there is none (or others got them first)."""
+    now = time.time()
+    c = conn.cursor()
+    c.execute(
+        """
+        SELECT id FROM threads
+        WHERE status IN (?, ?, ?) AND next_attempt_at <= ?
+        ORDER BY next_attempt_at, id
+        LIMIT 10
+        """,
+        (PENDING, PUBLISHING, RETRY, now),
+    )
+    for (thread_id,) in c.fetchall():
+        # PUBLISHING rows are due only once their owner's claim has expired
+        claimed = conn.execute(
+            """
+            UPDATE threads SET status = ?, owner = ?, next_attempt_at = ?, updated_at = ?
+            WHERE id = ? AND status IN (?, ?, ?) AND next_attempt_at <= ?
+            """,
+            (PUBLISHING, WORKER_ID, now + LEASE_TTL_SECONDS, _now(), thread_id, PENDING, PUBLISHING, RETRY, now),
+        )
+        conn.commit()
+        if claimed.rowcount == 1:
+            return thread_id
+    return None
+
+
+def _renew_claim(thread_id):
+    """Extend our claim on a thread; False if another worker has taken it over."""
+    cur = conn.execute(
+        "UPDATE threads SET next_attempt_at = ? WHERE id = ? AND owner = ? AND status = ?",
+        (time.time() + LEASE_TTL_SECONDS, thread_id, WORKER_ID, PUBLISHING),
+    )
+    conn.commit()
+    return cur.rowcount == 1
+
+
+def renew_claims():
+    """Keep this worker's thread claims alive while the publisher waits on the X write limiter."""
+    cur = conn.execute(
+        "UPDATE threads SET next_attempt_at = ? WHERE owner = ? AND status = ?",
+        (time.time() + LEASE_TTL_SECONDS, WORKER_ID, PUBLISHING),
+    )
+    conn.commit()
+    return cur.rowcount
+
+
+def _checkpoint(thread_id, position, tweet_id):
+    c = conn.cursor()
+    c.execute(
+        "UPDATE thread_tweets SET tweet_id = ?, posted_at = ?, inflight_at = NULL WHERE thread_id = ? AND position = ?",
+        (tweet_id, _now(), thread_id, position),
+    )
+    conn.commit()
+
+
+def _set_inflight(thread_id, position, inflight):
+    c = conn.cursor()
+    c.execute(
+        "UPDATE thread_tweets SET inflight_at = ? WHERE thread_id = ? AND position = ?",
+        (_now() if inflight else None, thread_id, position),
+    )
+    conn.commit()
+
+
+def _find_posted(text, reply_to):
+    """Id of our recent tweet with this text (replying to reply_to), or None."""
+    try:
+        recent = get_my_recent_tweets()
+    except Exception as e:
+        logger.warning("Could not look up recent tweets: %s", e)
+        return None
+    for tweet in recent:
+        if html.unescape(tweet["text"]).strip() == text.strip() and tweet["replied_to"] == reply_to:
+            return tweet["id"]
+    return None
+
+
+def _is_duplicate(exc):
+    return isinstance(exc, Forbidden) and "duplicate" in str(exc).lower()
+
+
+def _publish(thread_id):
+    """Post the remaining tweets of one thread (claimed by this worker), checkpointing each id as it lands."""
+    c = conn.cursor()
+    c.execute(
+        "SELECT position, text, tweet_id, posted_at, inflight_at FROM thread_tweets WHERE thread_id = ? ORDER BY position",
+        (thread_id,),
+    )
+    rows = c.fetchall()
+    reply_to = None
+    for position, text, tweet_id, posted_at, inflight_at in rows:
+        if posted_at:
+            reply_to = tweet_id or reply_to  # already posted before a crash/429; resume after it
+            continue
+        if inflight_at:
+            # Crashed mid-post last time: the tweet may already be live
+            landed = _find_posted(text, reply_to)
+            if landed:
+                logger.info("Thread %s tweet %d was posted before a restart (%s)", thread_id, position, landed)
+                _checkpoint(thread_id, position, landed)
+                reply_to = landed
+                continue
+        if _stop.is_set():
+            _set_status(thread_id, RETRY, next_attempt_at=time.time())
+            return
+        if reply_to is not None:
+            time.sleep(THREAD_TWEET_DELAY)
+        if not _renew_claim(thread_id):
+            logger.warning("Thread %s was taken over by another worker at tweet %d", thread_id, position)
+            return
+        _set_inflight(thread_id, position, True)
+        try:
+            new_id = post_tweet(text, reply_to_id=reply_to)
+        except TooManyRequests as e:
+            _set_inflight(thread_id, position, False)
+            reset = rate_limit_reset(e)
+            logger.warning("Thread %s hit 429 at tweet %d, resuming after %s", thread_id, position, reset)
+            _set_status(thread_id, RETRY, error="429 Too Many Requests", next_attempt_at=reset)
+            return
+        except Exception as e:
+            if not _is_duplicate(e):
+                _fail_attempt(thread_id, position, e)
+                return
+            # X already has this text from us: it is posted, we just lost the id
+            new_id = _find_posted(text, reply_to)
+            logger.warning("Thread %s tweet %d already posted (duplicate content), id %s",
+                           thread_id, position, new_id or "not found; next tweet replies to the previous one")
+        else:
+            if not new_id:
+                _fail_attempt(thread_id, position, "create_tweet returned no id")
+                return
+        new_id = str(new_id) if new_id else None
+        _checkpoint(thread_id, position, new_id)
+        reply_to = new_id or reply_to
+    _set_status(thread_id, DONE)
+    logger.info("Thread %s published (%d tweets)", thread_id, len(rows))
+
+
+def _fail_attempt(thread_id, position, error):
+    c = conn.cursor()
+    c.execute("SELECT attempts FROM threads WHERE id = ?", (thread_id,))
+    attempts = c.fetchone()[0] + 1
+    if attempts >= THREAD_MAX_ATTEMPTS:
+        logger.error("Thread %s failed at tweet %d after %d attempts: %s", thread_id, position, attempts, error)
+        _set_status(thread_id, FAILED, error=str(error), attempt=True)
+        return
+    backoff = min(900, 30 * 2 ** (attempts - 1))
+    logger.warning("Thread %s failed at tweet %d (%s), retrying in %ds", thread_id, position, error, backoff)
+    _set_status(thread_id, RETRY, error=str(error), next_attempt_at=time.time() + backoff, attempt=True)
+
+
+def run_pending_threads():
+    """Publish every thread that is due now. Returns how many were worked on."""
+    worked = 0
+    while not _stop.is_set():
+        thread_id = _claim_next_thread()
+        if thread_id is None:
+            break
+        _publish(thread_id)
+        worked += 1
+    return worked
+
+
+def _loop(poll_seconds):
+    while not _stop.is_set():
+        try:
+            run_pending_threads()
+        except Exception as e:
+            logger.exception("Thread publisher error: %s", e)
+        _wake.wait(poll_seconds)
+        _wake.clear()
+
+
+def start_thread_publisher(poll_seconds=15):
+    """Start the background publisher (idempotent). Picks up unfinished threads from the DB."""
+    global _worker
+    with _worker_lock:
+        if _worker is not None and _worker.is_alive():
+            return
+        _stop.clear()
+        _worker = threading.Thread(target=_loop, args=(poll_seconds,), name="thread-publisher", daemon=True)
+        _worker.start()
+
+
+def stop_thread_publisher(timeout=None):
+    """Stop after the tweet in flight; unfinished threads stay queued for the next start."""
+    _stop.set()
+    _wake.set()
+    if _worker is not None:
+        _worker.join(timeout)
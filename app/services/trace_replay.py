@@ -0,0 +1,65 @@
+"""
+Rebuild the decision path of a posted tweet from the structured event log.
+
+posts.trace_id links a post to its records in logs/events.jsonl (and rotated
+files events.jsonl.1, .2, ...): the ingested snapshot, narrative, candidates,
+fallbacks, freshness checks, publish and persist events, in order.
+"""
+import glob
+import json
+import os
+
+from config import LOG_DIR
+from database import conn
+from event_log import EVENT_LOG_NAME
+
+
+def _log_files():
+    pattern = os.path.join(LOG_DIR, EVENT_LOG_NAME + "*")
+    # Oldest rotated file first (highest suffix), current file last
+    def age(path):
+        suffix = path.rsplit(".", 1)[-1]
+        return -int(suffix) if suffix.isdigit() else 0
+    return sorted(glob.glob(pattern), key=age)
+
+
+def trace_records(trace_id):
+    """All event-log records for one trace id, in time order."""
+    records = []
+    needle = '"trace_id": "{}"'.format(trace_id)
+    for path in _log_files():
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if needle not in line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    records.sort(key=lambda r: r.get("ts") or 0)
+    return records
+
+
+def replay_post(post_id):
+    """
+    Decision path for a posted tweet.
+
+    Returns:
+        Dict with post_id, trace_id and `steps` (event-log records), or None if
+        the post is unknown or was saved without a trace id.
+    """
+    c = conn.cursor()
+    c.execute("SELECT trace_id FROM posts WHERE id = ?", (str(post_id),))
+    row = c.fetchone()
+    if row is None or not row[0]:
+        return None
+    return {"post_id": str(post_id), "trace_id": row[0], "steps": trace_records(row[0])}
+
+
+def format_replay(replay):
+    lines = ["Post {} (trace {})".format(replay["post_id"], replay["trace_id"])]
+    for r in replay["steps"]:
+        lines.append("  {:.3f} {:<22} {}".format(r.get("ts") or 0, r.get("event") or "-", r.get("msg")))
+        if r.get("data"):
+            lines.append("      " + json.dumps(r["data"], ensure_ascii=False))
+    return "\n".join(lines)
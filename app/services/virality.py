@@ -1,13 +1,7 @@
-def score_event(event, emotion):
-    score = 0
+from services.rules import evaluate
 
-    if "WICKET" in event:
-        score += 30
-
-    if emotion in ["panic", "hype", "tension"]:
-        score += 30
-
-    if "last over" in event.lower():
-        score += 40
 
+def score_event(event, emotion, state=None):
+    """Sum of the `virality` rule scores in rules.json (or learned weights) that match this event."""
+    _, score, _ = evaluate(event, state, emotion)
     return score
@@ -0,0 +1,262 @@
+"""
+Deterministic match simulator for load tests.
+
+Produces CricAPI currentMatches payloads for N concurrent fixtures across
+formats (t20 / odi / test, see OVERS_PER_FORMAT) that evolve ball by ball on a
+simulated clock: runs, wickets, overs, innings breaks, chases and results, with
+the status strings and inning labels CricAPI uses. Qualifying fixtures (ICC
+events, bilateral tours, India A tours) can be mixed with ones watch_match
+filters out (other teams, women's matches), as in the real feed. A finished
+match stays in the feed for a while, then a new fixture takes its slot, so
+N matches stay live for the whole simulated day.
+
+The same seed always gives the same payloads. Plug it into get_match_event with
+
+    sim = MatchSimulator(num_matches=20, seed=1)
+    cricket_events.set_match_source(sim.source)   # one MATCH_LOOP_SECONDS tick per poll
+"""
+import random
+from datetime import datetime, timedelta
+
+from config import MATCH_LOOP_SECONDS
+from match_types import OVERS_PER_FORMAT
+
+# Ball outcome weights: runs 0, 1, 2, 3, 4, 6 and wicket ("W")
+OUTCOMES = (0, 1, 2, 3, 4, 6, "W")
+OUTCOME_WEIGHTS = {
+    "t20": (35, 35, 8, 1, 12, 5, 4),
+    "odi": (45, 32, 8, 1, 9, 2, 3),
+    "test": (60, 22, 6, 1, 8, 1, 2),
+}
+# Simulated seconds per ball (over rate incl. stoppages) and per innings break
+BALL_SECONDS = {"t20": 40, "odi": 42, "test": 45}
+BREAK_SECONDS = {"t20": 20 * 60, "odi": 30 * 60, "test": 10 * 60}
+INNINGS_PER_FORMAT = {"t20": 2, "odi": 2, "test": 4}
+# Test innings (other than the chase) are declared after this many overs
+TEST_DECLARE_OVERS = 120
+
+OPPONENTS = ("Australia", "England", "Pakistan", "South Africa", "New Zealand", "Sri Lanka",
+             "Bangladesh", "Afghanistan", "West Indies", "Ireland", "Netherlands", "Zimbabwe")
+VENUES = ("Wankhede Stadium, Mumbai", "Eden Gardens, Kolkata", "MCG, Melbourne", "Lord's, London",
+          "Dubai International Cricket Stadium, Dubai", "Kensington Oval, Bridgetown")
+DAY_START = datetime(2026, 3, 1, 4, 0)
+
+
+def ordinal(n):
+    """1 → "1st", 2 → "2nd", 11 → "11th", 23 → "23rd"."""
+    suffix = "th" if 10 <= n % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+    return "{}{}".format(n, suffix)
+
+
+def _overs(balls):
+    """CricAPI overs notation: 86 balls → 14.2."""
+    return balls // 6 + (balls % 6) / 10 if balls % 6 else balls // 6
+
+
+class Innings:
+    __slots__ = ("team", "number", "runs", "wickets", "balls")
+
+    def __init__(self, team, number):
+        self.team = team
+        self.number = number
+        self.runs = 0
+        self.wickets = 0
+        self.balls = 0
+
+    def to_api(self):
+        return {"r": self.runs, "w": self.wickets, "o": _overs(self.balls),
+                "inning": "{} Inning {}".format(self.team, self.number)}
+
+
+class Fixture:
+    """One simulated match, advanced ball by ball up to the simulator clock."""
+
+    def __init__(self, number, seed, match_type, name, teams, start_at):
+        self.id = "sim-{}-{:05d}".format(seed, number)
+        self.rng = random.Random("{}:{}".format(seed, number))
+        self.match_type = match_type
+        self.name = name
+        self.teams = teams
+        self.venue = VENUES[number % len(VENUES)]
+        self.start_at = start_at
+        self.next_ball_at = start_at
+        self.innings = []
+        self.ended_at = None
+        self.result = None
+        self.max_balls = (OVERS_PER_FORMAT.get(match_type) or 0) * 6 or None
+        batting_first = self.rng.randrange(2)
+        self.order = (teams[batting_first], teams[1 - batting_first])
+
+    @property
+    def started(self):
+        return bool(self.innings)
+
+    def advance_to(self, clock):
+        while self.ended_at is None and self.next_ball_at <= clock:
+            self._ball()
+
+    def _batting(self):
+        # Tests: innings alternate (no follow-on); limited overs: two innings
+        return self.order[len(self.innings) % 2]
+
+    def _ball(self):
+        if not self.innings:
+            self.innings.append(Innings(self._batting(), 1))
+        inn = self.innings[-1]
+        outcome = self.rng.choices(OUTCOMES, OUTCOME_WEIGHTS[self.match_type])[0]
+        inn.balls += 1
+        if outcome == "W":
+            inn.wickets += 1
+        else:
+            inn.runs += outcome
+        self.next_ball_at += BALL_SECONDS[self.match_type]
+
+        target = self._target()
+        chased = target is not None and inn.runs >= target
+        all_out = inn.wickets >= 10
+        overs_done = self.max_balls is not None and inn.balls >= self.max_balls
+        declared = self.match_type == "test" and target is None and inn.balls >= TEST_DECLARE_OVERS * 6
+        if chased or all_out or overs_done or declared:
+            self._end_innings()
+
+    def _target(self):
+        """Runs the side batting last needs to win (None before the final innings)."""
+        total = INNINGS_PER_FORMAT[self.match_type]
+        if len(self.innings) != total:
+            return None
+        batting = self.innings[-1].team
+        ours = sum(i.runs for i in self.innings[:-1] if i.team == batting)
+        theirs = sum(i.runs for i in self.innings if i.team != batting)
+        return theirs - ours + 1
+
+    def _end_innings(self):
+        inn = self.innings[-1]
+        if len(self.innings) < INNINGS_PER_FORMAT[self.match_type]:
+            self.next_ball_at += BREAK_SECONDS[self.match_type]
+            team = self._batting()
+            self.innings.append(Innings(team, sum(1 for i in self.innings if i.team == team) + 1))
+            return
+        target = self._target()
+        if inn.runs >= target:
+            self.result = "{} won by {} wickets".format(inn.team, 10 - inn.wickets)
+        elif inn.runs == target - 1:
+            self.result = "Match tied"
+        else:
+            winner = self.order[0] if inn.team == self.order[1] else self.order[1]
+            self.result = "{} won by {} runs".format(winner, target - 1 - inn.runs)
+        self.ended_at = self.next_ball_at
+
+    def status(self, clock):
+        if self.result:
+            return self.result
+        if not self.innings:
+            start = DAY_START + timedelta(seconds=self.start_at)
+            return "Match starts at {} GMT".format(start.strftime("%b %d, %H:%M"))
+        inn = self.innings[-1]
+        if inn.balls == 0 and len(self.innings) > 1 and self.next_ball_at > clock:
+            return "Innings Break"
+        target = self._target()
+        if target is not None and self.max_balls is not None:
+            return "{} need {} runs in {} balls".format(inn.team, target - inn.runs, self.max_balls - inn.balls)
+        if target is not None:
+            return "{} need {} runs to win".format(inn.team, target - inn.runs)
+        if self.match_type == "test" and len(self.innings) > 1:
+            batting = sum(i.runs for i in self.innings if i.team == inn.team)
+            fielding = sum(i.runs for i in self.innings if i.team != inn.team)
+            lead = batting - fielding
+            return "{} {} by {} runs".format(inn.team, "lead" if lead >= 0 else "trail", abs(lead))
+        return "{} opt to bat".format(self.order[0])
+
+    def to_api(self, clock):
+        start = DAY_START + timedelta(seconds=self.start_at)
+        return {
+            "id": self.id,
+            "name": self.name,
+            "matchType": self.match_type,
+            "status": self.status(clock),
+            "venue": self.venue,
+            "date": start.strftime("%Y-%m-%d"),
+            "dateTimeGMT": start.strftime("%Y-%m-%dT%H:%M:%S"),
+            "teams": list(self.teams),
+            "teamInfo": [{"name": t, "shortname": t[:3].upper(), "img": "https://h.cricapi.com/img/icon512.png"}
+                         for t in self.teams],
+            "score": [inn.to_api() for inn in self.innings],
+            "series_id": "sim-series-{}".format(self.match_type),
+            "fantasyEnabled": True,
+            "bbbEnabled": False,
+            "hasSquad": True,
+            "matchStarted": self.started,
+            "matchEnded": self.result is not None,
+        }
+
+
+class MatchSimulator:
+    """
+    `num_matches` qualifying fixtures (plus `others` that watch_match filters out)
+    on a simulated clock starting at 0. Fixtures start `stagger_seconds` apart
+    in round-robin over `formats`; a finished fixture stays in the feed for
+    `linger_seconds`, then a new one takes its slot.
+    """
+
+    def __init__(self, num_matches=10, seed=0, formats=("t20", "odi", "test"), others=0,
+                 tick_seconds=MATCH_LOOP_SECONDS, stagger_seconds=120, linger_seconds=600):
+        self.seed = seed
+        self.formats = tuple(formats)
+        self.tick_seconds = tick_seconds
+        self.linger_seconds = linger_seconds
+        self.clock = 0.0
+        self.created = 0
+        self.finished = 0
+        self.qualifying = [self._new_fixture(i * stagger_seconds, True) for i in range(num_matches)]
+        self.others = [self._new_fixture(i * stagger_seconds, False) for i in range(others)]
+
+    def _new_fixture(self, start_at, qualifying):
+        n = self.created
+        self.created += 1
+        match_type = self.formats[n % len(self.formats)]
+        opponent = OPPONENTS[n % len(OPPONENTS)]
+        other = OPPONENTS[(n + 5) % len(OPPONENTS)]
+        kind = {"t20": "T20I", "odi": "ODI", "test": "Test"}[match_type]
+        number = ordinal(n % 5 + 1)
+        if not qualifying:
+            if n % 2:
+                name = "{} vs {}, {} Match, ICC Men's T20 World Cup".format(opponent, other, number)
+                teams = (opponent, other)
+            else:
+                name = "India Women vs {} Women, {} {}, {} Women tour of India".format(opponent, number, kind,
+                                                                                       opponent)
+                teams = ("India Women", "{} Women".format(opponent))
+        elif n % 4 == 3:
+            unofficial = "unofficial {}".format(kind) if match_type != "t20" else "unofficial T20I"
+            name = "India A vs {} A, {} {}, India A tour of {}".format(opponent, number, unofficial, opponent)
+            teams = ("India A", "{} A".format(opponent))
+        elif match_type == "t20":
+            name = "India vs {}, {} Match, Super 8, ICC Men's T20 World Cup".format(opponent, number)
+            teams = ("India", opponent)
+        else:
+            name = "India vs {}, {} {}, {} tour of India".format(opponent, number, kind, opponent)
+            teams = ("India", opponent)
+        return Fixture(n, self.seed, match_type, name, teams, start_at)
+
+    def advance(self, seconds):
+        """Move the clock and every fixture forward; replace fixtures that finished long enough ago."""
+        self.clock += seconds
+        for group, qualifying in ((self.qualifying, True), (self.others, False)):
+            for i, fixture in enumerate(group):
+                fixture.advance_to(self.clock)
+                if fixture.ended_at is not None and self.clock - fixture.ended_at >= self.linger_seconds:
+                    self.finished += 1
+                    group[i] = self._new_fixture(self.clock, qualifying)
+                    group[i].advance_to(self.clock)
+
+    def payload(self):
+        """currentMatches `data` list at the current clock (fresh dicts on every call)."""
+        return [f.to_api(self.clock) for f in self.qualifying + self.others]
+
+    def live_count(self):
+        return sum(1 for f in self.qualifying if f.started and f.result is None)
+
+    def source(self):
+        """Match source for cricket_events.set_match_source: one tick per poll."""
+        self.advance(self.tick_seconds)
+        return self.payload()
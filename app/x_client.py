@@ -4,14 +4,22 @@ X (Twitter) API client — Viral-level v3.
 Supports: single posts, threads, replies (banter), quote tweets,
 tweet context for reply generation, and engagement metrics for learning.
 """
+import threading
 import time
+from collections import OrderedDict, deque
+
 import tweepy
-from tweepy import Unauthorized
+from tweepy import Unauthorized, TooManyRequests
 from config import (
     X_API_KEY,
     X_API_SECRET,
     X_ACCESS_TOKEN,
     X_ACCESS_SECRET,
+    X_POSTS_PER_WINDOW,
+    X_POST_WINDOW_SECONDS,
+    X_TWEET_CACHE_SIZE,
+    X_USER_CACHE_SIZE,
+    X_USER_CACHE_TTL,
 )
 
 
@@ -67,6 +75,55 @@ def _raise_401_help(original=None):
     raise RuntimeError(msg)
 
 
+class RateLimiter:
+    """Sliding-window limiter: at most `limit` calls per `window` seconds across threads."""
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self._calls = deque()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _wait_time(self, now):
+        while self._calls and now - self._calls[0] >= self.window:
+            self._calls.popleft()
+        wait = self._blocked_until - now
+        if len(self._calls) >= self.limit:
+            wait = max(wait, self._calls[0] + self.window - now)
+        return max(0.0, wait)
+
+    def acquire(self):
+        """Block until a call is allowed, then record it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._wait_time(now)
+                if wait <= 0:
+                    self._calls.append(now)
+                    return
+            time.sleep(min(wait, 5))
+
+    def block_until(self, epoch_seconds):
+        """Pause all callers until the given wall-clock time (X 429 reset)."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + max(0, epoch_seconds - time.time()))
+
+
+# Shared by post_tweet and the thread publishing job
+write_limiter = RateLimiter(X_POSTS_PER_WINDOW, X_POST_WINDOW_SECONDS)
+
+
+def rate_limit_reset(exc, default_wait=60):
+    """Epoch seconds when a 429 window resets (x-rate-limit-reset header), else now + default_wait."""
+    response = getattr(exc, "response", None)
+    reset = response.headers.get("x-rate-limit-reset") if response is not None else None
+    try:
+        return float(reset)
+    except (TypeError, ValueError):
+        return time.time() + default_wait
+
+
 def _tweet_id_from_response(r):
     """Extract tweet id from create_tweet response (handles tweepy Response object)."""
     if not r or not r.data:
@@ -91,7 +148,9 @@ def post_tweet(text, reply_to_id=None, quote_tweet_id=None):
 
     Returns:
         Tweet id (str) of the new tweet, or None on failure.
+        Raises TooManyRequests on 429 (the shared limiter is paused until the reset).
     """
+    write_limiter.acquire()
     try:
         kwargs = {"text": text}
         if reply_to_id:
@@ -102,6 +161,9 @@ def post_tweet(text, reply_to_id=None, quote_tweet_id=None):
         return _tweet_id_from_response(r)
     except Unauthorized as e:
         _raise_401_help(e)
+    except TooManyRequests as e:
+        write_limiter.block_until(rate_limit_reset(e))
+        raise
 
 
 # -----------------------------------------------------------------------------
@@ -109,40 +171,22 @@ def post_tweet(text, reply_to_id=None, quote_tweet_id=None):
 # -----------------------------------------------------------------------------
 
 
-def post_thread(texts, delay_between_sec=1.5):
+def post_thread(texts, match_id=None):
     """
-    Post a thread: first tweet, then each subsequent tweet as a reply to the previous.
+    Queue a thread for asynchronous publishing: first tweet, then each subsequent
+    tweet as a reply to the previous. Progress is checkpointed in SQLite, so a
+    thread interrupted by a crash or 429 resumes from the last posted reply.
 
     Args:
         texts: List of tweet texts (each max 280 chars). Order is preserved.
-        delay_between_sec: Seconds to wait between posts (human-like, avoid rate limits).
+        match_id: Optional CricAPI match id the thread is about.
 
     Returns:
-        List of tweet ids [root_id, second_id, ...], or empty list if any step failed.
+        Thread job id (int); see services.thread_publisher.get_thread_status,
+        or None if texts is empty.
     """
-    if not texts:
-        return []
-    ids = []
-    try:
-        r = client.create_tweet(text=texts[0])
-        first_id = _tweet_id_from_response(r)
-        if not first_id:
-            return []
-        ids.append(first_id)
-        reply_to = first_id
-        for t in texts[1:]:
-            time.sleep(max(0, delay_between_sec))
-            r = client.create_tweet(text=t, in_reply_to_tweet_id=str(reply_to))
-            next_id = _tweet_id_from_response(r)
-            if not next_id:
-                return ids  # return what we have
-            ids.append(next_id)
-            reply_to = next_id
-        return ids
-    except Unauthorized as e:
-        _raise_401_help(e)
-    except Exception:
-        return ids
+    from services.thread_publisher import enqueue_thread
+    return enqueue_thread(texts, match_id=match_id)
 
 
 # -----------------------------------------------------------------------------
@@ -161,41 +205,210 @@ def post_quote(text, quote_tweet_id):
 
 
 # -----------------------------------------------------------------------------
-# Tweet context (for reply/banter generation — fetch tweet + author)
+# Tweet / user lookups (bulk, through LRU caches) and mention ingestion
 # -----------------------------------------------------------------------------
 
+TWEET_FIELDS = ["author_id", "conversation_id", "created_at", "public_metrics", "referenced_tweets"]
+USER_FIELDS = ["username", "public_metrics", "verified"]
+
+
+class LRUCache:
+    """Thread-safe LRU map; entries older than `ttl` seconds (if set) count as misses."""
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (self.ttl and time.monotonic() - entry[0] > self.ttl):
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def stats(self):
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+# Tweet text never changes (metrics are as of the lookup); user profiles are refreshed hourly
+tweet_cache = LRUCache(X_TWEET_CACHE_SIZE)
+user_cache = LRUCache(X_USER_CACHE_SIZE, ttl=X_USER_CACHE_TTL)
+
+
+def _field(obj, name, default=None):
+    value = obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+    return default if value is None else value
+
+
+def _tweet_dict(t):
+    refs = {str(_field(r, "type")): str(_field(r, "id")) for r in _field(t, "referenced_tweets", [])}
+    m = _field(t, "public_metrics", {})
+    created = _field(t, "created_at")
+    return {
+        "id": str(_field(t, "id")),
+        "text": _field(t, "text", ""),
+        "author_id": str(_field(t, "author_id", "")) or None,
+        "conversation_id": str(_field(t, "conversation_id", "")) or None,
+        "created_at": created.isoformat() if hasattr(created, "isoformat") else created,
+        "replied_to": refs.get("replied_to"),
+        "quoted": refs.get("quoted"),
+        "likes": _metric(m, "like_count"),
+        "retweets": _metric(m, "retweet_count"),
+        "replies": _metric(m, "reply_count"),
+    }
+
+
+def _user_dict(u):
+    m = _field(u, "public_metrics", {})
+    return {
+        "id": str(_field(u, "id")),
+        "username": _field(u, "username", ""),
+        "followers": _metric(m, "followers_count"),
+        "verified": bool(_field(u, "verified", False)),
+    }
+
+
+def _cache_response(r):
+    """Put a response's tweets, included tweets and included users in the caches; returns its tweets."""
+    includes = getattr(r, "includes", None) or {}
+    for u in includes.get("users", []):
+        user = _user_dict(u)
+        user_cache.put(user["id"], user)
+    for t in includes.get("tweets", []):
+        tweet = _tweet_dict(t)
+        tweet_cache.put(tweet["id"], tweet)
+    tweets = [_tweet_dict(t) for t in getattr(r, "data", None) or []]
+    for tweet in tweets:
+        tweet_cache.put(tweet["id"], tweet)
+    return tweets
+
+
+def lookup_tweets(tweet_ids):
+    """
+    Tweets by id (dicts with text, author_id, conversation_id, replied_to, metrics),
+    from the cache or in bulk lookups of up to 100 ids. Authors land in the user cache.
+    Missing (deleted/protected) ids are absent from the result.
+    """
+    ids = list(dict.fromkeys(str(t) for t in tweet_ids if t))
+    out = {}
+    for tid in ids:
+        tweet = tweet_cache.get(tid)
+        if tweet is not None:
+            out[tid] = tweet
+    missing = [tid for tid in ids if tid not in out]
+    for i in range(0, len(missing), 100):
+        r = client.get_tweets(missing[i:i + 100], tweet_fields=TWEET_FIELDS, expansions=["author_id"],
+                              user_fields=USER_FIELDS, user_auth=True)
+        for tweet in _cache_response(r):
+            out[tweet["id"]] = tweet
+    return out
+
+
+def lookup_users(user_ids):
+    """Users by id ({id, username, followers, verified}) from the cache or bulk lookups of up to 100."""
+    ids = list(dict.fromkeys(str(u) for u in user_ids if u))
+    out = {}
+    for uid in ids:
+        user = user_cache.get(uid)
+        if user is not None:
+            out[uid] = user
+    missing = [uid for uid in ids if uid not in out]
+    for i in range(0, len(missing), 100):
+        r = client.get_users(ids=missing[i:i + 100], user_fields=USER_FIELDS, user_auth=True)
+        for u in r.data or []:
+            user = _user_dict(u)
+            user_cache.put(user["id"], user)
+            out[user["id"]] = user
+    return out
+
 
 def get_tweet_context(tweet_id):
     """
-    Fetch tweet text and author info for reply/banter generation.
+    Fetch tweet text and author info for reply/banter generation (cached).
 
     Returns:
         Dict with id, text, author_username, author_id; or None if unavailable.
     """
     try:
-        r = client.get_tweet(
-            tweet_id,
-            tweet_fields=["text"],
-            user_fields=["username"],
-            expansions=["author_id"],
-        )
-        if not r.data:
+        tweet = lookup_tweets([tweet_id]).get(str(tweet_id))
+        if tweet is None:
             return None
-        t = r.data
-        tid = getattr(t, "id", None) or (t.get("id") if isinstance(t, dict) else None)
-        text = getattr(t, "text", None) or (t.get("text", "") if isinstance(t, dict) else "")
-        author_id = getattr(t, "author_id", None) or (t.get("author_id") if isinstance(t, dict) else None)
-        username = None
-        if r.includes and "users" in r.includes:
-            for u in r.includes["users"]:
-                if getattr(u, "id", None) == author_id or (u.get("id") if isinstance(u, dict) else None) == author_id:
-                    username = getattr(u, "username", None) or (u.get("username") if isinstance(u, dict) else None)
-                    break
-        return {"id": str(tid), "text": text or "", "author_id": author_id, "author_username": username or ""}
+        author = lookup_users([tweet["author_id"]]).get(tweet["author_id"]) if tweet["author_id"] else None
+        return {"id": tweet["id"], "text": tweet["text"], "author_id": tweet["author_id"],
+                "author_username": author["username"] if author else ""}
     except Exception:
         return None
 
 
+_me = None
+
+
+def get_my_user_id():
+    """Id of the authenticated account (looked up once)."""
+    global _me
+    if _me is None:
+        r = client.get_me(user_auth=True)
+        _me = str(_field(r.data, "id"))
+    return _me
+
+
+def _paginate(call, since_id, max_pages, **kwargs):
+    """Run a since_id-bounded timeline/search call page by page; returns tweets newest first."""
+    tweets, token = [], None
+    for _ in range(max_pages):
+        r = call(since_id=since_id, pagination_token=token, max_results=100, tweet_fields=TWEET_FIELDS,
+                 expansions=["author_id", "referenced_tweets.id"], user_fields=USER_FIELDS,
+                 user_auth=True, **kwargs)
+        tweets.extend(_cache_response(r))
+        token = (getattr(r, "meta", None) or {}).get("next_token")
+        if not token:
+            break
+    return tweets
+
+
+def get_mentions(since_id=None, max_pages=5):
+    """Mentions of our account newer than since_id (100 per request); authors and parents are cached."""
+    return _paginate(client.get_users_mentions, since_id, max_pages, id=get_my_user_id())
+
+
+def search_replies(conversation_ids, since_id=None, max_pages=5):
+    """
+    Replies from others in the given conversations (our posts), newer than since_id.
+    Conversation ids are OR-ed into as few recent-search queries as the 512-char limit allows.
+    """
+    me = get_my_user_id()
+    suffix = " is:reply -from:{}".format(me)
+    tweets, clause = [], []
+    ids = [str(c) for c in conversation_ids]
+    for i, cid in enumerate(ids):
+        clause.append("conversation_id:{}".format(cid))
+        query = "({}){}".format(" OR ".join(clause), suffix)
+        full = i + 1 == len(ids) or len(query) + len(" OR conversation_id:") + len(ids[i + 1]) > 512
+        if full:
+            tweets.extend(_paginate(client.search_recent_tweets, since_id, max_pages, query=query))
+            clause = []
+    return tweets
+
+
+def get_my_recent_tweets(max_pages=1):
+    """Our own latest tweets (100 per page), newest first."""
+    return _paginate(client.get_users_tweets, None, max_pages, id=get_my_user_id())
+
+
 # -----------------------------------------------------------------------------
 # Engagement (V6 learning from misses)
 # -----------------------------------------------------------------------------
@@ -219,3 +432,44 @@ def get_tweet_engagement(tweet_id):
     except Exception:
         pass
     return None, None
+
+
+def _metric(m, name):
+    return int((getattr(m, name, None) if not isinstance(m, dict) else m.get(name)) or 0)
+
+
+# v2 problem types meaning a tweet is gone for us (deleted, or protected/suspended)
+_GONE_PROBLEMS = ("resource-not-found", "not-authorized-for-resource")
+
+
+def get_tweets_engagement(tweet_ids):
+    """
+    Bulk engagement lookup: one request for up to 100 tweet ids.
+
+    Returns:
+        (metrics, gone): dict tweet_id -> {"likes", "retweets", "replies", "quotes"}
+        for tweets returned, and the set of ids X reported as not found or not
+        authorized (errors[].resource_id). An id in neither was just not answered
+        this time. Raises TooManyRequests on 429.
+    """
+    ids = [str(t) for t in tweet_ids][:100]
+    if not ids:
+        return {}, set()
+    r = client.get_tweets(ids, tweet_fields=["public_metrics"], user_auth=True)
+    out = {}
+    for t in r.data or []:
+        m = getattr(t, "public_metrics", None) or (t.get("public_metrics") if isinstance(t, dict) else None)
+        tid = getattr(t, "id", None) or (t.get("id") if isinstance(t, dict) else None)
+        if m is None or tid is None:
+            continue
+        out[str(tid)] = {
+            "likes": _metric(m, "like_count"),
+            "retweets": _metric(m, "retweet_count"),
+            "replies": _metric(m, "reply_count"),
+            "quotes": _metric(m, "quote_count"),
+        }
+    gone = {
+        str(e.get("resource_id")) for e in getattr(r, "errors", None) or []
+        if isinstance(e, dict) and e.get("resource_id") and str(e.get("type", "")).endswith(_GONE_PROBLEMS)
+    }
+    return out, gone - set(out)
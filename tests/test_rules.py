@@ -0,0 +1,119 @@
+"""
+services/rules.py: the shipped rules.json must decide exactly like the
+hand-written narrative / virality / strategist functions it replaced, and a
+broken rule file must never reach evaluate_batch.
+
+Run from project root:
+  python -m pytest tests
+"""
+import json
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+from config import RULES_PATH  # noqa: E402
+from match_types import MatchSnapshot  # noqa: E402
+from services import rules  # noqa: E402
+
+
+# The pre-rules.json implementation (agents/narrative_agent.py, services/virality.py,
+# agents/strategist_agent.py)
+def legacy_detect_narrative(event, state):
+    if "WICKET" in event and state["required_rr"] > 10:
+        return "panic"
+    if "six" in event.lower():
+        return "hype"
+    if state["overs_left"] < 3:
+        return "tension"
+    return "neutral"
+
+
+def legacy_score_event(event, emotion):
+    score = 0
+    if "WICKET" in event:
+        score += 30
+    if emotion in ["panic", "hype", "tension"]:
+        score += 30
+    if "last over" in event.lower():
+        score += 40
+    return score
+
+
+def legacy_should_post(event, emotion):
+    return emotion in ["panic", "hype", "tension"] or legacy_score_event(event, emotion) >= 50
+
+
+def _random_match(rng, i):
+    match_type = rng.choice(["t20", "odi", "test", ""])
+    max_overs = {"t20": 20, "odi": 50}.get(match_type, 90)
+    first = {"r": rng.randint(80, 380), "w": rng.randint(0, 10), "o": rng.randint(1, max_overs),
+             "inning": "India Inning 1"}
+    score = [first]
+    if rng.random() < 0.7:
+        score.append({"r": rng.randint(0, 400), "w": rng.randint(0, 10),
+                      "o": rng.randint(0, max_overs) + rng.randint(0, 5) / 10, "inning": "Australia Inning 1"})
+    status = rng.choice(["Australia need 12 runs", "WICKET! Smith c Kohli b Bumrah", "SIX over long-on",
+                         "Last over to go", "Innings Break", "India opt to bat", "big Six, last Over",
+                         "WICKET in the last over"])
+    return {
+        "id": "m{}".format(i), "name": "India vs Australia, {} Match".format(i), "matchType": match_type,
+        "status": status, "teams": ["India", "Australia"], "score": score,
+        "matchStarted": True, "matchEnded": rng.random() < 0.1,
+    }
+
+
+@pytest.fixture
+def shipped_rules(tmp_path):
+    """rules.json as shipped, without learned params."""
+    return rules.load_rules(RULES_PATH, params_dir=str(tmp_path))
+
+
+def test_rules_match_legacy_logic(shipped_rules):
+    rng = random.Random(38)
+    pairs = [MatchSnapshot.from_api(_random_match(rng, i)) for i in range(3000)]
+    pairs = [(snap.event, snap.state) for snap in pairs]
+    # Events with a WICKET but no score context exercise the state=None path too
+    pairs += [("WICKET! {}".format(i), None) for i in range(20)]
+    for (event, state), verdict in zip(pairs, shipped_rules.evaluate_batch(pairs)):
+        legacy_state = state if state is not None else {"required_rr": 0.0, "overs_left": 0}
+        emotion = legacy_detect_narrative(event, legacy_state)
+        expected = (emotion, legacy_score_event(event, emotion), legacy_should_post(event, emotion))
+        assert verdict == expected, event
+    assert sum(shipped_rules.hits) > 0
+
+
+def _write_rules(path, narrative_when):
+    spec = json.loads(Path(RULES_PATH).read_text(encoding="utf-8"))
+    spec["narrative"][0]["when"] = narrative_when
+    path.write_text(json.dumps(spec), encoding="utf-8")
+
+
+def test_division_by_zero_evaluates_to_zero(tmp_path):
+    path = tmp_path / "rules.json"
+    _write_rules(path, "runs_needed / overs_left > 10 or runs % overs_left == 1")
+    ruleset = rules.load_rules(str(path), params_dir=str(tmp_path))
+    snap = MatchSnapshot.from_api({"id": "m", "matchType": "t20", "status": "x", "matchStarted": True,
+                                   "score": [{"r": 180, "w": 5, "o": 20, "inning": "India Inning 1"},
+                                             {"r": 150, "w": 9, "o": 20, "inning": "Australia Inning 1"}]})
+    assert snap.state.overs_left == 0
+    assert ruleset.evaluate(snap.event, snap.state)[0] == "tension"
+
+
+def test_reload_keeps_rules_that_fail_on_a_sample(tmp_path, monkeypatch):
+    path = tmp_path / "rules.json"
+    _write_rules(path, "wicket and required_rr > 10")
+    monkeypatch.setattr(rules, "RULES_PATH", str(path))
+    monkeypatch.setattr(rules, "PARAMS_DIR", str(tmp_path))
+    monkeypatch.setattr(rules, "RULES_CHECK_SECONDS", 0)
+    monkeypatch.setattr(rules, "_ruleset", None)
+    good = rules.get_rules()
+
+    # Compiles, but comparing text with a number raises on every evaluation
+    _write_rules(path, "text > 3")
+    monkeypatch.setattr(rules, "_mtime", lambda p: 2.0 if p == str(path) else None)
+    assert rules.get_rules() is good
+    assert rules.evaluate_batch([("WICKET", None)]) == [("tension", 60, True)]